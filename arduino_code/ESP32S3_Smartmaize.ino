@@ -12,12 +12,28 @@ const char* password = "Temigoke253";
 
 // Flask server endpoint
 const char* serverName = "http://192.168.98.10:5000/upload";  // Update with your IP
+const char* telemetryUrl = "http://192.168.98.10:5000/telemetry";
+
+// Must match this node's id in the server's ESP32_DEVICES / device registry
+#define DEVICE_ID "esp32"
 
 // DHT11 sensor setup
 #define DHTPIN 14      // Pin connected to the DHT11 sensor (change if necessary)
 #define DHTTYPE DHT11  // Define the sensor type (DHT11)
 DHT dht(DHTPIN, DHTTYPE); // Initialize DHT sensor
 
+// Telemetry: sample every 10 s, send the buffered readings once a minute
+#define SAMPLE_INTERVAL_MS 10000
+#define SEND_INTERVAL_MS 60000
+#define MAX_READINGS 30
+struct Reading { unsigned long takenAt; float temperature; float humidity; };
+Reading readings[MAX_READINGS];
+int readingCount = 0;
+unsigned long lastSample = 0;
+unsigned long lastSend = 0;
+float lastTemperature = NAN;
+float lastHumidity = NAN;
+
 // ESP32 Camera pin configuration
 #define CAMERA_MODEL_ESP32S3_EYE // Has PSRAM
 #include "camera_pins.h"
@@ -28,6 +44,11 @@ WebServer server(80);
 // LED pin for flash (if available)
 #define LED_PIN 4  // Adjust based on your board
 
+// The server answers 422 for unusable frames (dark, blurred, truncated, no leaf); retake them
+#define MAX_CAPTURE_ATTEMPTS 3
+#define RECAPTURE_DELAY_MS 500
+String lastRejectReason = "";
+
 // === Buzzer Setup ===
 #define BUZZER_PIN 47   // connect buzzer to GPIO 15
 void setup() {
@@ -39,6 +60,9 @@ void setup() {
   pinMode(LED_PIN, OUTPUT);
   digitalWrite(LED_PIN, LOW);
 
+  // Start the DHT sensor
+  dht.begin();
+
   // Connect to Wi-Fi
   WiFi.begin(ssid, password);
   WiFi.setSleep(false);
@@ -91,9 +115,69 @@ void loop() {
     }
   }
 
+  // Sample the DHT sensor and send buffered readings
+  if (millis() - lastSample >= SAMPLE_INTERVAL_MS) {
+    lastSample = millis();
+    sampleSensor();
+  }
+  if (millis() - lastSend >= SEND_INTERVAL_MS && readingCount > 0) {
+    lastSend = millis();
+    sendTelemetry();
+  }
+
   delay(100); // Small delay to prevent excessive polling
 }
 
+void sampleSensor() {
+  float temperature = dht.readTemperature();
+  float humidity = dht.readHumidity();
+  if (isnan(temperature) || isnan(humidity)) {
+    Serial.println("⚠️  DHT read failed");
+    return;
+  }
+  lastTemperature = temperature;
+  lastHumidity = humidity;
+
+  // Drop the oldest reading if the server has been unreachable for a while
+  if (readingCount == MAX_READINGS) {
+    memmove(readings, readings + 1, sizeof(Reading) * (MAX_READINGS - 1));
+    readingCount--;
+  }
+  readings[readingCount++] = {millis(), temperature, humidity};
+}
+
+bool sendTelemetry() {
+  if (WiFi.status() != WL_CONNECTED) {
+    return false;
+  }
+
+  // No real-time clock: each reading carries its age in seconds and the server timestamps it
+  unsigned long now = millis();
+  String body = "{\"device\":\"" DEVICE_ID "\",\"readings\":[";
+  for (int i = 0; i < readingCount; i++) {
+    if (i > 0) body += ",";
+    body += "{\"age_s\":" + String((now - readings[i].takenAt) / 1000.0, 1)
+          + ",\"temperature\":" + String(readings[i].temperature, 1)
+          + ",\"humidity\":" + String(readings[i].humidity, 1) + "}";
+  }
+  body += "]}";
+
+  HTTPClient http;
+  if (!http.begin(telemetryUrl)) {
+    return false;
+  }
+  http.addHeader("Content-Type", "application/json");
+  int httpResponseCode = http.POST(body);
+  http.end();
+
+  if (httpResponseCode == 202) {
+    readingCount = 0;
+    return true;
+  }
+  Serial.printf("Telemetry POST failed: %d\n", httpResponseCode);
+  return false;
+}
+
 void setupWebServer() {
   // Route to capture image
   server.on("/capture", HTTP_GET, []() {
@@ -139,25 +223,54 @@ void setupWebServer() {
 }
 
 bool captureAndUpload() {
-  // Flash LED briefly to indicate capture
+  bool useFlash = false;
+  for (int attempt = 1; attempt <= MAX_CAPTURE_ATTEMPTS; attempt++) {
+    int httpResponseCode = captureAndSend(useFlash);
+    if (httpResponseCode == 200) {
+      return true;
+    }
+    if (httpResponseCode != 422) {
+      return false;
+    }
+
+    // Rejected by the server's pre-filter before inference; a dark frame is retaken with the flash on
+    Serial.printf("🔁 Frame rejected (%s), recapturing (%d/%d)\n",
+                  lastRejectReason.c_str(), attempt, MAX_CAPTURE_ATTEMPTS);
+    useFlash = useFlash || lastRejectReason == "too_dark";
+    delay(RECAPTURE_DELAY_MS);
+  }
+  return false;
+}
+
+int captureAndSend(bool useFlash) {
+  // Flash LED briefly to indicate capture, or keep it on to light the leaf
   digitalWrite(LED_PIN, HIGH);
   delay(100);
-  digitalWrite(LED_PIN, LOW);
+  if (useFlash) {
+    // Drop the frame buffered before the light came on
+    camera_fb_t *stale = esp_camera_fb_get();
+    if (stale) {
+      esp_camera_fb_return(stale);
+    }
+  } else {
+    digitalWrite(LED_PIN, LOW);
+  }
 
   Serial.println("=== Starting image capture ===");
   
   // Capture an image
   camera_fb_t *fb = esp_camera_fb_get();
+  digitalWrite(LED_PIN, LOW);
   if (!fb) {
     Serial.println("❌ Camera capture failed - no image taken!");
-    return false;
+    return -1;
   }
 
   // Verify we actually have image data
   if (fb->len == 0) {
     Serial.println("❌ Camera returned empty image!");
     esp_camera_fb_return(fb);
-    return false;
+    return -1;
   }
 
   Serial.printf("✅ Image captured successfully!\n");
@@ -177,39 +290,47 @@ bool captureAndUpload() {
   if (WiFi.status() != WL_CONNECTED) {
     Serial.println("❌ WiFi not connected");
     esp_camera_fb_return(fb);
-    return false;
+    return -1;
   }
 
   Serial.println("📤 Uploading image to server...");
   
   // Send image to Flask server
-  bool success = sendImageToServer(fb);
+  int httpResponseCode = sendImageToServer(fb);
   
-  if (success) {
+  if (httpResponseCode == 200) {
     Serial.println("✅ Image uploaded and analyzed successfully!");
-  } else {
+  } else if (httpResponseCode != 422) {
     Serial.println("❌ Failed to upload image to server");
   }
 
   // Return the framebuffer to the camera driver
   esp_camera_fb_return(fb);
 
-  return success;
+  return httpResponseCode;
 }
 
-bool sendImageToServer(camera_fb_t *fb) {
+int sendImageToServer(camera_fb_t *fb) {
   HTTPClient http;
+  const char *responseHeaders[] = {"X-Frame-Rejected"};
   
   // Begin HTTP connection
   if (!http.begin(serverName)) {
     Serial.println("HTTP begin failed");
-    return false;
+    return -1;
   }
+  http.collectHeaders(responseHeaders, 1);
 
   // Set headers
   http.addHeader("Content-Type", "application/octet-stream");
   http.addHeader("Content-Length", String(fb->len));
   http.addHeader("X-ESP32-Camera", "true"); // Custom header to identify ESP32
+  http.addHeader("X-Device-ID", DEVICE_ID);
+  if (!isnan(lastTemperature) && !isnan(lastHumidity)) {
+    // Latest DHT reading, stored with the prediction
+    http.addHeader("X-Temperature", String(lastTemperature, 1));
+    http.addHeader("X-Humidity", String(lastHumidity, 1));
+  }
 
   // Send POST request with image data
   int httpResponseCode = http.POST(fb->buf, fb->len);
@@ -219,13 +340,14 @@ bool sendImageToServer(camera_fb_t *fb) {
     String response = http.getString();
     Serial.printf("HTTP Response code: %d\n", httpResponseCode);
     Serial.printf("Response: %s\n", response.c_str());
+    lastRejectReason = http.header("X-Frame-Rejected");
     
     http.end(); // Clean up
-    return (httpResponseCode == 200);
+    return httpResponseCode;
   } else {
     Serial.printf("HTTP POST failed, error: %s\n", http.errorToString(httpResponseCode).c_str());
     http.end(); // Clean up
-    return false;
+    return -1;
   }
 }
 
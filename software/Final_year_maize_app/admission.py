@@ -0,0 +1,136 @@
+"""Admission control for the upload route: size limit, concurrency cap and per-client rate limits.
+
+Checks run before the body is read, in order of cost to the server:
+
+    1. body size    - Content-Length above the limit is refused with 413,
+                      an upload without Content-Length (chunked) with 411
+    2. rate limit   - a token bucket per client key (X-Device-ID, else the
+                      source IP), refused with 429 + Retry-After
+    3. concurrency  - at most max_inflight uploads in progress; the last
+                      reserved_fraction of the slots only admit ESP32
+                      captures, refused with 503 + Retry-After
+
+Anything admitted still goes through the bounded, prioritised inference queue
+(see inference.py), which sheds load with a 503 of its own when full.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+TOO_LARGE = "too_large"
+LENGTH_REQUIRED = "length_required"
+RATE_LIMITED = "rate_limited"
+OVERLOADED = "overloaded"
+QUEUE_FULL = "queue_full"
+
+STATUS_CODES = {TOO_LARGE: 413, LENGTH_REQUIRED: 411, RATE_LIMITED: 429, OVERLOADED: 503, QUEUE_FULL: 503}
+
+
+class Rejection(Exception):
+    """Why a request was turned away, with the HTTP status and Retry-After to send"""
+
+    def __init__(self, reason, message, retry_after=None):
+        super().__init__(message)
+        self.reason = reason
+        self.status = STATUS_CODES[reason]
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """rate_per_minute tokens per key, up to `burst` saved; least recently seen keys are forgotten"""
+
+    def __init__(self, rate_per_minute, burst, max_keys=10000):
+        self.rate = float(rate_per_minute) / 60.0
+        self.burst = max(1.0, float(burst))
+        self.max_keys = int(max_keys)
+        self._buckets = OrderedDict()  # key -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """0 if a token was taken, else the seconds until the next one"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None) or [self.burst, now]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionController:
+    """Decides whether an upload may start, and counts what it admitted and rejected"""
+
+    def __init__(self, max_body_bytes, max_inflight=64, reserved_fraction=0.25, rate_per_minute=0, burst=10,
+                 retry_after=1):
+        self.max_body_bytes = int(max_body_bytes)
+        self.max_inflight = int(max_inflight)
+        self.reserved = int(self.max_inflight * float(reserved_fraction))
+        self.retry_after = int(retry_after)
+        self.buckets = TokenBuckets(rate_per_minute, burst) if rate_per_minute > 0 else None
+
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._peak_inflight = 0
+        self._admitted = {True: 0, False: 0}  # esp32? -> count
+        self._rejected = {}                   # (reason, client) -> count
+
+    def admit(self, key, content_length, esp32):
+        """Reserve an upload slot or raise Rejection; a successful admit must be paired with release()"""
+        client = "esp32" if esp32 else "web"
+        try:
+            # A chunked body's size is unknown until it has been read, so it can't be checked up front
+            if content_length is None:
+                raise Rejection(LENGTH_REQUIRED, "Content-Length is required for uploads")
+            if content_length > self.max_body_bytes:
+                raise Rejection(TOO_LARGE, f"Upload of {content_length} bytes exceeds the "
+                                           f"{self.max_body_bytes} byte limit")
+
+            if self.buckets is not None:
+                wait = self.buckets.take(key)
+                if wait:
+                    raise Rejection(RATE_LIMITED, f"Rate limit exceeded for {key}", max(1, math.ceil(wait)))
+
+            limit = self.max_inflight if esp32 else self.max_inflight - self.reserved
+            with self._lock:
+                if self.max_inflight > 0 and self._inflight >= limit:
+                    raise Rejection(OVERLOADED, f"{self._inflight} uploads in progress", self.retry_after)
+                self._inflight += 1
+                self._peak_inflight = max(self._peak_inflight, self._inflight)
+                self._admitted[esp32] += 1
+        except Rejection as rejection:
+            self.count_rejection(rejection.reason, client)
+            raise
+
+    def release(self):
+        with self._lock:
+            self._inflight -= 1
+
+    def count_rejection(self, reason, client):
+        with self._lock:
+            self._rejected[(reason, client)] = self._rejected.get((reason, client), 0) + 1
+
+    def rejections(self):
+        with self._lock:
+            return dict(self._rejected)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_body_bytes": self.max_body_bytes,
+                "max_inflight": self.max_inflight,
+                "reserved_for_esp32": self.reserved,
+                "inflight": self._inflight,
+                "peak_inflight": self._peak_inflight,
+                "admitted": {"esp32": self._admitted[True], "web": self._admitted[False]},
+                "rejected": {f"{reason}/{client}": n for (reason, client), n in sorted(self._rejected.items())},
+                "rate_limited_clients": len(self.buckets) if self.buckets is not None else 0,
+            }
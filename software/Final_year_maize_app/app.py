@@ -1,24 +1,121 @@
-from flask import Flask, render_template, request, jsonify, url_for, redirect
+from flask import Flask, render_template, request, jsonify, url_for, redirect, Response, stream_with_context, g
 import os
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.models import load_model
 from werkzeug.utils import secure_filename
 import datetime
-from tensorflow.keras.applications.efficientnet import preprocess_input  # CHANGED: EfficientNet preprocessing
-import io
-from PIL import Image
 import requests
+import json
+import hmac
+import logging
+import threading
+import time
+from collections import deque
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+
+from inference import BatchingPredictor, QueueFullError, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from prediction_cache import PredictionCache, content_hash, model_identity
+from preprocessing import BatchBuffer, decode, resize_rgb, tta_views, tile_views
+from history_store import HistoryStore
+from image_writer import ImageWriter
+from batch_upload import iter_uploads, ArchiveError, TooManyFiles
+from model_loader import get_preprocess_fn
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from device_fleet import DeviceFleet, parse_device_list
+from telemetry_store import TelemetryStore, RESOLUTIONS as TELEMETRY_RESOLUTIONS
+import risk_engine
+from live_feed import LiveFeed
+from model_manager import ModelManager, ACTIVE, CANDIDATE
+from admission import AdmissionController, Rejection, QUEUE_FULL
+import frame_check
+from frame_check import FrameFilter, FrameRejected
 
 
 # ------------------------------------------------
 # CONFIG
 # ------------------------------------------------
-UPLOAD_FOLDER = "static/uploads"
+UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "static/uploads")  # pages show images from static/uploads
 DEMO_FOLDER = "static/demo"
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
 
+# Micro-batching: concurrent uploads are coalesced into one model.predict call
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 8))        # images per forward pass
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 10))  # how long to wait for more images
+BATCH_QUEUE_SIZE = int(os.environ.get("BATCH_QUEUE_SIZE", 64))   # pending images before rejecting
+
+# Admission control on /upload (checked before the body is read)
+MAX_UPLOAD_MB = float(os.environ.get("MAX_UPLOAD_MB", 10))
+MAX_INFLIGHT_UPLOADS = int(os.environ.get("MAX_INFLIGHT_UPLOADS", 64))        # 0 = no concurrency cap
+ESP32_RESERVED_FRACTION = float(os.environ.get("ESP32_RESERVED_FRACTION", 0.25))  # upload + queue slots only ESP32 may use
+RATE_LIMIT_PER_MINUTE = float(os.environ.get("RATE_LIMIT_PER_MINUTE", 0))     # per device/IP, 0 disables
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", 10))
+
+# Pre-filter for ESP32 frames: truncated, dark, blurred or leafless captures are sent back before inference
+FRAME_FILTER = os.environ.get("FRAME_FILTER", "1") == "1"
+FRAME_MIN_BRIGHTNESS = float(os.environ.get("FRAME_MIN_BRIGHTNESS", frame_check.MIN_BRIGHTNESS))  # mean luma, 0-255
+FRAME_MAX_BRIGHTNESS = float(os.environ.get("FRAME_MAX_BRIGHTNESS", frame_check.MAX_BRIGHTNESS))
+FRAME_MIN_SHARPNESS = float(os.environ.get("FRAME_MIN_SHARPNESS", frame_check.MIN_SHARPNESS))  # Laplacian var, 1/8 scale
+FRAME_MIN_GREEN_RATIO = float(os.environ.get("FRAME_MIN_GREEN_RATIO", frame_check.MIN_GREEN_RATIO))  # foliage share
+
+# Prediction cache: identical image bytes + same model skip the forward pass
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 1024))  # 0 disables the cache
+PREDICTION_CACHE_PATH = os.environ.get("PREDICTION_CACHE_PATH", "")       # e.g. cache/predictions.sqlite3
+
+# Prediction history: SQLite (WAL) database with a retention policy
+HISTORY_DB_PATH = os.environ.get("HISTORY_DB_PATH", "data/history.sqlite3")
+HISTORY_RETENTION_DAYS = int(os.environ.get("HISTORY_RETENTION_DAYS", 0))  # 0 keeps everything
+HISTORY_MAX_RECORDS = int(os.environ.get("HISTORY_MAX_RECORDS", 0))        # 0 means unlimited
+HISTORY_PAGE_SIZE = 50
+
+# Live dashboard feed: recent predictions kept for SSE/long-poll clients that reconnect
+LIVE_FEED_EVENTS = int(os.environ.get("LIVE_FEED_EVENTS", 500))
+LIVE_FEED_HEARTBEAT_S = float(os.environ.get("LIVE_FEED_HEARTBEAT_S", 15))  # SSE keep-alive comment interval
+LIVE_FEED_MAX_WAIT_S = float(os.environ.get("LIVE_FEED_MAX_WAIT_S", 30))    # longest /events/poll hold
+
+# Uploaded images are written by a background pool into YYYY/MM/DD shards
+IMAGE_WRITER_THREADS = int(os.environ.get("IMAGE_WRITER_THREADS", 2))
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", 256))  # 0 disables thumbnails
+SHARD_UPLOADS_BY_DATE = os.environ.get("SHARD_UPLOADS_BY_DATE", "1") == "1"
+
+# Test-time augmentation: predictions below this confidence are re-scored on flipped/cropped
+# views of the full-resolution frame in one extra forward pass (0 disables)
+TTA_CONFIDENCE_THRESHOLD = float(os.environ.get("TTA_CONFIDENCE_THRESHOLD", 0))
+
+# Tiled analysis of full-resolution frames (/upload?tiled=1): overlapping 224x224 tiles instead of one squashed view
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", 0.25))                     # fraction shared by neighbours
+TILE_MAX_TILES = int(os.environ.get("TILE_MAX_TILES", 64))
+TILE_LATENCY_BUDGET_MS = float(os.environ.get("TILE_LATENCY_BUDGET_MS", 2000))  # caps tiles by measured cost
+TILE_MIN_CONFIDENCE = float(os.environ.get("TILE_MIN_CONFIDENCE", 0.5))         # a tile counts as diseased above this
+TILED_ESP32_UPLOADS = os.environ.get("TILED_ESP32_UPLOADS", "0") == "1"        # tile every ESP32 capture
+
+# /upload_batch limits
+BATCH_UPLOAD_MAX_FILES = int(os.environ.get("BATCH_UPLOAD_MAX_FILES", 1000))
+BATCH_UPLOAD_MAX_IMAGE_MB = float(os.environ.get("BATCH_UPLOAD_MAX_IMAGE_MB", 20))
+BATCH_UPLOAD_MAX_ARCHIVE_MB = float(os.environ.get("BATCH_UPLOAD_MAX_ARCHIVE_MB", 512))
+
+# ESP32 fleet: "id=host[:port][@group],..." seeds the registry (devices can also be added via POST /devices)
+ESP32_DEVICES = os.environ.get("ESP32_DEVICES", "esp32=192.168.98.105")
+DEVICE_REGISTRY_PATH = os.environ.get("DEVICE_REGISTRY_PATH", "data/devices.json")
+DEVICE_CONNECT_TIMEOUT = float(os.environ.get("DEVICE_CONNECT_TIMEOUT", 2))   # seconds to reach a node
+DEVICE_READ_TIMEOUT = float(os.environ.get("DEVICE_READ_TIMEOUT", 20))        # capture + upload round trip
+DEVICE_TRIGGER_THREADS = int(os.environ.get("DEVICE_TRIGGER_THREADS", 16))
+
+# Sensor telemetry (DHT temperature / humidity) with per-minute and per-hour rollups
+TELEMETRY_DB_PATH = os.environ.get("TELEMETRY_DB_PATH", "data/telemetry.sqlite3")
+TELEMETRY_RAW_RETENTION_DAYS = int(os.environ.get("TELEMETRY_RAW_RETENTION_DAYS", 7))
+TELEMETRY_MINUTE_RETENTION_DAYS = int(os.environ.get("TELEMETRY_MINUTE_RETENTION_DAYS", 30))
+TELEMETRY_MAX_AGE_S = int(os.environ.get("TELEMETRY_MAX_AGE_S", 600))  # oldest reading attached to an upload
+TELEMETRY_MAX_BATCH = 5000  # readings per POST /telemetry
+
+# Disease risk from the last RISK_WINDOW_HOURS of telemetry, recomputed at most every RISK_CACHE_SECONDS
+RISK_WINDOW_HOURS = float(os.environ.get("RISK_WINDOW_HOURS", 24))
+RISK_CACHE_SECONDS = float(os.environ.get("RISK_CACHE_SECONDS", 60))
+
+# Logging: per-request detail is DEBUG, so LOG_LEVEL=WARNING keeps production quiet
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log = logging.getLogger("maize")
+
 # Define your 4 classes (make sure this matches your training order)
 CLASS_LABELS = ["Blight", "Common Rust", "Gray Leaf Spot", "Healthy"]
 
@@ -39,6 +136,8 @@ disease_info = {
             "Infected crop residue",
             "Susceptible corn varieties"
         ],
+        # Machine-readable form of the causes above, used by the risk engine (°C, % RH)
+        "risk_conditions": {"temperature_c": (17.8, 27.2), "min_humidity": 90, "min_hours": 6},
         "immediate_actions": [
             "Remove and destroy infected plant debris",
             "Improve air circulation around plants",
@@ -76,6 +175,7 @@ disease_info = {
             "Poor air circulation",
             "Susceptible varieties"
         ],
+        "risk_conditions": {"temperature_c": (15.6, 25.0), "min_humidity": 85, "min_hours": 6},
         "immediate_actions": [
             "Monitor field regularly for early detection",
             "Remove severely infected leaves if practical",
@@ -115,6 +215,7 @@ disease_info = {
             "Continuous corn production",
             "Infected crop residue"
         ],
+        "risk_conditions": {"temperature_c": (23.9, 29.4), "min_humidity": 90, "min_hours": 12},
         "immediate_actions": [
             "Scout fields regularly during humid weather",
             "Remove infected plant debris",
@@ -180,18 +281,188 @@ disease_info = {
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-# Load EfficientNet model
-MODEL_PATH = "models/best_model.keras"
+# Prometheus-style metrics served at /metrics
+metrics = MetricsRegistry(prefix="maize_")
+STAGE_SECONDS = metrics.histogram(
+    "stage_seconds",
+    "Time spent in each processing stage (read/decode/resize/queue_wait/preprocess/predict per image or "
+    "batch; history_write and image_save run in the background)",
+    ["stage"],
+)
+REQUEST_SECONDS = metrics.histogram("request_seconds", "End-to-end request latency", ["endpoint"])
+HTTP_REQUESTS = metrics.counter("http_requests", "Requests served", ["endpoint", "status"])
+PREDICTIONS = metrics.counter("predictions", "Predictions returned, including cache hits", ["label", "source"])
+TILES_SCORED = metrics.counter("tiles_scored", "Tiles scored by tiled full-frame analysis")
+TTA_PASSES = metrics.counter("tta_passes", "Low-confidence predictions re-scored with test-time augmentation",
+                             ["outcome"])
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+# Load EfficientNet model (Keras, or a TFLite export from tflite_tools.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "keras").lower()   # "keras", "tflite" or "stub"
+KERAS_MODEL_PATH = os.environ.get("MODEL_PATH", "models/best_model.keras")
+TFLITE_MODEL_PATH = os.environ.get("TFLITE_MODEL_PATH", "models/best_model_float16.tflite")
+TFLITE_NUM_THREADS = int(os.environ.get("TFLITE_NUM_THREADS", os.cpu_count() or 1))
+MODEL_PATH = TFLITE_MODEL_PATH if INFERENCE_BACKEND == "tflite" else KERAS_MODEL_PATH
+
+# "background": bind the port immediately and load/warm the model on a thread
+# "blocking": load and warm before the module finishes importing
+MODEL_LOAD_MODE = os.environ.get("MODEL_LOAD_MODE", "background")
+# Batch sizes traced during warm-up so the first real batches don't pay for it
+WARMUP_BATCH_SIZES = sorted({
+    int(n) for n in os.environ.get("WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE}").split(",") if n.strip()
+})
+MODEL_RETRY_AFTER = "5"  # seconds clients should wait while the model is starting
+
+# Hot reload: poll MODEL_PATH and swap in a new checkpoint once it stops changing (0 disables);
+# POST /model/reload does the same on demand
+MODEL_WATCH_INTERVAL_S = float(os.environ.get("MODEL_WATCH_INTERVAL_S", 0))
+# Shadow A/B: a candidate model re-scores this fraction of batches off the request path
+SHADOW_MODEL_PATH = os.environ.get("SHADOW_MODEL_PATH", "")
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", 0.1))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")  # X-Admin-Token for /model/*; those routes are off while unset
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")  # /model/reload only loads checkpoints from under here
+
+# Production serving: N inference processes, each holding the model, fed over shared memory.
+# 0 keeps the model in this process (development mode with the Flask debugger).
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+INFERENCE_WORKER_THREADS = int(os.environ.get("INFERENCE_WORKER_THREADS", 1))  # TF threads per worker
+PIN_INFERENCE_WORKERS = os.environ.get("PIN_INFERENCE_WORKERS", "1") == "1"     # one core per worker
+FLASK_DEBUG = os.environ.get("FLASK_DEBUG", "1") == "1" and INFERENCE_WORKERS == 0
+
+def load_inference_model(path, role=ACTIVE):
+    """Load the model for the configured backend; all variants expose predict/input_shape/output_shape"""
+    # TensorFlow is imported here rather than at module import so Flask can bind first
+    if INFERENCE_WORKERS > 0:
+        from worker_pool import InferenceWorkerPool
+        return InferenceWorkerPool(
+            path,
+            num_workers=INFERENCE_WORKERS if role == ACTIVE else 1,  # a shadow candidate only sees samples
+            backend=INFERENCE_BACKEND,
+            max_batch_size=BATCH_MAX_SIZE,
+            num_classes=len(CLASS_LABELS),
+            threads_per_worker=INFERENCE_WORKER_THREADS,
+            pin_cores=PIN_INFERENCE_WORKERS,
+            warmup_sizes=WARMUP_BATCH_SIZES,
+        ).start()
+    from model_loader import load_inference_model as load_backend_model
+    threads = TFLITE_NUM_THREADS if INFERENCE_BACKEND == "tflite" else None
+    return load_backend_model(path, INFERENCE_BACKEND, num_threads=threads)
+
+MODEL_ID = model_identity(MODEL_PATH)
+model_state = {
+    "state": "loading",        # loading -> warming -> ready, or failed
+    "error": None,
+    "load_seconds": None,
+    "warmup_seconds": None,
+}
+
+def run_model(batch):
+    """Single forward pass over an Nx224x224x3 batch on the active model, sampled into shadow mode"""
+    with model_manager.use() as version:
+        start = time.perf_counter()
+        preds = version.model.predict(batch, verbose=0)
+    model_manager.shadow(batch, preds, time.perf_counter() - start)
+    return preds
+
+predictor = BatchingPredictor(
+    run_model,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_queue_size=BATCH_QUEUE_SIZE,
+    # In-process: preprocess_fn is filled in once TensorFlow has been imported by the loader.
+    # Worker processes receive uint8 batches and preprocess on their side.
+    batch_buffer=BatchBuffer(BATCH_MAX_SIZE) if INFERENCE_WORKERS == 0 else None,
+    num_dispatchers=max(1, INFERENCE_WORKERS),
+    stage_timer=observe_stage,
+    reserved_slots=int(BATCH_QUEUE_SIZE * ESP32_RESERVED_FRACTION),
+)
 
-print(f"Loading EfficientNet model from: {MODEL_PATH}")
-try:
-    model = load_model(MODEL_PATH, compile=False, custom_objects=None)
-    print("✅ AI model loaded successfully!")
-    print(f"Model input shape: {model.input_shape}")
-    print(f"Model output shape: {model.output_shape}")
-except Exception as e:
-    print(f"❌ Error loading model: {str(e)}")
-    model = None
+prediction_cache = PredictionCache(
+    MODEL_ID,
+    max_entries=PREDICTION_CACHE_SIZE,
+    persist_path=PREDICTION_CACHE_PATH,
+)
+
+def model_ready():
+    return model_state["state"] == "ready"
+
+def warm_up_model(target):
+    """Dummy forward passes at the configured batch sizes to trigger graph tracing"""
+    if INFERENCE_WORKERS > 0:
+        return  # each worker process warms itself before reporting ready
+    # Own buffer: a hot reload warms up while the predictor's buffer is serving traffic
+    buffer = BatchBuffer(BATCH_MAX_SIZE, preprocess_fn=get_preprocess_fn(INFERENCE_BACKEND))
+    for n in WARMUP_BATCH_SIZES:
+        target.predict(buffer.fill([np.zeros((224, 224, 3), np.uint8)] * min(n, BATCH_MAX_SIZE)), verbose=0)
+
+def on_model_swap(old, new):
+    """A new active model: re-key the prediction cache so no label from the old one is served"""
+    global MODEL_ID
+    MODEL_ID = new.model_id
+    prediction_cache.set_model(new.model_id)
+    if old is not None:
+        log.info("✅ Hot-swapped model %s -> %s", old.model_id, new.model_id)
+
+model_manager = ModelManager(
+    load_inference_model,
+    model_identity,
+    warm_fn=warm_up_model,
+    on_swap=on_model_swap,
+    labels=CLASS_LABELS,
+    shadow_rate=SHADOW_SAMPLE_RATE,
+)
+
+def current_model():
+    version = model_manager.active
+    return version.model if version is not None else None
+
+def model_loaded(loaded):
+    if predictor.batch_buffer is not None:
+        predictor.batch_buffer.preprocess_fn = get_preprocess_fn(INFERENCE_BACKEND)  # EfficientNet preprocessing
+    log.info("✅ AI model loaded successfully!")
+    log.info("Model input shape: %s", loaded.input_shape)
+    log.info("Model output shape: %s", loaded.output_shape)
+    model_state["state"] = "warming"
+
+def load_and_warm_model():
+    log.info("Loading EfficientNet model (%s) from: %s", INFERENCE_BACKEND, MODEL_PATH)
+    try:
+        version = model_manager.load_version(MODEL_PATH, on_loaded=model_loaded)
+        model_manager.install(version)
+        model_state["load_seconds"] = version.load_seconds
+        model_state["warmup_seconds"] = version.warmup_seconds
+        model_state["state"] = "ready"
+        log.info("🔥 Model warmed up for batch sizes %s in %ss", WARMUP_BATCH_SIZES, model_state["warmup_seconds"])
+    except Exception as e:
+        log.error("❌ Error loading model: %s", e)
+        model_state["error"] = str(e)
+        model_state["state"] = "failed"
+        return
+    model_manager.watch(MODEL_PATH, MODEL_WATCH_INTERVAL_S)
+    if SHADOW_MODEL_PATH:
+        model_manager.reload(SHADOW_MODEL_PATH, CANDIDATE)
+
+def start_model_loading():
+    # With the debug reloader, the parent process only watches files; only its child serves
+    if FLASK_DEBUG and __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+        return
+    if MODEL_LOAD_MODE == "blocking":
+        load_and_warm_model()
+    else:
+        threading.Thread(target=load_and_warm_model, name="model-loader", daemon=True).start()
+
+def model_unavailable_response():
+    """503 + Retry-After while loading/warming, 500 if loading failed"""
+    if model_state["state"] == "failed":
+        return jsonify({"error": "Model not loaded. Please check server logs.", "message": model_state["error"]}), 500
+    response = jsonify({"error": "Model is starting", "model_status": model_state["state"]})
+    response.status_code = 503
+    response.headers["Retry-After"] = MODEL_RETRY_AFTER
+    return response
+
+start_model_loading()
 
 # ------------------------------------------------
 # UTILS
@@ -199,72 +470,425 @@ except Exception as e:
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def predict_image(img_path):
-    """Preprocess and detect a single image using EfficientNet preprocessing"""
+tta_stats = {"checked": 0, "fired": 0, "changed": 0, "extra_seconds": 0.0}
+tta_lock = threading.Lock()
+
+def priority_for(source):
+    """ESP32 captures go ahead of interactive uploads, which go ahead of bulk jobs"""
+    if source == "ESP32":
+        return PRIORITY_HIGH
+    if source == "Batch Upload":
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+def gated_second_pass(img_bytes, first_preds, priority=PRIORITY_NORMAL):
+    """Below the confidence threshold, average in flipped/cropped views scored in one forward pass"""
+    with tta_lock:
+        tta_stats["checked"] += 1
+    if first_preds.max() >= TTA_CONFIDENCE_THRESHOLD:
+        return first_preds
+
+    start = time.perf_counter()
+    views = tta_views(img_bytes)[:BATCH_MAX_SIZE]
+    preds = np.vstack([first_preds[None, :], predictor.predict_group(views, priority=priority)]).mean(axis=0)
+    extra = time.perf_counter() - start
+
+    changed = int(np.argmax(preds) != np.argmax(first_preds))
+    observe_stage("tta", extra)
+    TTA_PASSES.labels("changed" if changed else "confirmed").inc()
+    with tta_lock:
+        tta_stats["fired"] += 1
+        tta_stats["changed"] += changed
+        tta_stats["extra_seconds"] += extra
+    return preds
+
+def tta_summary():
+    with tta_lock:
+        checked, fired = tta_stats["checked"], tta_stats["fired"]
+        return {
+            "confidence_threshold": TTA_CONFIDENCE_THRESHOLD,
+            "checked": checked,
+            "fired": fired,
+            "fire_rate": round(fired / checked, 4) if checked else 0.0,
+            "changed_label": tta_stats["changed"],
+            "avg_extra_ms": round(tta_stats["extra_seconds"] / fired * 1000.0, 2) if fired else 0.0,
+        }
+
+tile_stats = {"frames": 0, "tiles": 0, "seconds": 0.0, "over_budget": 0, "tile_seconds": 0.0}
+tile_lock = threading.Lock()
+
+def tile_budget():
+    """Most tiles that fit TILE_LATENCY_BUDGET_MS at the measured per-tile cost"""
+    with tile_lock:
+        per_tile = tile_stats["tile_seconds"]
+    if not per_tile:
+        # No tiled frame yet: estimate from the batcher's average cost per image
+        queue_stats = predictor.stats()
+        if queue_stats["avg_batch_size"]:
+            per_tile = queue_stats["avg_batch_latency_ms"] / 1000.0 / queue_stats["avg_batch_size"]
+            per_tile /= max(1, INFERENCE_WORKERS)
+    if not per_tile:
+        return TILE_MAX_TILES
+    return max(1, min(TILE_MAX_TILES, int(TILE_LATENCY_BUDGET_MS / 1000.0 / per_tile)))
+
+def classify_tiles(img_bytes, source="ESP32"):
+    """Score overlapping full-resolution tiles; returns the aggregate verdict plus a per-tile heatmap"""
+    start = time.perf_counter()
+    grid = tile_views(img_bytes, overlap=TILE_OVERLAP, max_tiles=tile_budget())
+    decoded = time.perf_counter()
+    observe_stage("tile_decode", decoded - start)
+
+    # Groups of BATCH_MAX_SIZE are queued back to back so they run as consecutive (or, with
+    # worker processes, parallel) full batches
+    tiles = grid["tiles"]
+    futures = [predictor.submit_group(tiles[i:i + BATCH_MAX_SIZE], priority_for(source))
+               for i in range(0, len(tiles), BATCH_MAX_SIZE)]
+    probs = np.vstack([f.result() for f in futures])
+    end = time.perf_counter()
+
+    top = probs.argmax(axis=1)
+    top_conf = probs[np.arange(len(top)), top]
+    healthy = CLASS_LABELS.index("Healthy")
+    counts = np.bincount(top[top_conf >= TILE_MIN_CONFIDENCE], minlength=len(CLASS_LABELS))
+    counts[healthy] = 0
+    if counts.any():
+        # A lesion only shows in a few tiles, so the disease flagged by the most confident tiles wins
+        class_idx = int(counts.argmax())
+        flagged = (top == class_idx) & (top_conf >= TILE_MIN_CONFIDENCE)
+        confidence = float(probs[flagged, class_idx].mean())
+    else:
+        class_idx = healthy
+        confidence = float(probs[:, healthy].mean())
+    label = CLASS_LABELS[class_idx]
+
+    rows, cols = grid["rows"], grid["cols"]
+    elapsed = end - start
+    observe_stage("tiles", elapsed)
+    TILES_SCORED.inc(len(tiles))
+    PREDICTIONS.labels(label, source).inc()
+    with tile_lock:
+        tile_stats["frames"] += 1
+        tile_stats["tiles"] += len(tiles)
+        tile_stats["seconds"] += elapsed
+        tile_stats["over_budget"] += elapsed * 1000.0 > TILE_LATENCY_BUDGET_MS
+        per_tile = (end - decoded) / len(tiles)
+        previous = tile_stats["tile_seconds"]
+        tile_stats["tile_seconds"] = per_tile if not previous else 0.8 * previous + 0.2 * per_tile
+    log.debug("🧩 %s tiled %dx%d at %.2fx: %s (%.4f) in %.0f ms", source, rows, cols, grid["scale"], label,
+              confidence, elapsed * 1000.0)
+
+    return {
+        "label": label,
+        "confidence": confidence,
+        "rows": rows,
+        "cols": cols,
+        "scale": round(grid["scale"], 4),
+        "boxes": grid["boxes"],
+        "heatmap": {
+            "labels": [[CLASS_LABELS[i] for i in r] for r in top.reshape(rows, cols).tolist()],
+            "confidence": np.round(top_conf, 4).reshape(rows, cols).tolist(),
+        },
+        "tile_counts": {CLASS_LABELS[i]: int(n) for i, n in enumerate(np.bincount(top, minlength=len(CLASS_LABELS)))},
+        "elapsed_ms": round(elapsed * 1000.0, 1),
+        "budget_ms": TILE_LATENCY_BUDGET_MS,
+    }
+
+def tile_summary():
+    budget = tile_budget()
+    with tile_lock:
+        frames = tile_stats["frames"]
+        return {
+            "overlap": TILE_OVERLAP,
+            "max_tiles": TILE_MAX_TILES,
+            "budget_ms": TILE_LATENCY_BUDGET_MS,
+            "current_tile_budget": budget,
+            "frames": frames,
+            "avg_tiles": round(tile_stats["tiles"] / frames, 1) if frames else 0.0,
+            "avg_ms": round(tile_stats["seconds"] / frames * 1000.0, 1) if frames else 0.0,
+            "per_tile_ms": round(tile_stats["tile_seconds"] * 1000.0, 2),
+            "over_budget": tile_stats["over_budget"],
+        }
+
+def classify_bytes(img_bytes, source="Web"):
+    """Decode, preprocess and classify raw image bytes; returns (label, confidence)"""
+    # Skip the forward pass if this exact image was already scored by this model
+    digest = content_hash(img_bytes)
+    cached = prediction_cache.get(digest)
+    if cached is not None:
+        PREDICTIONS.labels(cached[0], source).inc()
+        return cached
+    model_id = MODEL_ID
+
+    # Shared draft-mode decode straight to 224x224 uint8; float conversion happens in the batch buffer
+    start = time.perf_counter()
+    img = decode(img_bytes)
+    decoded = time.perf_counter()
+    img_array = resize_rgb(img)
+    observe_stage("decode", decoded - start)
+    observe_stage("resize", time.perf_counter() - decoded)
+
+    # Predict (batched with any other in-flight requests)
+    priority = priority_for(source)
+    preds = predictor.predict(img_array, priority=priority)
+    if TTA_CONFIDENCE_THRESHOLD > 0:
+        preds = gated_second_pass(img_bytes, preds, priority)
+    class_idx = np.argmax(preds)
+    confidence = preds[class_idx]
+
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("🔍 %s detection probabilities: %s", source, dict(zip(CLASS_LABELS, preds)))
+        log.debug("🎯 %s detected: %s with %.4f confidence", source, CLASS_LABELS[class_idx], confidence)
+
+    PREDICTIONS.labels(CLASS_LABELS[class_idx], source).inc()
+    prediction_cache.put(digest, CLASS_LABELS[class_idx], confidence, model_id=model_id)
+    return CLASS_LABELS[class_idx], float(confidence)
+
+def predict_image(img_path, source="Demo"):
+    """Preprocess and detect a single image file using EfficientNet preprocessing"""
     try:
-        # Load and preprocess image
-        img = image.load_img(img_path, target_size=(224, 224))
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        # Use EfficientNet preprocessing
-        img_array = preprocess_input(img_array)
-        
-        # Predict
-        preds = model.predict(img_array, verbose=0)[0]
-        class_idx = np.argmax(preds)
-        confidence = preds[class_idx]
-        
-        print(f"🔍 Detection probabilities: {dict(zip(CLASS_LABELS, preds))}")
-        print(f"🎯 Detected: {CLASS_LABELS[class_idx]} with {confidence:.4f} confidence")
-        
-        return CLASS_LABELS[class_idx], float(confidence)
+        with open(img_path, "rb") as f:
+            img_bytes = f.read()
+        return classify_bytes(img_bytes, source=source)
         
-    except Exception as e:
-        print(f"❌ Error in predict_image: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except QueueFullError:
+        raise
+    except Exception:
+        log.exception("❌ Error in predict_image")
         return None, None
 
-def predict_image_from_bytes(img_bytes):
-    """Preprocess and predict image from byte data (ESP32) using EfficientNet preprocessing"""
+def predict_image_from_bytes(img_bytes, source="ESP32"):
+    """Preprocess and predict image from byte data (ESP32 or web upload) using EfficientNet preprocessing"""
     try:
-        # Open image from bytes
-        img_data = io.BytesIO(img_bytes)
-        img = Image.open(img_data)
-        
-        # Convert to RGB if needed
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize to model input size
-        img = img.resize((224, 224))
-        
-        # Convert to array and preprocess
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        # Use EfficientNet preprocessing
-        img_array = preprocess_input(img_array)
-        
-        # Predict
-        preds = model.predict(img_array, verbose=0)[0]
-        class_idx = np.argmax(preds)
-        confidence = preds[class_idx]
+        return classify_bytes(img_bytes, source=source)
         
-        print(f"🔍 ESP32 Prediction probabilities: {dict(zip(CLASS_LABELS, preds))}")
-        print(f"🎯 ESP32 Predicted: {CLASS_LABELS[class_idx]} with {confidence:.4f} confidence")
-        
-        return CLASS_LABELS[class_idx], float(confidence)
-        
-    except Exception as e:
-        print(f"❌ Error in predict_image_from_bytes: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except QueueFullError:
+        raise
+    except Exception:
+        log.exception("❌ Error in predict_image_from_bytes")
         return None, None
 
-# Store prediction history
-prediction_history = []
+def predict_upload(img_bytes, source, tiled=False):
+    """(label, confidence, tile analysis or None) from the single squashed view or the tiled full frame"""
+    if not tiled:
+        return (*predict_image_from_bytes(img_bytes, source=source), None)
+    try:
+        tiles = classify_tiles(img_bytes, source=source)
+        return tiles["label"], tiles["confidence"], tiles
+
+    except QueueFullError:
+        raise
+    except Exception:
+        log.exception("❌ Error in tiled analysis")
+        return None, None, None
+
+# Versions the history for page caching/ETags and pushes new predictions to live dashboards
+live_feed = LiveFeed(CLASS_LABELS, max_events=LIVE_FEED_EVENTS)
+
+# Store prediction history (writes are batched on a background thread)
+prediction_history = HistoryStore(
+    HISTORY_DB_PATH,
+    retention_days=HISTORY_RETENTION_DAYS,
+    max_records=HISTORY_MAX_RECORDS,
+    stage_timer=observe_stage,
+    listener=live_feed.publish,
+)
+
+# Persist captures off the request thread
+image_writer = ImageWriter(
+    UPLOAD_FOLDER,
+    max_workers=IMAGE_WRITER_THREADS,
+    thumbnail_size=THUMBNAIL_SIZE,
+    shard_by_date=SHARD_UPLOADS_BY_DATE,
+    stage_timer=observe_stage,
+)
+
+# Registry of ESP32 camera nodes; triggers fan out concurrently on a pooled session
+device_fleet = DeviceFleet(
+    DEVICE_REGISTRY_PATH,
+    connect_timeout=DEVICE_CONNECT_TIMEOUT,
+    read_timeout=DEVICE_READ_TIMEOUT,
+    max_workers=DEVICE_TRIGGER_THREADS,
+)
+for _device_id, _host, _group in parse_device_list(ESP32_DEVICES):
+    if not any(d["id"] == _device_id for d in device_fleet.devices()):
+        device_fleet.register(_device_id, _host, _group)
+
+# Time-series store for node sensor readings
+telemetry = TelemetryStore(
+    TELEMETRY_DB_PATH,
+    raw_retention_days=TELEMETRY_RAW_RETENTION_DAYS,
+    minute_retention_days=TELEMETRY_MINUTE_RETENTION_DAYS,
+)
+
+def conditions_for_upload(device_id):
+    """Readings sent with the upload (X-Temperature / X-Humidity), else the nearest stored one"""
+    temperature, humidity = request.headers.get("X-Temperature"), request.headers.get("X-Humidity")
+    if device_id and temperature is not None and humidity is not None:
+        telemetry.add(device_id, [{"temperature": temperature, "humidity": humidity}])
+    reading = telemetry.nearest(device_id, max_age_s=TELEMETRY_MAX_AGE_S)
+    if reading is None:
+        return {}
+    return {"temperature": reading["temperature"], "humidity": reading["humidity"]}
+
+# Structured thresholds are built once; the scores are cached briefly since telemetry arrives per minute
+RISK_THRESHOLDS = risk_engine.build_thresholds(disease_info)
+_risk_cache = {}
+_risk_lock = threading.Lock()
+
+def compute_risk(hours=RISK_WINDOW_HOURS):
+    """Per-device and per-field (device group) risk for every disease with risk_conditions"""
+    key = round(hours, 2)
+    with _risk_lock:
+        cached = _risk_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < RISK_CACHE_SECONDS:
+            return cached[1]
+
+    devices, _, temperature, humidity = telemetry.window(time.time() - hours * 3600, resolution="minute")
+    scores = risk_engine.score(RISK_THRESHOLDS, temperature, humidity, TELEMETRY_RESOLUTIONS["minute"])
+    groups = {d["id"]: d["group"] for d in device_fleet.devices()}
+    diseases = RISK_THRESHOLDS["diseases"]
+
+    per_device = []
+    for i, device_id in enumerate(devices):
+        risks = {
+            disease: {
+                "score": round(float(scores["score"][j, i]), 3),
+                "level": risk_engine.level_for(scores["score"][j, i]),
+                "longest_run_hours": round(float(scores["longest_run_hours"][j, i]), 2),
+                "favourable_hours": round(float(scores["favourable_hours"][j, i]), 2),
+            }
+            for j, disease in enumerate(diseases)
+        }
+        top = max(diseases, key=lambda d: risks[d]["score"]) if diseases else None
+        per_device.append({
+            "device": device_id,
+            "group": groups.get(device_id),
+            "max_score": risks[top]["score"] if top else 0.0,
+            "top_disease": top if top and risks[top]["score"] > 0 else None,
+            "coverage_hours": round(float(scores["coverage_hours"][i]), 2),
+            "latest": telemetry.latest(device_id),
+            "risks": risks,
+        })
+    per_device.sort(key=lambda d: d["max_score"], reverse=True)
+
+    fields = {}
+    for entry in per_device:
+        field = fields.setdefault(entry["group"] or "unassigned", {"devices": [], "risks": {}})
+        field["devices"].append(entry["device"])
+        for disease, risk in entry["risks"].items():
+            field["risks"][disease] = max(field["risks"].get(disease, 0.0), risk["score"])
+
+    result = {
+        "generated": datetime.datetime.now().isoformat(),
+        "window_hours": hours,
+        "thresholds": {d: disease_info[d]["risk_conditions"] for d in diseases},
+        "fields": fields,
+        "devices": per_device,
+    }
+    with _risk_lock:
+        _risk_cache[key] = (time.monotonic(), result)
+    return result
+
+# Point-in-time values read from the components that already track them
+metrics.gauge("model_ready", "1 once the model is loaded and warmed", lambda: int(model_ready()))
+metrics.gauge("inference_queue_depth", "Images waiting for a forward pass", predictor.queue_depth)
+metrics.counter_fn("inference_rejected", "Images rejected because the queue was full",
+                   lambda: predictor.stats()["rejected"])
+metrics.counter_fn("prediction_cache_lookups", "Prediction cache lookups by result",
+                   lambda: {("hit",): prediction_cache.stats()["hits"], ("miss",): prediction_cache.stats()["misses"]},
+                   ["result"])
+metrics.gauge("history_pending_writes", "History records queued but not yet committed",
+              lambda: prediction_history.stats()["pending_writes"])
+metrics.counter_fn("history_dropped", "History records lost because their batch could not be committed",
+                   lambda: prediction_history.stats()["dropped"])
+metrics.gauge("image_writer_pending", "Uploads queued but not yet on disk", lambda: image_writer.stats()["pending"])
+metrics.gauge("shadow_agreement", "Top-1 agreement between the active model and the shadow candidate",
+              lambda: model_manager.shadow_stats()["agreement"])
+
+admission = AdmissionController(
+    max_body_bytes=MAX_UPLOAD_MB * 1024 * 1024,
+    max_inflight=MAX_INFLIGHT_UPLOADS,
+    reserved_fraction=ESP32_RESERVED_FRACTION,
+    rate_per_minute=RATE_LIMIT_PER_MINUTE,
+    burst=RATE_LIMIT_BURST,
+)
+metrics.gauge("uploads_in_flight", "Uploads admitted and still being processed",
+              lambda: admission.stats()["inflight"])
+metrics.counter_fn("admission_rejected", "Uploads turned away before or while queueing, by reason and client",
+                   admission.rejections, ["reason", "client"])
+
+frame_filter = FrameFilter(
+    min_brightness=FRAME_MIN_BRIGHTNESS,
+    max_brightness=FRAME_MAX_BRIGHTNESS,
+    min_sharpness=FRAME_MIN_SHARPNESS,
+    min_green_ratio=FRAME_MIN_GREEN_RATIO,
+) if FRAME_FILTER else None
+if frame_filter is not None:
+    metrics.counter_fn("frames_rejected", "ESP32 frames sent back by the pre-filter before inference, by reason",
+                       frame_filter.rejections, ["reason"])
+
+def screen_frame(body, device_id):
+    """None if the frame is worth classifying, else the 422 response telling the node to recapture"""
+    start = time.perf_counter()
+    try:
+        frame_filter.check(body)
+        return None
+    except FrameRejected as rejection:
+        log.info("🚫 Frame from %s rejected (%s): %s", device_id or request.remote_addr, rejection.reason, rejection)
+        response = jsonify({
+            "status": "rejected",
+            "error": "Frame rejected",
+            "reason": rejection.reason,
+            "message": str(rejection),
+            "frame": rejection.stats or None,
+            "recapture": True,
+        })
+        response.status_code = 422
+        response.headers["X-Frame-Rejected"] = rejection.reason
+        return response
+    finally:
+        seconds = time.perf_counter() - start
+        frame_filter.record_check(seconds)
+        observe_stage("frame_check", seconds)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def admit_upload():
+    """Size, rate and concurrency checks for /upload before its body is read"""
+    if request.endpoint != "upload_file":
+        return None
+    # Raw bodies are ESP32 captures (the same test upload_file uses); multipart forms are the web page
+    raw_body = not (request.mimetype or "").startswith("multipart/")
+    g.upload_client = "esp32" if raw_body else "web"
+    key = request.headers.get("X-Device-ID") or request.remote_addr
+    try:
+        admission.admit(key, request.content_length, esp32=raw_body)
+    except Rejection as rejection:
+        response = jsonify({"error": "Upload rejected", "reason": rejection.reason, "message": str(rejection)})
+        response.status_code = rejection.status
+        if rejection.retry_after:
+            response.headers["Retry-After"] = str(rejection.retry_after)
+        return response
+    g.upload_admitted = True
+    return None
+
+@app.teardown_request
+def release_upload(exc=None):
+    if g.pop("upload_admitted", False):
+        admission.release()
+
+@app.after_request
+def record_request_metrics(response):
+    # Route templates (not raw paths) keep the label set bounded
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    start = getattr(g, "request_start", None)
+    if start is not None:
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+    HTTP_REQUESTS.labels(endpoint, response.status_code).inc()
+    return response
 
 # ------------------------------------------------
 # ROUTES
@@ -275,107 +899,216 @@ def index():
 
 @app.route("/trigger_esp32", methods=["POST"])
 def trigger_esp32():
-    """Trigger ESP32 camera to capture and upload an image"""
-    try:
-        # You'll need to update this IP to your ESP32's IP address
-        esp32_ip = "192.168.98.105"  # Update this with your ESP32's actual IP
-        esp32_url = f"http://{esp32_ip}/capture"
-        
-        response = requests.get(esp32_url, timeout=10)
-        
-        if response.status_code == 200:
-            result = response.json()
-            return jsonify({
-                "status": "success", 
-                "message": "ESP32 camera triggered successfully!",
-                "esp32_response": result
-            })
-        else:
-            return jsonify({
-                "status": "error", 
-                "message": f"ESP32 returned error: {response.status_code}"
-            }), 400
-            
-    except requests.exceptions.Timeout:
-        return jsonify({
-            "status": "error", 
-            "message": "Timeout: ESP32 didn't respond in time"
-        }), 500
-    except requests.exceptions.ConnectionError:
-        return jsonify({
-            "status": "error", 
-            "message": "Cannot connect to ESP32. Check if it's online and IP is correct."
-        }), 500
-    except Exception as e:
+    """Trigger every camera in a group (default: all devices) and wait for them to answer"""
+    group = request.args.get("group") or (request.get_json(silent=True) or {}).get("group")
+    job = device_fleet.trigger(group=group)
+    job.wait(DEVICE_CONNECT_TIMEOUT + DEVICE_READ_TIMEOUT + 1)
+    summary = job.summary()
+
+    if not summary["total"]:
+        return jsonify({"status": "error", "message": "No ESP32 devices registered"}), 400
+    if summary["responded"]:
+        first = summary["devices"][summary["responded"][0]]
         return jsonify({
-            "status": "error", 
-            "message": f"Error: {str(e)}"
-        }), 500
+            "status": "success",
+            "message": f"ESP32 camera triggered successfully! ({len(summary['responded'])}/{summary['total']} responded)",
+            "esp32_response": first.get("response"),
+            "job": summary
+        })
+    errors = "; ".join(f"{d}: {r.get('error', r['status'])}" for d, r in summary["devices"].items())
+    return jsonify({"status": "error", "message": errors, "job": summary}), 502
+
+@app.route("/devices", methods=["GET"])
+def list_devices():
+    """Registered ESP32 nodes with the outcome of their last trigger/upload: ?group="""
+    group = request.args.get("group") or None
+    return jsonify({
+        "devices": device_fleet.devices(group),
+        "groups": device_fleet.groups(),
+        "stats": device_fleet.stats()
+    })
+
+@app.route("/devices", methods=["POST"])
+def register_device():
+    """Register or update a node: {"id": ..., "host": "192.168.1.20[:port]", "group": ..., "timeout": ...}"""
+    data = request.get_json(silent=True) or {}
+    if not data.get("id") or not data.get("host"):
+        return jsonify({"error": "id and host are required"}), 400
+    device = device_fleet.register(data["id"], data["host"], data.get("group", "default"), data.get("timeout"))
+    return jsonify({"status": "success", "device": device}), 201
+
+@app.route("/devices/<device_id>", methods=["DELETE"])
+def remove_device(device_id):
+    if not device_fleet.remove(device_id):
+        return jsonify({"error": "Unknown device"}), 404
+    return jsonify({"status": "success"})
+
+@app.route("/devices/trigger", methods=["POST"])
+def trigger_devices():
+    """Fan out capture (or status) to {"devices": [...]}, {"group": ...} and/or {"min_risk": 0.5}; 202 + job id unless ?wait=1"""
+    data = request.get_json(silent=True) or {}
+    device_ids = data.get("devices")
+    if data.get("min_risk") is not None:
+        # Only nodes whose weather puts them at risk, highest risk fired first
+        registered = {d["id"] for d in device_fleet.devices(data.get("group"))}
+        device_ids = [d["device"] for d in compute_risk()["devices"]
+                      if d["max_score"] >= float(data["min_risk"]) and d["device"] in registered]
+        if not device_ids:
+            return jsonify({"status": "skipped", "message": "No device is at or above min_risk", "total": 0})
+    try:
+        job = device_fleet.trigger(
+            device_ids=device_ids,
+            group=data.get("group") or request.args.get("group"),
+            action=data.get("action") or request.args.get("action", "capture"),
+        )
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e.args[0])}), 400
+
+    if request.args.get("wait") == "1":
+        job.wait(DEVICE_CONNECT_TIMEOUT + DEVICE_READ_TIMEOUT + 1)
+        return jsonify(job.summary())
+    response = jsonify(job.summary())
+    response.status_code = 202
+    response.headers["Location"] = f"/devices/trigger/{job.id}"
+    return response
+
+@app.route("/devices/trigger/<job_id>")
+def trigger_status(job_id):
+    """Which nodes of a trigger job have responded, failed or are still pending"""
+    job = device_fleet.job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.summary())
+
+@app.route("/telemetry", methods=["POST"])
+def ingest_telemetry():
+    """Batched sensor readings: {"device": id, "readings": [{"ts"|"age_s", "temperature", "humidity"} or [ts, t, h], ...]}
+
+    A list of such objects, or a single reading with device/temperature/humidity, is also accepted.
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        return jsonify({"error": "Expected a JSON body"}), 400
+    payloads = data if isinstance(data, list) else [data]
+
+    accepted = rejected = 0
+    for payload in payloads:
+        if not isinstance(payload, dict):
+            rejected += 1
+            continue
+        device_id = (device_fleet.resolve(payload.get("device"), request.remote_addr)
+                     or payload.get("device") or request.remote_addr)
+        readings = payload.get("readings")
+        if readings is None:
+            readings = [payload]
+        if len(readings) > TELEMETRY_MAX_BATCH:
+            return jsonify({"error": f"At most {TELEMETRY_MAX_BATCH} readings per request"}), 413
+        ok, bad = telemetry.add(device_id, readings)
+        accepted += ok
+        rejected += bad
+
+    return jsonify({"status": "accepted", "accepted": accepted, "rejected": rejected}), 202
+
+@app.route("/telemetry")
+def telemetry_devices():
+    """Latest reading for every device"""
+    return jsonify({"devices": telemetry.latest(), "stats": telemetry.stats()})
+
+@app.route("/telemetry/<device_id>")
+def telemetry_series(device_id):
+    """Rollups for one device: ?hours=24&resolution=minute|hour (default: minute up to 6h, else hour)"""
+    hours = min(24 * 365, max(0.1, request.args.get("hours", 24, type=float)))
+    resolution = request.args.get("resolution") or ("minute" if hours <= 6 else "hour")
+    try:
+        series = telemetry.series(device_id, since=time.time() - hours * 3600, resolution=resolution)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "device": device_id,
+        "hours": hours,
+        "resolution": resolution,
+        "latest": telemetry.latest(device_id),
+        "series": series
+    })
+
+@app.route("/risk")
+def disease_risk():
+    """Weather-based disease risk per field and per device, highest risk first: ?hours=24"""
+    hours = min(24 * 30, max(1.0, request.args.get("hours", RISK_WINDOW_HOURS, type=float)))
+    return jsonify(compute_risk(hours))
 
 @app.route("/upload", methods=["POST"])
 def upload_file():
-    if model is None:
-        return jsonify({"error": "Model not loaded. Please check server logs."}), 500
+    if not model_ready():
+        return model_unavailable_response()
         
-    print(f"Received request - Content-Type: {request.content_type}")
-    print(f"Request data length: {len(request.data) if request.data else 0}")
+    read_start = time.perf_counter()
+    body = request.data
+    tiled = request.args.get("tiled", "1" if body and TILED_ESP32_UPLOADS else "0") == "1"
+    log.debug("Received request - Content-Type: %s, data length: %d", request.content_type, len(body))
     
     # Handle ESP32 raw image data
-    if request.data and len(request.data) > 0:
+    if body:
+        observe_stage("read", time.perf_counter() - read_start)
         try:
-            print(f"Processing ESP32 image data... ({len(request.data)} bytes)")
-            
-            # Verify it's a JPEG image
-            if len(request.data) < 2 or request.data[0] != 0xFF or request.data[1] != 0xD8:
-                print("Warning: Data doesn't appear to be a JPEG image")
-            else:
-                print("✅ Valid JPEG image received from ESP32")
-            
+            device_id = (device_fleet.record_upload(request.headers.get("X-Device-ID"), request.remote_addr)
+                         or request.headers.get("X-Device-ID"))
+
+            # Turn away truncated, dark, blurred or leafless frames before the forward pass
+            if frame_filter is not None:
+                rejected = screen_frame(body, device_id)
+                if rejected is not None:
+                    return rejected
+            log.debug("✅ Frame from ESP32 passed the pre-filter (%d bytes)", len(body))
+
             # Predict from byte data
-            label, confidence = predict_image_from_bytes(request.data)
+            predict_start = time.perf_counter()
+            label, confidence, tiles = predict_upload(body, "ESP32", tiled)
+            if frame_filter is not None:
+                frame_filter.record_inference(time.perf_counter() - predict_start)
             
             if label is None:
                 return jsonify({"error": "Failed to process the image"}), 400
             
-            # Save image for history and verification
+            # Save image for history and verification (written in the background)
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"esp32_capture_{timestamp}.jpg"
-            save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            
-            # Create directory if it doesn't exist
-            os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
-            
-            with open(save_path, 'wb') as f:
-                f.write(request.data)
+            filename, save_status = image_writer.submit(
+                body, f"esp32_capture_{timestamp}.jpg", digest=content_hash(body)
+            )
             
-            print(f"✅ Image saved as: {filename}")
-            print(f"💡 You can view it at: http://192.168.8.105:5000/static/uploads/{filename}")
+            log.debug("✅ Image queued for saving as: %s (%s)", filename, save_status)
             
-            # Save to history
-            prediction_history.append({
+            # Save to history, tagged with the node's field conditions at capture time
+            conditions = conditions_for_upload(device_id)
+            record = prediction_history.add({
                 "filename": filename,
                 "label": label,
                 "confidence": confidence,
                 "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "source": "ESP32"
+                "source": "ESP32",
+                "device": device_id,
+                **conditions
             })
             
-            print(f"🏆 Model Prediction: {label} (confidence: {confidence:.2%})")
-            # In your upload route, add this debug print:
-            print(f"Saving to history: {prediction_history[-1]}")
+            log.debug("🏆 Model Prediction: %s (confidence: %.2f%%)", label, confidence * 100)
+            log.debug("Saving to history: %s", record)
             return jsonify({
                 "status": "success",
                 "label": label,
                 "confidence": confidence,
                 "info": disease_info[label]["info"],
                 "solution": disease_info[label]["solution"],
-                "saved_as": filename
+                "saved_as": filename,
+                "save_status": save_status,
+                "device": device_id,
+                "conditions": conditions or None,
+                "tiles": tiles
             })
             
+        except QueueFullError:
+            raise
         except Exception as e:
-            print(f"❌ Error processing ESP32 image: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.exception("❌ Error processing ESP32 image")
             return jsonify({"error": "Failed to process the image", "message": str(e)}), 400
     
     # Handle file upload from web interface
@@ -383,16 +1116,20 @@ def upload_file():
         file = request.files["file"]
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            file.save(save_path)
+            img_bytes = file.read()
+            observe_stage("read", time.perf_counter() - read_start)
 
-            label, confidence = predict_image(save_path)
+            # Classify straight from the upload stream instead of re-reading the saved file
+            label, confidence, tiles = predict_upload(img_bytes, "Web Upload", tiled)
             
             if label is None:
                 return jsonify({"error": "Failed to process the image"}), 400
 
+            # Save in the background; filename becomes the shard-relative path
+            filename, save_status = image_writer.submit(img_bytes, filename, digest=content_hash(img_bytes))
+
             # Save to history
-            prediction_history.append({
+            prediction_history.add({
                 "filename": filename,
                 "label": label,
                 "confidence": confidence,
@@ -416,7 +1153,9 @@ def upload_file():
                     "confidence": confidence,
                     "info": disease_info[label]["info"],
                     "solution": disease_info[label]["solution"],
-                    "filename": filename
+                    "filename": filename,
+                    "save_status": save_status,
+                    "tiles": tiles
                 })
             else:
                 return redirect(f"/result/{filename}")
@@ -427,63 +1166,304 @@ def upload_file():
     else:
         return jsonify({"error": "No file uploaded"}), 400
 
+def classify_with_retry(img_bytes, source, attempts=20):
+    """classify_bytes for bulk jobs: wait for room in the inference queue instead of failing"""
+    for attempt in range(attempts):
+        try:
+            return classify_bytes(img_bytes, source=source)
+        except QueueFullError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+def iter_batch_predictions(entries, source):
+    """Classify (name, bytes) entries concurrently so the batcher can coalesce them; yields in order"""
+    window = deque()
+    error = None
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_SIZE, thread_name_prefix="upload-batch") as pool:
+        try:
+            for name, img_bytes in entries:
+                future = pool.submit(classify_with_retry, img_bytes, source) if img_bytes else None
+                window.append((name, img_bytes, future))
+                # Keep about two forward passes in flight so early results stream out
+                if len(window) >= BATCH_MAX_SIZE * 2:
+                    yield window.popleft()
+        except ArchiveError as e:
+            error = e  # report what was already read before the archive broke off
+        while window:
+            yield window.popleft()
+    if error is not None:
+        raise error
+
+@app.route("/upload_batch", methods=["POST"])
+def upload_batch():
+    """Classify many images (multipart files and/or zip/tar archives) and stream NDJSON results"""
+    if not model_ready():
+        return model_unavailable_response()
+
+    max_archive_bytes = int(BATCH_UPLOAD_MAX_ARCHIVE_MB * 1024 * 1024)
+    if request.content_length is not None and request.content_length > max_archive_bytes:
+        return jsonify({"error": f"Upload exceeds {BATCH_UPLOAD_MAX_ARCHIVE_MB:g} MB"}), 413
+
+    files = request.files.getlist("files") + request.files.getlist("file")
+    entries = iter_uploads(
+        files,
+        raw_stream=request.stream if not files else None,
+        content_type=request.content_type,
+        max_files=BATCH_UPLOAD_MAX_FILES,
+        max_bytes=int(BATCH_UPLOAD_MAX_IMAGE_MB * 1024 * 1024),
+        max_archive_bytes=max_archive_bytes,
+    )
+    source = "Batch Upload"
+
+    # Read the first entry now so a corrupt or oversized archive is a 400, not a truncated stream
+    try:
+        first = next(entries, None)
+    except ArchiveError as e:
+        return jsonify({"error": "Invalid archive", "message": str(e)}), 400
+    if first is not None:
+        entries = chain([first], entries)
+
+    def generate():
+        start = time.perf_counter()
+        count = errors = 0
+        truncated = False
+        try:
+            for index, (original_name, img_bytes, future) in enumerate(iter_batch_predictions(entries, source)):
+                count += 1
+                line = {"index": index, "filename": original_name}
+                try:
+                    if future is None:
+                        raise ValueError("Unsupported file type or file too large")
+                    label, confidence = future.result()
+
+                    filename = secure_filename(os.path.basename(original_name)) or f"batch_{index}.jpg"
+                    filename, save_status = image_writer.submit(img_bytes, filename, digest=content_hash(img_bytes))
+                    prediction_history.add({
+                        "filename": filename,
+                        "label": label,
+                        "confidence": confidence,
+                        "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "source": source
+                    })
+                    line.update({
+                        "status": "success",
+                        "label": label,
+                        "confidence": confidence,
+                        "saved_as": filename,
+                        "save_status": save_status,
+                        "result_url": f"/result/{filename}"
+                    })
+                except Exception as e:
+                    errors += 1
+                    line.update({"status": "error", "error": str(e)})
+                yield json.dumps(line) + "\n"
+        except TooManyFiles as e:
+            # The first e.limit entries were reported above; the rest were not read
+            log.warning("⚠️ Batch upload stopped at the %d file limit", e.limit)
+            truncated = True
+            yield json.dumps({"status": "error", "error": str(e), "limit": e.limit}) + "\n"
+        except ArchiveError as e:
+            # Entries read before the archive broke off were reported above; say why the rest are missing
+            log.warning("⚠️ Batch upload archive unreadable after %d entries: %s", count, e)
+            errors += 1
+            yield json.dumps({"status": "error", "error": str(e)}) + "\n"
+
+        yield json.dumps({
+            "status": "done",
+            "count": count,
+            "errors": errors,
+            "truncated": truncated,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000.0, 1)
+        }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.errorhandler(QueueFullError)
+def inference_queue_full(e):
+    """Shed load instead of queueing unboundedly when the batcher is saturated"""
+    admission.count_rejection(QUEUE_FULL, g.get("upload_client", "web"))
+    response = jsonify({"error": "Server busy", "reason": QUEUE_FULL, "message": str(e)})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
 @app.route("/dashboard")
 def dashboard():
-    # Demo predictions – real model inference
-    demo_files = ["healthy.jpg", "blight.jpg", "grayleaf.jpg", "rust.jpg"]
-    demo_results = []
-    for f in demo_files:
+    # Rendered once per history version; polling browsers revalidate with If-None-Match
+    etag = dashboard_etag()
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    if model_ready() and MODEL_ID not in demo_cache:
+        # Demo predictions pending (or shed while the batcher was full): don't cache a page without them
+        html = render_dashboard()
+        return cacheable(html, dashboard_etag())
+    html = live_feed.cached(("dashboard", model_state["state"], MODEL_ID), render_dashboard)
+    return cacheable(html, etag)
+
+def dashboard_etag():
+    demos = "demos" if MODEL_ID in demo_cache else "nodemos"
+    return f"dashboard-{live_feed.version}-{model_state['state']}-{content_hash(MODEL_ID.encode())[:8]}-{demos}"
+
+def render_dashboard():
+    live_feed.refresh(prediction_history.label_totals)
+    return render_template(
+        "dashboard.html",
+        demo_results=demo_results(),
+        # History predictions – ESP32 or manual uploads (newest first)
+        history=prediction_history.query(limit=HISTORY_PAGE_SIZE),
+        summary=live_feed.summary(),
+        disease_info=disease_info
+    )
+
+demo_cache = {}
+
+def demo_results():
+    """Demo predictions – real model inference, once per model (skipped until the model is ready)"""
+    if not model_ready():
+        return []
+    if MODEL_ID in demo_cache:
+        return demo_cache[MODEL_ID]
+    results = []
+    for f in ["healthy.jpg", "blight.jpg", "grayleaf.jpg", "rust.jpg"]:
         path = os.path.join(DEMO_FOLDER, f)
         if os.path.exists(path):
-            label, confidence = predict_image(path)
+            try:
+                label, confidence = predict_image(path)
+            except QueueFullError:
+                # Uploads come first; show the page without demos and try again on the next render
+                log.warning("⚠️ Skipping demo predictions: inference queue is full")
+                return []
             if label is not None:
-                demo_results.append({
+                results.append({
                     "filename": f,
                     "label": label,
                     "confidence": round(confidence * 100, 2)  # Convert to percentage
                 })
+    demo_cache[MODEL_ID] = results
+    return results
 
-    # History predictions – ESP32 or manual uploads
-    # Convert dict format to object-like format for template compatibility
-    history = []
-    for record in prediction_history[::-1]:  # Newest first
-        history.append({
-            "filename": record["filename"],
-            "label": record["label"],
-            "confidence": record["confidence"]
-        })
+def cacheable(body, etag, mimetype="text/html"):
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"  # always revalidate, usually to a 304
+    return response
 
-    return render_template(
-        "dashboard.html",
-        demo_results=demo_results,
-        history=history,
-        disease_info=disease_info
-    )
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 @app.route("/history")
 def history():
-    # Convert dict format to template-friendly format
-    history_items = []
-    for record in prediction_history[::-1]:  # Newest first
-        history_items.append({
-            "filename": record["filename"],
-            "label": record["label"],
-            "confidence": record["confidence"],
-            "time": record["time"],
-            "source": record.get("source", "Unknown")
+    """Paginated, filterable history: ?page=&per_page=&label=&source=&since=&until=&format=json"""
+    etag = f"history-{live_feed.version}-{content_hash(request.full_path.encode())[:16]}"
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    wants_json = request.args.get("format") == "json"
+    body = live_feed.cached(("history", request.full_path), render_history)
+    return cacheable(body, etag, "application/json" if wants_json else "text/html")
+
+def render_history():
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = min(500, max(1, request.args.get("per_page", HISTORY_PAGE_SIZE, type=int)))
+    filters = {
+        "label": request.args.get("label") or None,
+        "source": request.args.get("source") or None,
+        "since": request.args.get("since") or None,
+        "until": request.args.get("until") or None,
+    }
+
+    history_items = prediction_history.query(limit=per_page, offset=(page - 1) * per_page, **filters)
+    if any(filters.values()):
+        summary = prediction_history.summary(**filters)
+    else:
+        # Unfiltered totals come from the incrementally maintained counts, not a table scan
+        live_feed.refresh(prediction_history.label_totals)
+        summary = live_feed.summary()
+    pages = max(1, (summary["total"] + per_page - 1) // per_page)
+
+    if request.args.get("format") == "json":
+        return json.dumps({
+            "items": history_items,
+            "summary": summary,
+            "page": page,
+            "per_page": per_page,
+            "pages": pages
         })
-    
-    return render_template("history.html", items=history_items)
 
-@app.route("/result/<filename>")
+    return render_template(
+        "history.html",
+        items=history_items,
+        summary=summary,
+        page=page,
+        pages=pages,
+        per_page=per_page,
+        filters=filters,
+        labels=CLASS_LABELS
+    )
+
+def feed_event(version, record):
+    """JSON payload for one new prediction, with its dashboard table row pre-rendered once for all clients"""
+    row_html = live_feed.cached(("row", version), lambda: render_template("_history_row.html", record=record),
+                                versioned=False)
+    return {"version": version, "record": record, "row_html": row_html}
+
+@app.route("/events")
+def events():
+    """Server-sent events: one "prediction" event per new history record, resumable via Last-Event-ID"""
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", live_feed.version, type=int)
+
+    def generate():
+        live_feed.subscribe()
+        try:
+            version = since
+            yield "retry: 3000\n\n"
+            while True:
+                current, new_events, missed = live_feed.wait(version, LIVE_FEED_HEARTBEAT_S)
+                if missed:
+                    # Fell out of the ring buffer: the page must reload to be consistent
+                    yield f"id: {current}\nevent: reload\ndata: {{}}\n\n"
+                else:
+                    for event_version, record in new_events:
+                        yield f"id: {event_version}\nevent: prediction\ndata: {json.dumps(feed_event(event_version, record))}\n\n"
+                if current == version:
+                    yield ": keepalive\n\n"
+                else:
+                    live_feed.refresh(prediction_history.label_totals)
+                    yield f"id: {current}\nevent: summary\ndata: {json.dumps(live_feed.summary())}\n\n"
+                version = current
+        finally:
+            live_feed.unsubscribe()
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # don't let a reverse proxy buffer the stream
+    return response
+
+@app.route("/events/poll")
+def poll_events():
+    """Long-poll fallback: ?since=<version>&timeout=<s> holds until something newer arrives"""
+    since = request.args.get("since", live_feed.version, type=int)
+    timeout = min(LIVE_FEED_MAX_WAIT_S, max(0.0, request.args.get("timeout", LIVE_FEED_MAX_WAIT_S, type=float)))
+    current, new_events, missed = live_feed.wait(since, timeout)
+    live_feed.refresh(prediction_history.label_totals)
+    return jsonify({
+        "version": current,
+        "reload": missed,
+        "events": [] if missed else [feed_event(v, record) for v, record in new_events],
+        "summary": live_feed.summary(),
+    })
+
+@app.route("/result/<path:filename>")
 def result(filename):
     """Show individual result page for a specific image"""
-    # Find the prediction for this filename
-    prediction = None
-    for record in prediction_history:
-        if record["filename"] == filename:
-            prediction = record
-            break
+    # Indexed lookup of the latest prediction for this filename
+    prediction = prediction_history.get(filename)
     
     if not prediction:
         return redirect("/dashboard")
@@ -497,34 +1477,128 @@ def result(filename):
         solution=disease_info[prediction["label"]]["solution"],
         disease_info=disease_info,  # Pass the entire dictionary
         time=prediction["time"],
-        source=prediction.get("source", "Unknown")
+        source=prediction.get("source", "Unknown"),
+        temperature=prediction.get("temperature"),
+        humidity=prediction.get("humidity")
     )
 
+@app.route("/save_status/<path:filename>")
+def save_status(filename):
+    """Poll whether a background image save has finished"""
+    status = image_writer.status(filename)
+    if status is None:
+        return jsonify({"error": "Unknown file"}), 404
+    return jsonify({
+        "filename": filename,
+        "save_status": status,
+        "thumbnail": image_writer.thumbnail_path(filename)
+    })
+
 # Health check endpoint
 @app.route("/health")
 def health():
-    model_status = "loaded" if model is not None else "failed"
     return jsonify({
         "status": "healthy", 
-        "model_status": model_status,
-        "model_path": MODEL_PATH,
+        "model_status": model_state["state"],
+        "model_error": model_state["error"],
+        "model_load_seconds": model_state["load_seconds"],
+        "model_warmup_seconds": model_state["warmup_seconds"],
+        "model_path": model_manager.active.path if model_manager.active else MODEL_PATH,
+        "backend": INFERENCE_BACKEND,
+        "inference_queue": predictor.stats(),
+        "admission": admission.stats(),
+        "frame_filter": frame_filter.stats() if frame_filter is not None else None,
+        "inference_workers": current_model().stats() if INFERENCE_WORKERS > 0 and current_model() else None,
+        "prediction_cache": prediction_cache.stats(),
+        "tta": tta_summary(),
+        "tiles": tile_summary(),
+        "history": prediction_history.stats(),
+        "live_feed": live_feed.stats(),
+        "image_writer": image_writer.stats(),
+        "devices": device_fleet.stats(),
+        "telemetry": telemetry.stats(),
         "timestamp": datetime.datetime.now().isoformat()
     })
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of stage latencies, request counters and queue gauges"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
 # Model info endpoint
 @app.route("/model_info")
 def model_info():
-    if model is None:
-        return jsonify({"error": "Model not loaded"}), 500
-    
+    if not model_ready():
+        return model_unavailable_response()
+
+    model = current_model()
     return jsonify({
         "model_type": "EfficientNetB0",
+        "backend": INFERENCE_BACKEND,
+        "model_path": model_manager.active.path,
         "input_shape": model.input_shape,
         "output_shape": model.output_shape,
         "classes": CLASS_LABELS,
-        "num_classes": len(CLASS_LABELS)
+        "num_classes": len(CLASS_LABELS),
+        **model_manager.info()
     })
 
+def admin_denied():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin routes are disabled; set ADMIN_TOKEN to enable them"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        return jsonify({"error": "Admin token required"}), 403
+    return None
+
+def resolve_model_path(path):
+    """Real path of a checkpoint under MODEL_DIR, or None if it points anywhere else"""
+    root = os.path.realpath(MODEL_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    return resolved if os.path.commonpath([root, resolved]) == root else None
+
+@app.route("/model/reload", methods=["POST"])
+def reload_model():
+    """Load a checkpoint in the background and swap it in once warm: {"path": ..., "role": "active"|"candidate"}"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    body = request.get_json(silent=True) or {}
+    role = body.get("role", ACTIVE)
+    if role not in (ACTIVE, CANDIDATE):
+        return jsonify({"error": f"role must be {ACTIVE!r} or {CANDIDATE!r}"}), 400
+    path = body.get("path")
+    if path is not None:
+        if not isinstance(path, str) or not path:
+            return jsonify({"error": "path must be a non-empty string"}), 400
+        path = resolve_model_path(path)
+        if path is None:
+            return jsonify({"error": f"path must be inside the model directory ({MODEL_DIR})"}), 400
+    else:
+        path = SHADOW_MODEL_PATH if role == CANDIDATE else MODEL_PATH
+    if not path or not os.path.isfile(path):
+        return jsonify({"error": f"Model file not found: {path}"}), 400
+    if not model_manager.reload(path, role):
+        return jsonify({"error": f"A {role} model is already loading", **model_manager.info()}), 409
+    return jsonify({"status": "loading", "role": role, "path": path}), 202
+
+@app.route("/model/promote", methods=["POST"])
+def promote_model():
+    """Make the shadow candidate the active model without reloading it"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    version = model_manager.promote()
+    if version is None:
+        return jsonify({"error": "No candidate model loaded"}), 409
+    return jsonify({"status": "promoted", "active": version.info()})
+
+@app.route("/model/candidate", methods=["DELETE"])
+def drop_candidate_model():
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify({"removed": model_manager.drop_candidate()})
+
 # ------------------------------------------------
 # MAIN
 # ------------------------------------------------
@@ -533,15 +1607,14 @@ if __name__ == "__main__":
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(DEMO_FOLDER, exist_ok=True)
     
-    print("🚀 Starting Flask server with EfficientNet model...")
-    print(f"📁 Upload folder: {UPLOAD_FOLDER}")
-    print(f"📁 Demo folder: {DEMO_FOLDER}")
-    print(f"🤖 Model path: {MODEL_PATH}")
-    print(f"📊 Classes: {CLASS_LABELS}")
+    log.info("🚀 Starting Flask server with EfficientNet model...")
+    log.info("📁 Upload folder: %s", UPLOAD_FOLDER)
+    log.info("📁 Demo folder: %s", DEMO_FOLDER)
+    log.info("🤖 Model path: %s", MODEL_PATH)
+    log.info("📊 Classes: %s", CLASS_LABELS)
     
-    if model is not None:
-        print("✅ Model loaded successfully! Ready to serve detections.")
-    else:
-        print("❌ Model failed to load. Check the model path and file.")
+    log.info("🤖 Model status: %s (check /health until it reports ready)", model_state["state"])
     
-    app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
+    if INFERENCE_WORKERS > 0:
+        log.info("🧵 Serving with %d inference worker processes", INFERENCE_WORKERS)
+    app.run(debug=FLASK_DEBUG, host="0.0.0.0", port=5000, threaded=True)
\ No newline at end of file
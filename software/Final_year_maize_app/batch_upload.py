@@ -0,0 +1,127 @@
+"""Helpers for /upload_batch: expand multipart files and zip/tar archives.
+
+Everything here yields (name, bytes) pairs lazily so an archive with hundreds
+of photos is never held in memory as a whole; bytes is None for entries that
+were skipped (unsupported type, too large) so the caller can report them.
+An unreadable or oversized archive raises ArchiveError, and an upload with more
+than max_files entries raises TooManyFiles once that many have been yielded.
+"""
+import os
+import tarfile
+import tempfile
+import zipfile
+
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+ZIP_TYPES = {"application/zip", "application/x-zip-compressed"}
+TAR_TYPES = {"application/x-tar", "application/gzip", "application/x-gzip", "application/x-gtar"}
+SPOOL_MEMORY_BYTES = 16 * 1024 * 1024  # a streamed zip is buffered in memory up to this, then on disk
+
+
+class ArchiveError(Exception):
+    """The archive is corrupt, not the type it claims to be, or too large"""
+
+
+class TooManyFiles(ArchiveError):
+    """The upload holds more entries than the caller accepts; the first `limit` were yielded"""
+
+    def __init__(self, limit):
+        super().__init__("too many files")
+        self.limit = limit
+
+
+def is_image_name(name):
+    return "." in name and name.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def archive_kind(name="", content_type=""):
+    """'zip', 'tar' or None based on filename or Content-Type"""
+    lowered = (name or "").lower()
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if lowered.endswith(".zip") or content_type in ZIP_TYPES:
+        return "zip"
+    if lowered.endswith((".tar", ".tar.gz", ".tgz")) or content_type in TAR_TYPES:
+        return "tar"
+    return None
+
+
+def _skip_member(name):
+    base = os.path.basename(name)
+    return not base or base.startswith(".") or "__MACOSX" in name
+
+
+def iter_zip(fileobj, max_bytes):
+    """Zip needs random access; fileobj must be seekable"""
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or _skip_member(info.filename):
+                continue
+            if not is_image_name(info.filename) or info.file_size > max_bytes:
+                yield info.filename, None
+                continue
+            yield info.filename, archive.read(info)
+
+
+def iter_tar(fileobj, max_bytes):
+    """Stream mode ('r|*') so plain and gzipped tars are read front to back without seeking"""
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or _skip_member(member.name):
+                continue
+            if not is_image_name(member.name) or member.size > max_bytes:
+                yield member.name, None
+                continue
+            yield member.name, archive.extractfile(member).read()
+
+
+def spool(fileobj, max_archive_bytes):
+    """Copy a non-seekable stream into a seekable temporary file, refusing more than max_archive_bytes"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    copied = 0
+    while True:
+        chunk = fileobj.read(1024 * 1024)
+        if not chunk:
+            break
+        copied += len(chunk)
+        if copied > max_archive_bytes:
+            spooled.close()
+            raise ArchiveError(f"Archive is larger than {max_archive_bytes} bytes")
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def iter_archive(kind, fileobj, max_bytes, max_archive_bytes):
+    try:
+        if kind == "tar":
+            yield from iter_tar(fileobj, max_bytes)
+        elif fileobj.seekable():
+            yield from iter_zip(fileobj, max_bytes)
+        else:
+            with spool(fileobj, max_archive_bytes) as spooled:
+                yield from iter_zip(spooled, max_bytes)
+    except (zipfile.BadZipFile, tarfile.TarError, OSError, EOFError) as e:
+        raise ArchiveError(f"Unreadable {kind} archive: {e}") from e
+
+
+def iter_uploads(files, raw_stream=None, content_type="", max_files=1000, max_bytes=20 * 1024 * 1024,
+                 max_archive_bytes=512 * 1024 * 1024):
+    """Yield (name, bytes-or-None) for every image in the multipart files or raw archive body"""
+    def entries():
+        for storage in files:
+            kind = archive_kind(storage.filename, storage.mimetype)
+            if kind:
+                yield from iter_archive(kind, storage.stream, max_bytes, max_archive_bytes)
+            elif is_image_name(storage.filename or ""):
+                data = storage.read(max_bytes + 1)
+                yield storage.filename, data if len(data) <= max_bytes else None
+            else:
+                yield storage.filename or "unnamed", None
+
+        kind = archive_kind(content_type=content_type)
+        if not files and raw_stream is not None and kind:
+            yield from iter_archive(kind, raw_stream, max_bytes, max_archive_bytes)
+
+    for count, entry in enumerate(entries()):
+        if count >= max_files:
+            raise TooManyFiles(max_files)
+        yield entry
@@ -0,0 +1,140 @@
+"""Micro-benchmark: legacy decode+preprocess vs the shared draft-mode pipeline.
+
+Usage:
+    python bench_preprocess.py [--folder static/uploads] [--repeat 20] [--uxga]
+
+--uxga re-encodes every sample as a 1600x1200 JPEG first, which is what the
+ESP32 actually sends with FRAMESIZE_UXGA. Peak memory comes from tracemalloc,
+so it covers numpy/Python allocations but not Pillow's internal pixel buffers.
+"""
+import argparse
+import io
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import TARGET_SIZE, BatchBuffer, decode_rgb
+
+try:
+    from tensorflow.keras.applications.efficientnet import preprocess_input
+    from tensorflow.keras.preprocessing import image as keras_image
+except ImportError:
+    # EfficientNet's preprocess_input is the identity and load_img is PIL + nearest resize
+    preprocess_input = None
+    keras_image = None
+
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+
+
+# ------------------------------------------------
+# LEGACY PIPELINES (as app.py did it before the shared stage)
+# ------------------------------------------------
+def legacy_from_bytes(img_bytes):
+    img = Image.open(io.BytesIO(img_bytes))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img = img.resize((224, 224))
+    img_array = np.asarray(img, dtype=np.float32)
+    img_array = np.expand_dims(img_array, axis=0)
+    if preprocess_input is not None:
+        img_array = preprocess_input(img_array)
+    return img_array
+
+
+def legacy_from_path(img_bytes, tmp_path):
+    # The web path saved the upload, then re-read it with load_img
+    with open(tmp_path, "wb") as f:
+        f.write(img_bytes)
+    if keras_image is not None:
+        img = keras_image.load_img(tmp_path, target_size=(224, 224))
+    else:
+        img = Image.open(tmp_path).convert("RGB").resize((224, 224), Image.NEAREST)
+    img_array = np.asarray(img, dtype=np.float32)
+    img_array = np.expand_dims(img_array, axis=0)
+    if preprocess_input is not None:
+        img_array = preprocess_input(img_array)
+    return img_array
+
+
+def make_shared(buffer):
+    def shared(img_bytes):
+        return buffer.fill([decode_rgb(img_bytes)])
+    return shared
+
+
+# ------------------------------------------------
+# HARNESS
+# ------------------------------------------------
+def load_samples(folder, uxga):
+    samples = []
+    for name in sorted(os.listdir(folder)):
+        if "." not in name or name.rsplit(".", 1)[1].lower() not in ALLOWED_EXTENSIONS:
+            continue
+        with open(os.path.join(folder, name), "rb") as f:
+            data = f.read()
+        if uxga:
+            img = Image.open(io.BytesIO(data)).convert("RGB").resize((1600, 1200))
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=90)
+            data = out.getvalue()
+        samples.append((name, data))
+    return samples
+
+
+def measure(fn, samples, repeat):
+    # Warm-up so import/first-call costs are excluded
+    for _, data in samples:
+        fn(data)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, data in samples:
+            fn(data)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for _, data in samples:
+        fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_image_ms = elapsed / (repeat * len(samples)) * 1000.0
+    return per_image_ms, peak / 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", default="static/uploads")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--uxga", action="store_true", help="re-encode samples as 1600x1200 JPEG frames")
+    args = parser.parse_args()
+
+    samples = load_samples(args.folder, args.uxga)
+    if not samples:
+        print(f"No images found in {args.folder}")
+        return
+
+    tmp_path = os.path.join(args.folder, ".bench_tmp")
+    buffer = BatchBuffer(1, TARGET_SIZE, preprocess_fn=preprocess_input)
+    pipelines = [
+        ("legacy predict_image_from_bytes", legacy_from_bytes),
+        ("legacy predict_image (save + load_img)", lambda data: legacy_from_path(data, tmp_path)),
+        ("shared decode_rgb + BatchBuffer", make_shared(buffer)),
+    ]
+
+    print(f"{len(samples)} images from {args.folder}{' (UXGA re-encoded)' if args.uxga else ''}, {args.repeat} rounds")
+    print(f"{'pipeline':42s} {'ms/image':>10s} {'peak KiB':>10s}")
+    try:
+        for name, fn in pipelines:
+            per_image_ms, peak_kib = measure(fn, samples, args.repeat)
+            print(f"{name:42s} {per_image_ms:10.2f} {peak_kib:10.1f}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+if __name__ == "__main__":
+    main()
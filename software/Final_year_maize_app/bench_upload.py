@@ -0,0 +1,257 @@
+"""Load test for /upload: simulated ESP32 field nodes and web uploads.
+
+Usage:
+    python bench_upload.py [--url http://127.0.0.1:5000] [--mode esp32|web|both]
+                           [--nodes 8] [--rate 0.5] [--duration 30] [--out results.json]
+    python bench_upload.py --spawn stub --stub-latency-ms 40 ...
+
+Every node replays the images in static/uploads and static/demo (PNGs
+re-encoded as JPEG, as the camera would send them): ESP32 mode
+POSTs the raw JPEG body with the X-ESP32-Camera header, web mode sends a
+multipart form with ?ajax=1. --rate is requests/second per node (open loop,
+so a slow server shows up as latency); --rate 0 sends back to back.
+
+Each payload gets a few random bytes appended after the JPEG end marker so
+the prediction cache and upload dedup don't turn the run into a cache
+benchmark; pass --allow-cache to replay identical bytes.
+
+--spawn starts app.py on a free port first: "stub" uses INFERENCE_BACKEND=stub
+to measure the HTTP/decode path without TensorFlow, "model" the real model.
+Results (throughput, p50/p95/p99 latency, error rate, status codes and the
+server's /health afterwards) are written as JSON so runs can be diffed.
+"""
+import argparse
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+from preprocessing import to_jpeg
+
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+SAMPLE_FOLDERS = ["static/uploads", "static/demo"]
+
+
+def load_payloads(folders):
+    """(name, JPEG bytes) per sample image; PNGs are re-encoded since ESP32 nodes only send JPEG"""
+    payloads = []
+    for folder in folders:
+        for name in sorted(os.listdir(folder)):
+            if "." in name and name.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS:
+                with open(os.path.join(folder, name), "rb") as f:
+                    payloads.append((name.rsplit(".", 1)[0] + ".jpg", to_jpeg(f.read())))
+    return payloads
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(kind, stub_latency_ms, extra_env):
+    port = free_port()
+    env = dict(os.environ, FLASK_DEBUG="0", **extra_env)
+    if kind == "stub":
+        env.update(INFERENCE_BACKEND="stub", STUB_LATENCY_MS=str(stub_latency_ms))
+    code = f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"
+    process = subprocess.Popen([sys.executable, "-c", code], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            if requests.get(f"{url}/health", timeout=1).json().get("model_status") == "ready":
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not become ready within 300s")
+
+
+# ------------------------------------------------
+# LOAD GENERATION
+# ------------------------------------------------
+class Node(threading.Thread):
+    """One simulated field node / browser with its own keep-alive session"""
+
+    def __init__(self, index, url, mode, payloads, rate, deadline, bust_cache, timeout):
+        super().__init__(daemon=True)
+        self.index = index
+        self.url = url
+        self.mode = mode
+        self.payloads = payloads
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.deadline = deadline
+        self.bust_cache = bust_cache
+        self.timeout = timeout
+        self.samples = []   # (latency seconds, status code or 0 for transport errors)
+        self.rng = np.random.default_rng()
+
+    def _payload(self, i):
+        name, data = self.payloads[(self.index + i) % len(self.payloads)]
+        if self.bust_cache:
+            data = data + self.rng.bytes(8)
+        return name, data
+
+    def _send(self, session, name, data):
+        if self.mode == "esp32":
+            return session.post(f"{self.url}/upload", data=data, timeout=self.timeout, headers={
+                "Content-Type": "application/octet-stream",
+                "X-ESP32-Camera": "true",
+                "X-Device-ID": f"bench-node-{self.index}",
+            })
+        return session.post(f"{self.url}/upload?ajax=1", files={"file": (name, data)}, timeout=self.timeout)
+
+    def run(self):
+        session = requests.Session()
+        # Stagger node start times across one interval
+        next_send = time.perf_counter() + (self.interval * self.index / 8.0 if self.interval else 0.0)
+        i = 0
+        while True:
+            now = time.perf_counter()
+            if now >= self.deadline:
+                break
+            if next_send > now:
+                time.sleep(min(next_send - now, self.deadline - now))
+                continue
+
+            name, data = self._payload(i)
+            start = time.perf_counter()
+            try:
+                status = self._send(session, name, data).status_code
+            except requests.RequestException:
+                status = 0
+            self.samples.append((time.perf_counter() - start, status))
+            i += 1
+            next_send = next_send + self.interval if self.interval else time.perf_counter()
+
+
+def summarize(samples, elapsed):
+    latencies = np.array([s[0] for s in samples]) * 1000.0
+    statuses = [s[1] for s in samples]
+    ok = sum(1 for s in statuses if s == 200)
+    codes = {}
+    for s in statuses:
+        codes[str(s)] = codes.get(str(s), 0) + 1
+    ok_latencies = np.array([s[0] for s in samples if s[1] == 200]) * 1000.0
+
+    def pct(values, q):
+        return round(float(np.percentile(values, q)), 2) if len(values) else None
+
+    return {
+        "requests": len(samples),
+        "ok": ok,
+        "errors": len(samples) - ok,
+        "error_rate": round((len(samples) - ok) / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": pct(ok_latencies, 50),
+            "p95": pct(ok_latencies, 95),
+            "p99": pct(ok_latencies, 99),
+            "mean": round(float(ok_latencies.mean()), 2) if len(ok_latencies) else None,
+            "max": round(float(ok_latencies.max()), 2) if len(ok_latencies) else None,
+            "all_mean": round(float(latencies.mean()), 2) if len(latencies) else None,
+        },
+        "status_codes": codes,
+    }
+
+
+def run_mode(url, mode, payloads, args):
+    deadline = time.perf_counter() + args.duration
+    nodes = [Node(i, url, mode, payloads, args.rate, deadline, not args.allow_cache, args.timeout)
+             for i in range(args.nodes)]
+    start = time.perf_counter()
+    for node in nodes:
+        node.start()
+    for node in nodes:
+        node.join()
+    elapsed = time.perf_counter() - start
+    return summarize([s for node in nodes for s in node.samples], elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--spawn", choices=["stub", "model"], help="start app.py locally instead of using --url")
+    parser.add_argument("--stub-latency-ms", type=float, default=40.0, help="simulated forward-pass time for --spawn stub")
+    parser.add_argument("--mode", choices=["esp32", "web", "both"], default="both")
+    parser.add_argument("--nodes", type=int, default=8, help="concurrent simulated nodes")
+    parser.add_argument("--rate", type=float, default=0.0, help="requests/second per node (0 = back to back)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per mode")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--allow-cache", action="store_true", help="replay identical bytes (exercises the cache)")
+    parser.add_argument("--label", default="", help="free-form tag stored in the JSON, e.g. a git commit")
+    parser.add_argument("--out", help="JSON output path (default bench_results/upload_<timestamp>.json)")
+    args = parser.parse_args()
+
+    payloads = load_payloads(SAMPLE_FOLDERS)
+    process = None
+    url = args.url
+    if args.spawn:
+        # Keep benchmark artifacts out of the real history, uploads, telemetry, device registry and cache
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        process, url = spawn_server(args.spawn, args.stub_latency_ms, {
+            "HISTORY_DB_PATH": f"bench_results/history_{stamp}.sqlite3",
+            "UPLOAD_FOLDER": f"bench_results/uploads_{stamp}",
+            "TELEMETRY_DB_PATH": f"bench_results/telemetry_{stamp}.sqlite3",
+            "DEVICE_REGISTRY_PATH": f"bench_results/devices_{stamp}.json",
+            "PREDICTION_CACHE_PATH": "",
+        })
+
+    try:
+        modes = ["esp32", "web"] if args.mode == "both" else [args.mode]
+        results = {}
+        for mode in modes:
+            print(f"▶️  {mode}: {args.nodes} nodes, rate {args.rate or 'max'}/s each, {args.duration:.0f}s")
+            results[mode] = run_mode(url, mode, payloads, args)
+            r = results[mode]
+            print(f"   {r['throughput_rps']} req/s ok, p50 {r['latency_ms']['p50']} ms, "
+                  f"p95 {r['latency_ms']['p95']} ms, p99 {r['latency_ms']['p99']} ms, "
+                  f"errors {r['error_rate']:.1%} {r['status_codes']}")
+
+        try:
+            health = requests.get(f"{url}/health", timeout=5).json()
+        except (requests.RequestException, ValueError):
+            health = None
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "label": args.label,
+        "timestamp": datetime.datetime.now().isoformat(),
+        "config": {
+            "url": url,
+            "spawn": args.spawn,
+            "stub_latency_ms": args.stub_latency_ms if args.spawn == "stub" else None,
+            "nodes": args.nodes,
+            "rate_per_node": args.rate,
+            "duration_s": args.duration,
+            "cache_busting": not args.allow_cache,
+            "images": len(payloads),
+        },
+        "results": results,
+        "server_health": health,
+    }
+    out = args.out or os.path.join("bench_results", f"upload_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Load test: inference throughput vs number of worker processes.
+
+Usage:
+    python bench_workers.py [--model models/best_model.keras] [--max-workers 4]
+                            [--batch-size 8] [--duration 20]
+
+For each worker count from 1 to --max-workers this starts an
+InferenceWorkerPool, keeps it saturated from two client threads per worker
+with batches of decoded sample images, and reports images/sec and the speedup
+over a single worker. Worker counts beyond the number of usable cores are
+still measured but cannot scale.
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from preprocessing import decode_rgb
+from worker_pool import InferenceWorkerPool
+
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+
+
+def load_images(folders):
+    images = []
+    for folder in folders:
+        for name in sorted(os.listdir(folder)):
+            if "." in name and name.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS:
+                images.append(decode_rgb(os.path.join(folder, name)))
+    return np.stack(images)
+
+
+def saturate(pool, images, batch_size, duration, clients):
+    done = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def client(i):
+        offset = i
+        while time.perf_counter() < deadline:
+            idx = (np.arange(batch_size) + offset) % len(images)
+            pool.predict(images[idx])
+            done[i] += batch_size
+            offset += batch_size
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(done) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="models/best_model.keras")
+    parser.add_argument("--backend", default="keras", choices=["keras", "tflite"])
+    parser.add_argument("--max-workers", type=int, default=len(os.sched_getaffinity(0))
+                        if hasattr(os, "sched_getaffinity") else os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per worker count")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--no-pin", action="store_true", help="don't pin workers to cores")
+    args = parser.parse_args()
+
+    images = load_images(["static/demo", "static/uploads"])
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(f"{len(images)} images, batch size {args.batch_size}, {cores} usable cores, {args.duration:.0f}s per run")
+    print(f"{'workers':>8s} {'img/s':>10s} {'speedup':>8s} {'startup s':>10s}")
+
+    baseline = None
+    for n in range(1, args.max_workers + 1):
+        start = time.perf_counter()
+        pool = InferenceWorkerPool(
+            args.model,
+            num_workers=n,
+            backend=args.backend,
+            max_batch_size=args.batch_size,
+            threads_per_worker=args.threads_per_worker,
+            pin_cores=not args.no_pin,
+            warmup_sizes=(args.batch_size,),
+        ).start()
+        startup = time.perf_counter() - start
+        try:
+            throughput = saturate(pool, images, args.batch_size, args.duration, clients=2 * n)
+        finally:
+            pool.close()
+        baseline = baseline or throughput
+        print(f"{n:8d} {throughput:10.1f} {throughput / baseline:7.2f}x {startup:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
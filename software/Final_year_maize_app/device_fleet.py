@@ -0,0 +1,303 @@
+"""Registry and concurrent trigger path for a fleet of ESP32 camera nodes.
+
+Devices are grouped (e.g. one group per field) and stored in a small JSON
+file. Triggering a group fans the firmware's GET /capture (or /status) out
+over a thread pool that shares one keep-alive requests.Session, so a whole
+group fires at once and a dead node only costs its own connect timeout
+instead of blocking a Flask request thread. Each fan-out is a TriggerJob whose
+per-device results can be polled while it runs.
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+ACTIONS = {"capture": "/capture", "status": "/status"}
+
+PENDING = "pending"
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+UNREACHABLE = "unreachable"
+
+
+def parse_device_list(spec):
+    """Parse "id=host[:port][@group],..." into (id, host, group) tuples"""
+    devices = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        device_id, _, rest = item.partition("=")
+        host, _, group = rest.partition("@")
+        if not device_id or not host:
+            raise ValueError(f"Bad device entry {item!r}, expected id=host[@group]")
+        devices.append((device_id.strip(), host.strip(), group.strip() or "default"))
+    return devices
+
+
+def now_string():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class TriggerJob:
+    """One fan-out of an action to a set of devices"""
+
+    def __init__(self, action, device_ids):
+        self.id = uuid.uuid4().hex[:12]
+        self.action = action
+        self.created = now_string()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.results = OrderedDict((d, {"status": PENDING}) for d in device_ids)
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if not device_ids:
+            self._finish()
+
+    def record(self, device_id, result):
+        with self._lock:
+            self.results[device_id] = result
+            if all(r["status"] != PENDING for r in self.results.values()):
+                self._finish()
+
+    def _finish(self):
+        self.finished = time.perf_counter()
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def summary(self):
+        with self._lock:
+            results = {d: dict(r) for d, r in self.results.items()}
+        counts = {}
+        for r in results.values():
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        end = self.finished or time.perf_counter()
+        return {
+            "job_id": self.id,
+            "action": self.action,
+            "created": self.created,
+            "done": self._done.is_set(),
+            "elapsed_ms": round((end - self.started) * 1000.0, 1),
+            "total": len(results),
+            "responded": [d for d, r in results.items() if r["status"] == OK],
+            "failed": [d for d, r in results.items() if r["status"] not in (OK, PENDING)],
+            "pending": [d for d, r in results.items() if r["status"] == PENDING],
+            "counts": counts,
+            "devices": results,
+        }
+
+
+class DeviceFleet:
+    """Persistent device registry plus pooled, concurrent trigger requests"""
+
+    def __init__(self, registry_path, connect_timeout=2.0, read_timeout=20.0, max_workers=16, max_jobs=100):
+        self.registry_path = registry_path
+        self.connect_timeout = float(connect_timeout)
+        self.read_timeout = float(read_timeout)
+        self.max_jobs = int(max_jobs)
+
+        self._lock = threading.Lock()
+        self._devices = OrderedDict()   # id -> {"id", "host", "group", "timeout", ...last results}
+        self._jobs = OrderedDict()      # job id -> TriggerJob, oldest first
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="esp32-trigger")
+
+        # One keep-alive pool per device host, shared by every trigger thread
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=max(1, int(max_workers)), max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._load()
+
+    # ------------------------------------------------
+    # REGISTRY
+    # ------------------------------------------------
+    def _load(self):
+        if not self.registry_path or not os.path.exists(self.registry_path):
+            return
+        try:
+            with open(self.registry_path) as f:
+                for device in json.load(f):
+                    self._devices[device["id"]] = self._new_device(
+                        device["id"], device["host"], device.get("group", "default"), device.get("timeout"))
+        except (OSError, ValueError, KeyError) as e:
+            log.error("❌ Could not read device registry %s: %s", self.registry_path, e)
+
+    def _save(self):
+        if not self.registry_path:
+            return
+        directory = os.path.dirname(self.registry_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        devices = [{k: d[k] for k in ("id", "host", "group", "timeout")} for d in self._devices.values()]
+        tmp_path = self.registry_path + ".part"
+        with open(tmp_path, "w") as f:
+            json.dump(devices, f, indent=2)
+        os.replace(tmp_path, self.registry_path)
+
+    @staticmethod
+    def _new_device(device_id, host, group, timeout=None):
+        return {
+            "id": device_id,
+            "host": host,
+            "group": group or "default",
+            "timeout": float(timeout) if timeout else None,   # read timeout override in seconds
+            "last_seen": None,
+            "last_status": None,
+            "last_latency_ms": None,
+            "last_error": None,
+            "last_upload": None,
+            "consecutive_failures": 0,
+        }
+
+    def register(self, device_id, host, group="default", timeout=None):
+        """Add or update a device; returns its record"""
+        with self._lock:
+            existing = self._devices.get(device_id)
+            device = self._new_device(device_id, host, group, timeout)
+            if existing is not None and existing["host"] == device["host"]:
+                # Same node moved group or got a new timeout: keep its history
+                for key in ("last_seen", "last_status", "last_latency_ms", "last_error", "last_upload",
+                            "consecutive_failures"):
+                    device[key] = existing[key]
+            self._devices[device_id] = device
+            self._save()
+            return dict(device)
+
+    def remove(self, device_id):
+        with self._lock:
+            removed = self._devices.pop(device_id, None) is not None
+            if removed:
+                self._save()
+            return removed
+
+    def devices(self, group=None):
+        with self._lock:
+            return [dict(d) for d in self._devices.values() if group is None or d["group"] == group]
+
+    def groups(self):
+        with self._lock:
+            counts = {}
+            for d in self._devices.values():
+                counts[d["group"]] = counts.get(d["group"], 0) + 1
+            return counts
+
+    def _find(self, device_id=None, remote_addr=None):
+        # An explicit id wins; the source IP is only used for nodes that don't send one
+        if device_id:
+            return self._devices.get(device_id)
+        if remote_addr:
+            return next((d for d in self._devices.values() if d["host"].split(":")[0] == remote_addr), None)
+        return None
+
+    def resolve(self, device_id=None, remote_addr=None):
+        """Registered id for a node identified by X-Device-ID or source IP, or None"""
+        with self._lock:
+            device = self._find(device_id, remote_addr)
+            return device["id"] if device is not None else None
+
+    def record_upload(self, device_id=None, remote_addr=None):
+        """Note an image arriving from a node, matched by X-Device-ID or source IP"""
+        with self._lock:
+            device = self._find(device_id, remote_addr)
+            if device is not None:
+                device["last_upload"] = now_string()
+                device["last_seen"] = device["last_upload"]
+            return device["id"] if device is not None else None
+
+    # ------------------------------------------------
+    # TRIGGERING
+    # ------------------------------------------------
+    def trigger(self, device_ids=None, group=None, action="capture"):
+        """Fire `action` on the given devices (or a whole group) concurrently; returns the TriggerJob"""
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action {action!r}, expected one of {sorted(ACTIONS)}")
+        with self._lock:
+            if device_ids:
+                unknown = [d for d in device_ids if d not in self._devices]
+                if unknown:
+                    raise KeyError(f"Unknown devices: {', '.join(unknown)}")
+                targets = [dict(self._devices[d]) for d in device_ids]
+            else:
+                targets = [dict(d) for d in self._devices.values() if group is None or d["group"] == group]
+
+        job = TriggerJob(action, [d["id"] for d in targets])
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        for device in targets:
+            self._executor.submit(self._call, job, device)
+        return job
+
+    def job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _call(self, job, device):
+        url = f"http://{device['host']}{ACTIONS[job.action]}"
+        timeout = (self.connect_timeout, device["timeout"] or self.read_timeout)
+        start = time.perf_counter()
+        result = {"status": ERROR}
+        try:
+            response = self._session.get(url, timeout=timeout)
+            try:
+                body = response.json()
+            except ValueError:
+                body = {"raw": response.text[:200]}
+            if response.status_code == 200 and body.get("status", "success") in ("success", "online"):
+                result = {"status": OK, "response": body}
+            else:
+                result = {"status": ERROR, "http_status": response.status_code, "response": body,
+                          "error": body.get("message") or f"HTTP {response.status_code}"}
+        except requests.exceptions.ConnectTimeout:
+            result = {"status": UNREACHABLE, "error": f"No connection within {timeout[0]}s"}
+        except requests.exceptions.ReadTimeout:
+            result = {"status": TIMEOUT, "error": f"No response within {timeout[1]}s"}
+        except requests.exceptions.ConnectionError:
+            result = {"status": UNREACHABLE, "error": "Cannot connect. Check if it's online and the IP is correct."}
+        except Exception as e:
+            result = {"status": ERROR, "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000.0, 1)
+
+        with self._lock:
+            current = self._devices.get(device["id"])
+            if current is not None:
+                current["last_status"] = result["status"]
+                current["last_latency_ms"] = result["latency_ms"]
+                if result["status"] == OK:
+                    current["last_seen"] = now_string()
+                    current["last_error"] = None
+                    current["consecutive_failures"] = 0
+                else:
+                    current["last_error"] = result.get("error")
+                    current["consecutive_failures"] += 1
+        job.record(device["id"], result)
+
+    def stats(self):
+        with self._lock:
+            devices = list(self._devices.values())
+            return {
+                "devices": len(devices),
+                "groups": len({d["group"] for d in devices}),
+                "online": sum(1 for d in devices if d["last_status"] == OK),
+                "failing": sum(1 for d in devices if d["consecutive_failures"] > 0),
+                "jobs": len(self._jobs),
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
@@ -0,0 +1,121 @@
+"""Stand-in for the ESP32-S3 camera firmware, for testing the fleet trigger path.
+
+Usage:
+    python esp32_stub.py [--count 4] [--port 8100] [--group field-a]
+                         [--upload-url http://127.0.0.1:5000/upload] [--delay-ms 300] [--fail-rate 0.1]
+
+Starts --count HTTP servers on consecutive ports that answer like
+arduino_code/ESP32S3_Smartmaize.ino: GET /capture returns
+{"status": "success", "message": "Image captured and uploaded successfully!"}
+(or the firmware's 500 error body) and GET /status returns {"status": "online", ...}.
+With --upload-url each capture also POSTs a sample image to the server the
+way the firmware does (raw JPEG body, X-ESP32-Camera header; PNG samples are
+re-encoded), before replying.
+--delay-ms simulates the capture time. --fail-rate makes that fraction of
+captures fail.
+
+The ESP32_DEVICES line printed at startup registers the stubs with app.py.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from preprocessing import to_jpeg
+
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+
+
+def load_images(folders):
+    images = []
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if "." in name and name.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS:
+                with open(os.path.join(folder, name), "rb") as f:
+                    images.append(to_jpeg(f.read()))  # the firmware only sends JPEG
+    return images
+
+
+def make_handler(device_id, args, images):
+    session = requests.Session()
+
+    class FirmwareHandler(BaseHTTPRequestHandler):
+        def _send_json(self, code, body):
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/status":
+                self._send_json(200, {"status": "online", "ip": self.server.server_address[0],
+                                      "free_heap": random.randint(150000, 200000), "device": device_id})
+            elif self.path == "/capture":
+                time.sleep(args.delay_ms / 1000.0)
+                ok = random.random() >= args.fail_rate
+                if ok and args.upload_url and images:
+                    try:
+                        response = session.post(args.upload_url, data=random.choice(images), timeout=30, headers={
+                            "Content-Type": "application/octet-stream",
+                            "X-ESP32-Camera": "true",
+                            "X-Device-ID": device_id,
+                        })
+                        ok = response.status_code == 200
+                    except requests.RequestException:
+                        ok = False
+                if ok:
+                    self._send_json(200, {"status": "success", "message": "Image captured and uploaded successfully!"})
+                else:
+                    self._send_json(500, {"status": "error", "message": "Failed to capture or upload image"})
+            else:
+                self._send_json(404, {"status": "error", "message": "Not found"})
+
+        def log_message(self, format, *log_args):
+            if args.verbose:
+                super().log_message(format, *log_args)
+
+    return FirmwareHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1, help="number of simulated nodes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100, help="port of the first node")
+    parser.add_argument("--group", default="default")
+    parser.add_argument("--upload-url", help="POST a sample image here on each capture, like the firmware")
+    parser.add_argument("--delay-ms", type=float, default=300.0, help="simulated capture time")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of captures that fail")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    images = load_images(["static/demo", "static/uploads"])
+    servers = []
+    for i in range(args.count):
+        device_id = f"stub-{args.port + i}"
+        server = ThreadingHTTPServer((args.host, args.port + i), make_handler(device_id, args, images))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((device_id, server))
+
+    spec = ",".join(f"{d}={args.host}:{s.server_address[1]}@{args.group}" for d, s in servers)
+    print(f"📡 {args.count} stub ESP32 nodes running; register them with:")
+    print(f"   ESP32_DEVICES={spec}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for _, server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Cheap pre-filter that turns away unusable camera frames before inference.
+
+A frame is checked in two steps, both far cheaper than a forward pass:
+
+    1. structure - SOI marker, a frame header (SOF) before the scan data and
+                   an EOI marker at the end; a frame cut short in transit or
+                   by a PSRAM overflow fails here without being decoded
+    2. content   - a 1/8-scale draft decode (about 200x150 for UXGA) gives
+                   the mean brightness, the variance of the Laplacian (low
+                   when the frame is out of focus or motion-blurred) and the
+                   share of green pixels (low when the lens points at soil,
+                   sky or a wall instead of a leaf)
+
+A failed check raises FrameRejected with a reason code the node can act on,
+e.g. recapture with the flash on after "too_dark". The filter also keeps the
+time it spends next to the average inference time of the frames it passed,
+so /health can show what it costs against what it saves.
+"""
+import threading
+
+import numpy as np
+
+from preprocessing import open_image
+
+NOT_JPEG = "not_jpeg"
+TRUNCATED = "truncated"
+CORRUPT = "corrupt"
+TOO_DARK = "too_dark"
+TOO_BRIGHT = "too_bright"
+BLURRY = "blurry"
+NO_LEAF = "no_leaf"
+
+REASONS = (NOT_JPEG, TRUNCATED, CORRUPT, TOO_DARK, TOO_BRIGHT, BLURRY, NO_LEAF)
+
+# Default thresholds, calibrated on the sample leaves and on synthetic dark/blurred/soil UXGA frames
+MIN_BRIGHTNESS = 30      # mean luma, 0-255
+MAX_BRIGHTNESS = 235
+MIN_SHARPNESS = 15       # Laplacian variance at 1/8 scale
+MIN_GREEN_RATIO = 0.05   # share of foliage-green pixels
+
+STATS_SIZE = (160, 120)  # draft-decode target; libjpeg picks the smallest scale at least this big
+EOI_SLACK = 64           # bytes of padding tolerated after the EOI marker
+
+
+class FrameRejected(Exception):
+    """A frame that is not worth running through the model, and why"""
+
+    def __init__(self, reason, message, stats=None):
+        super().__init__(message)
+        self.reason = reason
+        self.stats = stats or {}
+
+
+# ------------------------------------------------
+# CHECKS
+# ------------------------------------------------
+def check_jpeg(data):
+    """Walk the JPEG markers up to the scan data; raises FrameRejected if the frame is not a whole JPEG"""
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        raise FrameRejected(NOT_JPEG, f"No JPEG start marker ({len(data)} bytes)")
+
+    pos, has_frame_header = 2, False
+    while True:
+        if pos + 4 > len(data):
+            raise FrameRejected(TRUNCATED, f"Headers end at byte {pos} of {len(data)}")
+        if data[pos] != 0xFF:
+            raise FrameRejected(CORRUPT, f"Expected a marker at byte {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0xDA:  # start of scan: entropy-coded data follows
+            break
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            has_frame_header = True
+        pos += 2 + ((data[pos + 2] << 8) | data[pos + 3])
+    if not has_frame_header:
+        raise FrameRejected(CORRUPT, "No frame header before the scan data")
+
+    # The camera driver may pad the buffer after EOI, so look for it near the end
+    if data.rfind(b"\xff\xd9", max(pos, len(data) - EOI_SLACK)) < 0:
+        raise FrameRejected(TRUNCATED, f"No end-of-image marker ({len(data)} bytes)")
+
+
+def frame_stats(data, size=STATS_SIZE):
+    """Brightness (0-255 mean luma), sharpness (Laplacian variance) and green-pixel ratio of a small decode"""
+    img = open_image(data)
+    if img.format == "JPEG":
+        img.draft("RGB", size)
+    img = img.convert("RGB")
+    if img.width > 2 * size[0]:  # not a JPEG, or one without a reduced-scale decode
+        img = img.resize(size)
+    rgb = np.asarray(img, dtype=np.float32)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+
+    luma = 0.299 * r + 0.587 * g + 0.114 * b
+    laplacian = (4.0 * luma[1:-1, 1:-1] - luma[:-2, 1:-1] - luma[2:, 1:-1]
+                 - luma[1:-1, :-2] - luma[1:-1, 2:])
+    # Excess green (2G - R - B) separates foliage from soil, sky and shadow
+    green = (2.0 * g - r - b) > 20.0
+    return {
+        "width": img.width,
+        "height": img.height,
+        "brightness": round(float(luma.mean()), 1),
+        "sharpness": round(float(laplacian.var()), 1),
+        "green_ratio": round(float(green.mean()), 3),
+    }
+
+
+# ------------------------------------------------
+# FILTER
+# ------------------------------------------------
+class FrameFilter:
+    """Applies the checks against configured thresholds and accounts for their cost"""
+
+    def __init__(self, min_brightness=MIN_BRIGHTNESS, max_brightness=MAX_BRIGHTNESS, min_sharpness=MIN_SHARPNESS,
+                 min_green_ratio=MIN_GREEN_RATIO):
+        self.min_brightness = float(min_brightness)
+        self.max_brightness = float(max_brightness)
+        self.min_sharpness = float(min_sharpness)
+        self.min_green_ratio = float(min_green_ratio)
+
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._rejected = {reason: 0 for reason in REASONS}
+        self._check_seconds = 0.0
+        self._passed = 0
+        self._passed_seconds = 0.0  # inference time of the frames that were let through
+
+    def check(self, data):
+        """Stats of an acceptable frame; raises FrameRejected otherwise"""
+        try:
+            check_jpeg(data)
+            try:
+                stats = frame_stats(data)
+            except Exception as e:
+                raise FrameRejected(CORRUPT, f"Could not decode the frame: {e}")
+
+            if stats["brightness"] < self.min_brightness:
+                raise FrameRejected(TOO_DARK, f"Mean brightness {stats['brightness']} is below "
+                                              f"{self.min_brightness:g}", stats)
+            if stats["brightness"] > self.max_brightness:
+                raise FrameRejected(TOO_BRIGHT, f"Mean brightness {stats['brightness']} is above "
+                                                f"{self.max_brightness:g}", stats)
+            if stats["sharpness"] < self.min_sharpness:
+                raise FrameRejected(BLURRY, f"Sharpness {stats['sharpness']} is below {self.min_sharpness:g}", stats)
+            if stats["green_ratio"] < self.min_green_ratio:
+                raise FrameRejected(NO_LEAF, f"Only {stats['green_ratio']:.1%} of the frame is green", stats)
+            return stats
+        except FrameRejected as rejection:
+            with self._lock:
+                self._rejected[rejection.reason] += 1
+            raise
+
+    def record_check(self, seconds):
+        with self._lock:
+            self._checked += 1
+            self._check_seconds += seconds
+
+    def record_inference(self, seconds):
+        """Time the rest of the pipeline took for a frame that passed; what a rejection saves"""
+        with self._lock:
+            self._passed += 1
+            self._passed_seconds += seconds
+
+    def rejections(self):
+        with self._lock:
+            return {(reason,): n for reason, n in self._rejected.items()}
+
+    def stats(self):
+        with self._lock:
+            rejected = sum(self._rejected.values())
+            avg_check = self._check_seconds / self._checked if self._checked else 0.0
+            avg_inference = self._passed_seconds / self._passed if self._passed else 0.0
+            return {
+                "thresholds": {
+                    "min_brightness": self.min_brightness,
+                    "max_brightness": self.max_brightness,
+                    "min_sharpness": self.min_sharpness,
+                    "min_green_ratio": self.min_green_ratio,
+                },
+                "checked": self._checked,
+                "rejected": rejected,
+                "rejected_by_reason": {reason: n for reason, n in self._rejected.items() if n},
+                "avg_check_ms": round(avg_check * 1000.0, 2),
+                "avg_inference_ms": round(avg_inference * 1000.0, 2),
+                "check_seconds": round(self._check_seconds, 3),
+                "inference_seconds_saved": round(rejected * avg_inference, 3),
+            }
@@ -0,0 +1,379 @@
+"""Durable prediction history backed by SQLite in WAL mode.
+
+Writes from the upload path are queued and flushed in batches by a background
+thread, so persisting history never sits on the inference critical path.
+A batch that fails to commit is retried once after a short backoff; records
+that still fail are counted as dropped in stats().
+Records that are queued but not yet flushed are kept in a small pending map so
+`/result/<filename>` can find them immediately after an upload redirect, and
+query()/summary() merge them into what they read instead of waiting for the
+writer. The writer thread owns one connection; reads share a small pool.
+An optional stage_timer(stage, seconds) callback is told how long each
+batched "history_write" commit took, and an optional listener(record, seq) is
+called for every added record (with None, None after compaction removed some),
+which is how the live feed keeps its counts and page versions current. seq
+numbers records in the order they were added; label_totals() reports the last
+seq its totals include so a listener can avoid counting a record twice.
+"""
+import contextlib
+import datetime
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+COLUMNS = ("filename", "label", "confidence", "time", "source", "device", "temperature", "humidity")
+# Columns added after the first release, migrated in place on startup
+OPTIONAL_COLUMNS = {"device": "TEXT", "temperature": "REAL", "humidity": "REAL"}
+SELECT_COLUMNS = ", ".join(COLUMNS)
+
+log = logging.getLogger(__name__)
+
+
+class HistoryStore:
+    """Indexed, paginated prediction history with a retention policy"""
+
+    def __init__(self, path, retention_days=0, max_records=0, flush_interval=0.5,
+                 flush_batch_size=256, compact_interval=3600, stage_timer=None, listener=None, read_pool_size=4):
+        self.path = path
+        self.stage_timer = stage_timer
+        self.listener = listener
+        self.retention_days = int(retention_days)
+        self.max_records = int(max_records)
+        self.flush_interval = float(flush_interval)
+        self.flush_batch_size = int(flush_batch_size)
+        self.compact_interval = float(compact_interval)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._reads = queue.LifoQueue(maxsize=max(1, int(read_pool_size)))  # idle read connections
+        self._write_conn = self._connect()
+        self._write_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._unwritten = {}        # seq -> record, for reads that run ahead of the writer
+        self._pending_lock = threading.Lock()
+        self._flushed = threading.Condition()
+        self._written = 0
+        self._dropped = 0           # records lost because their batch could not be committed
+        self._seq = 0               # last seq handed out by add()
+        self._committed_seq = 0     # last seq the writer has finished with
+        self._commit_lock = threading.Lock()  # a commit and _committed_seq move together
+        self._last_compact = 0.0
+
+        self._init_schema()
+        self._running = True
+        self._thread = threading.Thread(target=self._writer, name="history-writer", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------
+    # CONNECTIONS
+    # ------------------------------------------------
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextlib.contextmanager
+    def _reader(self):
+        """A pooled read connection; closed instead of pooled when the pool is full or the store closed"""
+        try:
+            conn = self._reads.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            try:
+                if not self._running:
+                    raise queue.Full
+                self._reads.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def _init_schema(self):
+        conn = self._write_conn
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                label TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                time TEXT NOT NULL,
+                source TEXT NOT NULL,
+                device TEXT,
+                temperature REAL,
+                humidity REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_filename ON history (filename);
+            CREATE INDEX IF NOT EXISTS idx_history_time ON history (time);
+            CREATE INDEX IF NOT EXISTS idx_history_label ON history (label, id);
+            CREATE INDEX IF NOT EXISTS idx_history_source ON history (source, id);
+            """
+        )
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(history)")}
+        for column, kind in OPTIONAL_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE history ADD COLUMN {column} {kind}")
+        conn.commit()
+
+    # ------------------------------------------------
+    # WRITES
+    # ------------------------------------------------
+    def add(self, record):
+        """Queue a record for persistence; returns immediately"""
+        record = {
+            "filename": record["filename"],
+            "label": record["label"],
+            "confidence": float(record["confidence"]),
+            "time": record.get("time") or datetime.datetime.now().strftime(TIME_FORMAT),
+            "source": record.get("source", "Unknown"),
+            "device": record.get("device"),
+            "temperature": record.get("temperature"),
+            "humidity": record.get("humidity"),
+        }
+        with self._pending_lock:
+            self._pending[record["filename"]] = record
+            self._seq += 1
+            seq = self._seq
+            self._unwritten[seq] = record
+            self._queue.put((seq, record))  # under the lock so the queue stays in seq order
+        if self.listener is not None:
+            self.listener(record, seq)
+        return record
+
+    def flush(self, timeout=5):
+        """Block until everything queued so far has been written"""
+        deadline = time.monotonic() + timeout
+        with self._flushed:
+            while self._queue.unfinished_tasks and time.monotonic() < deadline:
+                self._flushed.wait(0.05)
+
+    def close(self):
+        self.flush()
+        self._running = False
+        self._thread.join(timeout=5)
+        while True:
+            try:
+                self._reads.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._write_lock:
+            self._write_conn.close()
+
+    def _writer(self):
+        while self._running:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.flush_batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if batch:
+                self._write_batch(batch)
+            if self.compact_interval and time.monotonic() - self._last_compact >= self.compact_interval:
+                try:
+                    self.compact()
+                except sqlite3.Error as e:
+                    log.error("❌ History compaction failed: %s", e)
+
+    def _insert(self, batch):
+        conn = self._write_conn
+        try:
+            conn.executemany(
+                f"INSERT INTO history ({SELECT_COLUMNS}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(r[c] for c in COLUMNS) for r in batch],
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+    def _write_batch(self, batch, attempts=2, backoff=0.5):
+        start = time.perf_counter()
+        seqs = [seq for seq, _ in batch]
+        last_seq = seqs[-1]
+        batch = [record for _, record in batch]
+        try:
+            for attempt in range(1, attempts + 1):
+                try:
+                    with self._write_lock, self._commit_lock:
+                        self._insert(batch)
+                        self._committed_seq = last_seq
+                    break
+                except sqlite3.Error as e:
+                    if attempt < attempts:
+                        log.warning("⚠️ Persisting %d history records failed (%s), retrying", len(batch), e)
+                        time.sleep(backoff * attempt)
+                        continue
+                    with self._commit_lock:
+                        self._committed_seq = last_seq
+                    self._dropped += len(batch)
+                    log.error("❌ Dropped %d history records after %d attempts: %s", len(batch), attempts, e)
+                    if self.listener is not None:
+                        self.listener(None, None)  # they were already published; have the counts reloaded
+                    return
+            self._written += len(batch)
+            if self.stage_timer is not None:
+                self.stage_timer("history_write", time.perf_counter() - start)
+        finally:
+            with self._pending_lock:
+                for r in batch:
+                    if self._pending.get(r["filename"]) is r:
+                        del self._pending[r["filename"]]
+                for seq in seqs:
+                    self._unwritten.pop(seq, None)
+            for _ in batch:
+                self._queue.task_done()
+            with self._flushed:
+                self._flushed.notify_all()
+
+    # ------------------------------------------------
+    # RETENTION
+    # ------------------------------------------------
+    def compact(self):
+        """Apply retention_days / max_records and checkpoint the WAL"""
+        self._last_compact = time.monotonic()
+        removed = 0
+        with self._write_lock:
+            conn = self._write_conn
+            if self.retention_days > 0:
+                cutoff = (datetime.datetime.now() - datetime.timedelta(days=self.retention_days)).strftime(TIME_FORMAT)
+                removed += conn.execute("DELETE FROM history WHERE time < ?", (cutoff,)).rowcount
+            if self.max_records > 0:
+                removed += conn.execute(
+                    "DELETE FROM history WHERE id <= (SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (self.max_records,),
+                ).rowcount
+            conn.commit()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if removed:
+            log.info("🧹 History compaction removed %d records", removed)
+            if self.listener is not None:
+                self.listener(None, None)
+        return removed
+
+    # ------------------------------------------------
+    # READS
+    # ------------------------------------------------
+    @staticmethod
+    def _where(label=None, source=None, since=None, until=None):
+        clauses, params = [], []
+        if label:
+            clauses.append("label = ?")
+            params.append(label)
+        if source:
+            clauses.append("source = ?")
+            params.append(source)
+        if since:
+            clauses.append("time >= ?")
+            params.append(since)
+        if until:
+            clauses.append("time <= ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @staticmethod
+    def _matches(record, label=None, source=None, since=None, until=None):
+        """Python twin of _where for records that are not in the database yet"""
+        return ((not label or record["label"] == label)
+                and (not source or record["source"] == source)
+                and (not since or record["time"] >= since)
+                and (not until or record["time"] <= until))
+
+    def _unwritten_snapshot(self):
+        with self._pending_lock:
+            return list(self._unwritten.items())
+
+    def _read(self, sql, params, unwritten, **filters):
+        """(rows, records of `unwritten` that match the filters and are not in rows, newest first)
+
+        `unwritten` must be taken before the query: anything missing from it had already been committed.
+        """
+        with self._reader() as conn:
+            with self._commit_lock:  # so committed_seq describes exactly what the query sees
+                rows = conn.execute(sql, params).fetchall()
+                committed = self._committed_seq
+        unwritten = [r for seq, r in reversed(unwritten) if seq > committed and self._matches(r, **filters)]
+        return rows, unwritten
+
+    def get(self, filename):
+        """Latest record for a filename (indexed lookup)"""
+        with self._pending_lock:
+            record = self._pending.get(filename)
+        if record is not None:
+            return dict(record)
+        with self._reader() as conn:
+            row = conn.execute(
+                f"SELECT {SELECT_COLUMNS} FROM history"
+                " WHERE filename = ? ORDER BY id DESC LIMIT 1",
+                (filename,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def query(self, limit=50, offset=0, label=None, source=None, since=None, until=None):
+        """Newest-first page of records matching the filters, including ones still queued for writing"""
+        limit, offset = int(limit), int(offset)
+        filters = dict(label=label, source=source, since=since, until=until)
+        where, params = self._where(**filters)
+        # Queued records come first (they are the newest); the database only has to cover the rest.
+        # Few records are ever queued, so over-reading by that many rows keeps this to one query.
+        snapshot = self._unwritten_snapshot()
+        queued = len(snapshot)
+        db_offset = max(0, offset - queued)
+        rows, unwritten = self._read(
+            f"SELECT {SELECT_COLUMNS} FROM history" + where + " ORDER BY id DESC LIMIT ? OFFSET ?",
+            params + [limit + queued, db_offset], snapshot, **filters)
+        records = [dict(r) for r in unwritten] + [dict(row) for row in rows]
+        start = offset - db_offset if len(unwritten) <= offset else offset
+        return records[start:start + limit]
+
+    def summary(self, label=None, source=None, since=None, until=None):
+        """Totals used by the stat cards: count, healthy, diseased, average confidence"""
+        filters = dict(label=label, source=source, since=since, until=until)
+        where, params = self._where(**filters)
+        rows, unwritten = self._read(
+            "SELECT COUNT(*) AS total,"
+            " COALESCE(SUM(label = 'Healthy'), 0) AS healthy,"
+            " COALESCE(SUM(confidence), 0) AS confidence"
+            " FROM history" + where,
+            params, self._unwritten_snapshot(), **filters)
+        total = rows[0]["total"] + len(unwritten)
+        healthy = rows[0]["healthy"] + sum(r["label"] == "Healthy" for r in unwritten)
+        confidence = rows[0]["confidence"] + sum(r["confidence"] for r in unwritten)
+        return {
+            "total": total,
+            "healthy": healthy,
+            "diseased": total - healthy,
+            "avg_confidence": confidence / total if total else 0,
+        }
+
+    def label_totals(self):
+        """({label: (count, confidence sum)} over the committed history, last seq those totals include)"""
+        with self._reader() as conn:
+            with self._commit_lock:
+                rows = conn.execute(
+                    "SELECT label, COUNT(*) AS n, COALESCE(SUM(confidence), 0) AS total FROM history GROUP BY label"
+                ).fetchall()
+                seq = self._committed_seq
+        return {row["label"]: (row["n"], row["total"]) for row in rows}, seq
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "pending_writes": self._queue.unfinished_tasks,
+            "written": self._written,
+            "dropped": self._dropped,
+            "retention_days": self.retention_days,
+            "max_records": self.max_records,
+        }
@@ -0,0 +1,165 @@
+"""Background persistence of uploaded images and their thumbnails.
+
+The upload routes hand over the raw bytes and get back the relative path the
+image *will* live at, so the response can go out as soon as the label is known.
+Files are sharded into YYYY/MM/DD sub-folders of the upload folder and
+deduplicated by content hash: re-sending the same frame points at the copy
+that is already on disk instead of writing it again. An optional
+stage_timer(stage, seconds) callback is told how long each "image_save"
+(file + thumbnail) took.
+"""
+import datetime
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+PENDING = "pending"
+COMPLETE = "complete"
+FAILED = "failed"
+
+THUMBNAIL_FOLDER = "thumbs"
+
+log = logging.getLogger(__name__)
+
+
+class ImageWriter:
+    """Thread-pool writer with content-hash dedup and date-sharded folders"""
+
+    def __init__(self, base_folder, max_workers=2, thumbnail_size=256, shard_by_date=True, max_tracked=100000,
+                 stage_timer=None):
+        self.base_folder = base_folder
+        self.stage_timer = stage_timer
+        self.thumbnail_size = int(thumbnail_size)
+        self.shard_by_date = shard_by_date
+        self.max_tracked = int(max_tracked)
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="image-writer")
+        self._lock = threading.Lock()
+        self._by_digest = OrderedDict()  # content hash -> relative path, oldest first
+        self._owners = {}      # relative path -> content hash
+        self._status = {}      # relative path -> PENDING / COMPLETE / FAILED
+        self.written = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+    # ------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------
+    def submit(self, img_bytes, filename, digest=None):
+        """Schedule a save and return (relative_path, status) without waiting for the write.
+
+        The only disk access on the calling thread is one os.path.exists() on the target name,
+        when no tracked upload owns it yet, so a file left by an earlier run is never overwritten.
+        """
+        digest = digest or hashlib.sha256(img_bytes).hexdigest()
+        with self._lock:
+            existing = self._by_digest.get(digest)
+            if existing is not None and self._status.get(existing) != FAILED:
+                self._by_digest.move_to_end(digest)
+                self.deduplicated += 1
+                return existing, self._status[existing]
+
+            rel_path = self._claim_path(filename, digest)
+            self._by_digest[digest] = rel_path
+            self._owners[rel_path] = digest
+            self._status[rel_path] = PENDING
+            self._forget_oldest()
+
+        self._executor.submit(self._write, rel_path, img_bytes)
+        return rel_path, PENDING
+
+    def status(self, rel_path):
+        with self._lock:
+            return self._status.get(rel_path)
+
+    def thumbnail_path(self, rel_path):
+        """Thumbnails mirror the shard layout under thumbs/ and are always JPEG"""
+        stem, _ = os.path.splitext(rel_path)
+        return f"{THUMBNAIL_FOLDER}/{stem}.jpg"
+
+    def stats(self):
+        with self._lock:
+            pending = sum(1 for s in self._status.values() if s == PENDING)
+        return {
+            "pending": pending,
+            "written": self.written,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+        }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    # ------------------------------------------------
+    # INTERNALS
+    # ------------------------------------------------
+    def _claim_path(self, filename, digest):
+        """Pick a shard-relative path; a name already owned by other content gets a hash suffix"""
+        if self.shard_by_date:
+            shard = datetime.date.today().strftime("%Y/%m/%d")
+            rel_path = f"{shard}/{filename}"
+        else:
+            rel_path = filename
+
+        owner = self._owners.get(rel_path)
+        if (owner is not None and owner != digest) or (owner is None and os.path.exists(self._abs(rel_path))):
+            stem, ext = os.path.splitext(rel_path)
+            rel_path = f"{stem}_{digest[:8]}{ext}"
+        return rel_path
+
+    def _forget_oldest(self):
+        """Bound the dedup index; entries still being written are kept"""
+        while len(self._by_digest) > self.max_tracked:
+            digest, rel_path = next(iter(self._by_digest.items()))
+            if self._status.get(rel_path) == PENDING:
+                break
+            del self._by_digest[digest]
+            self._owners.pop(rel_path, None)
+            self._status.pop(rel_path, None)
+
+    def _abs(self, rel_path):
+        return os.path.join(self.base_folder, *rel_path.split("/"))
+
+    def _write(self, rel_path, img_bytes):
+        start = time.perf_counter()
+        try:
+            path = self._abs(rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp name first so readers never see a half-written file
+            tmp_path = path + ".part"
+            with open(tmp_path, "wb") as f:
+                f.write(img_bytes)
+            os.replace(tmp_path, path)
+
+            if self.thumbnail_size > 0:
+                self._write_thumbnail(rel_path, img_bytes)
+
+            with self._lock:
+                self._status[rel_path] = COMPLETE
+                self.written += 1
+            if self.stage_timer is not None:
+                self.stage_timer("image_save", time.perf_counter() - start)
+        except Exception as e:
+            log.error("❌ Failed to save %s: %s", rel_path, e)
+            with self._lock:
+                self._status[rel_path] = FAILED
+                self.failed += 1
+
+    def _write_thumbnail(self, rel_path, img_bytes):
+        size = (self.thumbnail_size, self.thumbnail_size)
+        img = Image.open(io.BytesIO(img_bytes))
+        if img.format == "JPEG":
+            img.draft("RGB", size)
+        img = img.convert("RGB")
+        img.thumbnail(size)
+
+        thumb_path = self._abs(self.thumbnail_path(rel_path))
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        img.save(thumb_path, format="JPEG", quality=80)
@@ -0,0 +1,245 @@
+"""Micro-batching inference engine for the upload routes.
+
+Requests hand a preprocessed 224x224x3 array to a BatchingPredictor, a single
+background thread coalesces whatever is queued into one batch (up to
+max_batch_size images or max_wait_ms after the first one arrived), runs one
+forward pass and hands each caller back its own row of probabilities. When a
+BatchBuffer is supplied the batch is assembled into that preallocated tensor
+instead of a fresh np.stack allocation. With num_dispatchers > 1 several
+batches can be in flight at once, which is what a multi-process predict_fn
+(see worker_pool.py) needs to keep every worker busy.
+
+predict_group() submits several views of one image (e.g. test-time
+augmentation) as a unit: they always land in the same forward pass, possibly
+alongside other requests' images.
+
+Pending items are served in priority order (PRIORITY_HIGH for ESP32 captures,
+PRIORITY_NORMAL for interactive uploads, PRIORITY_LOW for bulk jobs), FIFO
+within a priority. The last reserved_slots queue places only accept
+high-priority items, so a burst of dashboard or bulk traffic can't lock the
+field nodes out.
+
+An optional stage_timer(stage, seconds) callback receives per-image
+"queue_wait" times and per-batch "preprocess" and "predict" times.
+"""
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue is at max_queue_size."""
+
+
+class BatchingPredictor:
+    """Coalesces concurrent single-image predictions into batched model calls"""
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10, max_queue_size=64, batch_buffer=None,
+                 num_dispatchers=1, stage_timer=None, reserved_slots=0):
+        self.predict_fn = predict_fn
+        self.stage_timer = stage_timer
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.num_dispatchers = max(1, int(num_dispatchers))
+        if batch_buffer is not None and batch_buffer.capacity < self.max_batch_size:
+            raise ValueError("batch_buffer capacity is smaller than max_batch_size")
+        if batch_buffer is not None and self.num_dispatchers > 1:
+            raise ValueError("a shared batch_buffer needs a single dispatcher thread")
+        self.batch_buffer = batch_buffer
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue_size = int(max_queue_size)
+        self.reserved_slots = min(max(0, int(reserved_slots)), self.max_queue_size)
+
+        self._queue = queue.PriorityQueue(maxsize=self.max_queue_size)  # (priority, seq, item)
+        self._seq = itertools.count()
+        self._deferred = deque()  # a group that didn't fit in the previous batch goes first in the next
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        self._running = False
+
+        self._batches = 0
+        self._images = 0
+        self._rejected = 0
+        self._rejected_by_priority = {p: 0 for p in PRIORITY_NAMES}
+        self._waits = {p: [0, 0.0] for p in PRIORITY_NAMES}  # priority -> [images, total queue wait]
+        self._last_batch_size = 0
+        self._last_latency = 0.0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    # ------------------------------------------------
+    # LIFECYCLE
+    # ------------------------------------------------
+    def start(self):
+        with self._start_lock:
+            if self._running:
+                return self
+            self._running = True
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"batching-predictor-{i}", daemon=True)
+                for i in range(self.num_dispatchers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # ------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------
+    def submit(self, img_array, priority=PRIORITY_NORMAL):
+        """Queue one preprocessed image (HxWx3 or 1xHxWx3) and return a Future"""
+        if img_array.ndim == 4:
+            img_array = img_array[0]
+        return self._enqueue([img_array], True, priority)
+
+    def submit_group(self, images, priority=PRIORITY_NORMAL):
+        """Queue up to max_batch_size images that must share one forward pass; the Future yields N rows"""
+        if not 0 < len(images) <= self.max_batch_size:
+            raise ValueError(f"A group must hold 1..{self.max_batch_size} images, got {len(images)}")
+        return self._enqueue(list(images), False, priority)
+
+    def _enqueue(self, images, single, priority):
+        if not self._running:
+            self.start()
+        future = Future()
+        try:
+            if priority != PRIORITY_HIGH and self._queue.qsize() >= self.max_queue_size - self.reserved_slots:
+                raise queue.Full
+            item = (images, future, time.perf_counter(), single, priority)
+            self._queue.put_nowait((priority, next(self._seq), item))
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+                self._rejected_by_priority[priority] += 1
+            raise QueueFullError(f"Inference queue full ({self._queue.qsize()} pending)")
+        return future
+
+    def predict(self, img_array, timeout=None, priority=PRIORITY_NORMAL):
+        """Blocking helper: returns the probability vector for one image"""
+        return self.submit(img_array, priority).result(timeout=timeout)
+
+    def predict_group(self, images, timeout=None, priority=PRIORITY_NORMAL):
+        """Blocking helper: returns an N x num_classes array for the N images"""
+        return self.submit_group(images, priority).result(timeout=timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize() + len(self._deferred)
+
+    def stats(self):
+        with self._stats_lock:
+            batches = self._batches
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_size": self.max_queue_size,
+                "reserved_slots": self.reserved_slots,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": batches,
+                "images": self._images,
+                "rejected": self._rejected,
+                "rejected_by_priority": {PRIORITY_NAMES[p]: n for p, n in self._rejected_by_priority.items()},
+                "avg_queue_wait_ms": {PRIORITY_NAMES[p]: round(total / n * 1000.0, 2) if n else 0.0
+                                      for p, (n, total) in self._waits.items()},
+                "avg_batch_size": round(self._images / batches, 2) if batches else 0.0,
+                "last_batch_size": self._last_batch_size,
+                "last_batch_latency_ms": round(self._last_latency * 1000.0, 2),
+                "avg_batch_latency_ms": round(self._total_latency / batches * 1000.0, 2) if batches else 0.0,
+                "max_batch_latency_ms": round(self._max_latency * 1000.0, 2),
+            }
+
+    # ------------------------------------------------
+    # WORKER
+    # ------------------------------------------------
+    def _collect_batch(self):
+        """Block for the first item, then gather more until full or the deadline passes"""
+        try:
+            first = self._deferred.popleft()
+        except IndexError:
+            try:
+                first = self._queue.get(timeout=0.5)[2]
+            except queue.Empty:
+                return []
+
+        batch = [first]
+        size = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()[2]
+                else:
+                    item = self._queue.get(timeout=remaining)[2]
+            except queue.Empty:
+                break
+            if size + len(item[0]) > self.max_batch_size:
+                self._deferred.append(item)
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _worker(self):
+        while self._running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            futures = [item[1] for item in batch]
+            start = time.perf_counter()
+            try:
+                images = [img for item in batch for img in item[0]]
+                if self.batch_buffer is not None:
+                    inputs = self.batch_buffer.fill(images)
+                else:
+                    inputs = np.stack(images)
+                filled = time.perf_counter()
+                preds = self.predict_fn(inputs)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            end = time.perf_counter()
+            latency = end - start
+
+            with self._stats_lock:
+                for item in batch:
+                    waited = self._waits[item[4]]
+                    waited[0] += len(item[0])
+                    waited[1] += (start - item[2]) * len(item[0])
+            if self.stage_timer is not None:
+                for item in batch:
+                    self.stage_timer("queue_wait", start - item[2])
+                self.stage_timer("preprocess", filled - start)
+                self.stage_timer("predict", end - filled)
+
+            offset = 0
+            for images_in_item, future, _, single, _ in batch:
+                rows = preds[offset:offset + len(images_in_item)]
+                offset += len(images_in_item)
+                future.set_result(rows[0] if single else rows)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._images += len(images)
+                self._last_batch_size = len(images)
+                self._last_latency = latency
+                self._total_latency += latency
+                self._max_latency = max(self._max_latency, latency)
@@ -0,0 +1,176 @@
+"""Change feed over the prediction history for cached pages and live dashboards.
+
+Every record added to the history bumps a version number, updates per-label
+aggregate counts in memory and is appended to a short ring buffer of events.
+The version is what the dashboard/history ETags and the rendered-page cache
+are keyed on, so a page is rendered at most once per change no matter how
+many browsers poll it, and an unchanged page costs a 304. Server-sent-event
+and long-poll clients block on a Condition until the version moves past the
+one they last saw and then receive only the new events.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class LiveFeed:
+    """Versioned event buffer, incremental label counts and a per-version render cache"""
+
+    def __init__(self, labels, max_events=500, max_cached_pages=64):
+        self.labels = list(labels)
+        self.max_cached_pages = int(max_cached_pages)
+
+        self._cond = threading.Condition()
+        self._version = 0
+        self._events = deque(maxlen=max(1, int(max_events)))  # (version, record)
+        self._counts = {}        # label -> [count, confidence sum]
+        self._pages = OrderedDict()   # key -> (version, value), least recently used first
+        self._stale = True       # counts need a reload from the store (startup, compaction)
+        self._stale_marks = 0    # times the counts were marked stale; a reload only clears the marks it saw
+        self._refreshing = False # a reload is running outside the lock
+        self._counted_seq = 0    # records up to this history seq are already in the reloaded counts
+        self._recent = deque(maxlen=self._events.maxlen)  # (seq, label, confidence) of published records
+        self._hits = 0
+        self._misses = 0
+        self._subscribers = 0
+
+    # ------------------------------------------------
+    # UPDATES
+    # ------------------------------------------------
+    def publish(self, record, seq=None):
+        """Called for every record added to the history; None means "reload the counts" (e.g. compaction)"""
+        with self._cond:
+            self._version += 1
+            if record is None:
+                self._stale = True
+                self._stale_marks += 1
+            else:
+                # A refresh() that ran between the store queueing this record and publishing it already counted it
+                if seq is None or seq > self._counted_seq:
+                    self._count(record["label"], record["confidence"])
+                if seq is not None:
+                    self._recent.append((seq, record["label"], record["confidence"]))
+                self._events.append((self._version, dict(record)))
+            self._cond.notify_all()
+
+    def refresh(self, loader):
+        """Reload the aggregates from loader() -> ({label: (count, confidence sum)}, last seq included).
+
+        Only runs if they are stale, and only on one thread at a time; loader() runs outside the
+        lock so publishers and readers are not held up by the query. Records published later with
+        a seq the reload already included are not counted again, and ones published before it but
+        not yet written are kept.
+        """
+        with self._cond:
+            if not self._stale or self._refreshing:
+                return
+            self._refreshing = True
+            marks = self._stale_marks
+        try:
+            totals, seq = loader()
+        finally:
+            with self._cond:
+                self._refreshing = False
+        with self._cond:
+            if seq < self._counted_seq:
+                return  # a refresh that started after this one already merged a newer load
+            self._counts = {label: [n, total] for label, (n, total) in totals.items()}
+            for recent_seq, label, confidence in self._recent:
+                if recent_seq > seq:
+                    self._count(label, confidence)
+            self._counted_seq = seq
+            # Compaction during the load may have removed records the load still counted
+            self._stale = self._stale_marks != marks
+
+    def _count(self, label, confidence):
+        entry = self._counts.setdefault(label, [0, 0.0])
+        entry[0] += 1
+        entry[1] += confidence
+
+    @property
+    def version(self):
+        return self._version
+
+    # ------------------------------------------------
+    # AGGREGATES
+    # ------------------------------------------------
+    def label_counts(self):
+        with self._cond:
+            return {label: self._counts.get(label, [0, 0.0])[0] for label in self.labels}
+
+    def summary(self):
+        """Same shape as HistoryStore.summary(), computed from the in-memory counts"""
+        with self._cond:
+            total = sum(n for n, _ in self._counts.values())
+            healthy = self._counts.get("Healthy", [0, 0.0])[0]
+            confidence = sum(s for _, s in self._counts.values())
+        return {
+            "total": total,
+            "healthy": healthy,
+            "diseased": total - healthy,
+            "avg_confidence": confidence / total if total else 0,
+        }
+
+    # ------------------------------------------------
+    # RENDER CACHE
+    # ------------------------------------------------
+    def cached(self, key, render, versioned=True):
+        """render() once per (key, version); later calls at the same version reuse the result.
+
+        versioned=False is for fragments that never change once rendered (e.g. one event's table row).
+        """
+        version = self._version if versioned else None
+        with self._cond:
+            hit = self._pages.get(key)
+            if hit is not None and hit[0] == version:
+                self._pages.move_to_end(key)
+                self._hits += 1
+                return hit[1]
+            self._misses += 1
+        value = render()
+        with self._cond:
+            self._pages[key] = (version, value)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_cached_pages:
+                self._pages.popitem(last=False)
+        return value
+
+    # ------------------------------------------------
+    # SUBSCRIBERS
+    # ------------------------------------------------
+    def events_since(self, version):
+        """(current version, [(version, record), ...] newer than `version`, whether some were dropped)"""
+        with self._cond:
+            events = [e for e in self._events if e[0] > version]
+            missed = bool(self._events) and version < self._events[0][0] - 1 and version < self._version
+            return self._version, events, missed
+
+    def wait(self, version, timeout):
+        """Block until the version moves past `version` or the timeout expires; returns events_since()"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._version <= version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return self.events_since(version)
+
+    def subscribe(self):
+        with self._cond:
+            self._subscribers += 1
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                "version": self._version,
+                "buffered_events": len(self._events),
+                "subscribers": self._subscribers,
+                "cached_pages": len(self._pages),
+                "page_cache_hits": self._hits,
+                "page_cache_misses": self._misses,
+            }
@@ -0,0 +1,57 @@
+"""Backend-aware model loading shared by app.py, the worker processes and the CLI tools.
+
+TensorFlow is only imported inside these functions so importing this module
+stays cheap. The "stub" backend needs no TensorFlow at all: it returns
+deterministic probabilities after a fixed delay, so the HTTP / decode path can
+be load-tested on its own (see bench_upload.py).
+"""
+import os
+import time
+
+import numpy as np
+
+KERAS = "keras"
+TFLITE = "tflite"
+STUB = "stub"
+
+
+class StubModel:
+    """Stand-in for the classifier: probabilities derived from mean pixel values"""
+
+    def __init__(self, num_classes=4, latency_ms=0.0):
+        self.num_classes = num_classes
+        self.latency = latency_ms / 1000.0
+        self.input_shape = (None, 224, 224, 3)
+        self.output_shape = (None, num_classes)
+
+    def predict(self, batch, verbose=0, batch_size=None):
+        if self.latency:
+            time.sleep(self.latency)
+        means = np.asarray(batch, dtype=np.float32).reshape(len(batch), -1, 3).mean(axis=1)
+        logits = np.concatenate([means, means.sum(axis=1, keepdims=True) / 3], axis=1)[:, :self.num_classes]
+        exp = np.exp((logits - logits.max(axis=1, keepdims=True)) / 16.0)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_inference_model(path, backend=KERAS, num_threads=None):
+    """Load a model exposing predict/input_shape/output_shape for the given backend"""
+    if backend == STUB:
+        return StubModel(latency_ms=float(os.environ.get("STUB_LATENCY_MS", 0)))
+    if backend == TFLITE:
+        from tflite_backend import TFLiteModel
+        return TFLiteModel(path, num_threads=num_threads)
+
+    if num_threads:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    from tensorflow.keras.models import load_model
+    return load_model(path, compile=False, custom_objects=None)
+
+
+def get_preprocess_fn(backend=KERAS):
+    """EfficientNet preprocessing for Keras; TFLite exports already contain it"""
+    if backend in (TFLITE, STUB):
+        return None
+    from tensorflow.keras.applications.efficientnet import preprocess_input
+    return preprocess_input
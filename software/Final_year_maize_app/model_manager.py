@@ -0,0 +1,304 @@
+"""Hot-swappable active model plus an optional shadow candidate.
+
+The server never holds the model in a bare global. Each loaded checkpoint is
+a ModelVersion, and every forward pass runs inside `with manager.use() as v`,
+which pins that version for the duration of the batch. A reload loads and
+warms the new checkpoint on a background thread while the old one keeps
+serving, then swaps the active reference under a lock. The old version is
+closed only after its in-flight batches have drained, so no request is
+dropped or sees a half-initialised model.
+
+A candidate version can run in shadow: a sampled fraction of batches is
+copied and re-scored by the candidate on a separate thread after the caller
+has its answer. Top-1 agreement and both models' latencies are recorded,
+and the candidate can then be promoted without another load.
+"""
+import datetime
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+ACTIVE = "active"
+CANDIDATE = "candidate"
+
+
+class ModelVersion:
+    """One loaded checkpoint and the number of batches currently running on it"""
+
+    def __init__(self, model, model_id, path, load_seconds=None, warmup_seconds=None):
+        self.model = model
+        self.model_id = model_id
+        self.path = path
+        self.load_seconds = load_seconds
+        self.warmup_seconds = warmup_seconds
+        self.loaded_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.batches = 0
+        self._inflight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            self._inflight += 1
+            self.batches += 1
+
+    def release(self):
+        with self._cond:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._cond.notify_all()
+
+    def drain(self, timeout=60):
+        """Wait until no batch is running on this version; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def info(self):
+        return {
+            "model_id": self.model_id,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "batches": self.batches,
+            "in_flight": self._inflight,
+        }
+
+
+class ModelManager:
+    """Owns the active and candidate ModelVersions, reloads, file watching and shadow stats"""
+
+    def __init__(self, load_fn, identity_fn, warm_fn=None, on_swap=None, labels=None, shadow_rate=0.0,
+                 shadow_queue=2):
+        self.load_fn = load_fn            # (path, role) -> model
+        self.identity_fn = identity_fn    # path -> model id
+        self.warm_fn = warm_fn            # (model) -> None
+        self.on_swap = on_swap            # (old version or None, new version), called after a swap
+        self.labels = list(labels or [])
+        self.shadow_rate = float(shadow_rate)
+        self.shadow_queue = max(1, int(shadow_queue))
+
+        self._lock = threading.Lock()
+        self._versions = {ACTIVE: None, CANDIDATE: None}
+        self._loading = {}                # role -> path being loaded
+        self._last_reload = {ACTIVE: None, CANDIDATE: None}
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-inference")
+        self._shadow_pending = 0
+        self._watch_thread = None
+        self._reset_shadow_stats()
+
+    # ------------------------------------------------
+    # VERSIONS
+    # ------------------------------------------------
+    @property
+    def active(self):
+        return self._versions[ACTIVE]
+
+    @property
+    def candidate(self):
+        return self._versions[CANDIDATE]
+
+    @contextmanager
+    def use(self, role=ACTIVE):
+        """Pin the current version of `role` for one forward pass"""
+        with self._lock:
+            version = self._versions[role]
+            if version is None:
+                raise RuntimeError(f"No {role} model loaded")
+            version.acquire()
+        try:
+            yield version
+        finally:
+            version.release()
+
+    def install(self, version, role=ACTIVE):
+        """Atomically make `version` the active model (or the candidate); the old one is retired"""
+        with self._lock:
+            old = self._versions[role]
+            self._versions[role] = version
+            self._reset_shadow_stats()  # agreement is only meaningful for one active/candidate pair
+        log.info("🔄 %s model is now %s", role.capitalize(), version.model_id if version else None)
+        if role == ACTIVE and self.on_swap is not None:
+            self.on_swap(old, version)
+        if old is not None and old is not self._versions[ACTIVE] and old is not self._versions[CANDIDATE]:
+            threading.Thread(target=self._retire, args=(old,), name="model-retire", daemon=True).start()
+        return old
+
+    def _retire(self, version):
+        if not version.drain():
+            log.warning("⚠️ Model %s still busy after 60s; closing anyway", version.model_id)
+        close = getattr(version.model, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                log.error("❌ Closing retired model %s failed: %s", version.model_id, e)
+        log.info("🗑️ Retired model %s", version.model_id)
+
+    def load_version(self, path, role=ACTIVE, on_loaded=None):
+        """Load and warm `path` on the calling thread; returns the new, not yet installed, ModelVersion"""
+        start = time.perf_counter()
+        model_id = self.identity_fn(path)
+        model = self.load_fn(path, role)
+        loaded = time.perf_counter()
+        if on_loaded is not None:
+            on_loaded(model)
+        if self.warm_fn is not None:
+            self.warm_fn(model)
+        return ModelVersion(model, model_id, path, round(loaded - start, 2), round(time.perf_counter() - loaded, 2))
+
+    def reload(self, path, role=ACTIVE):
+        """Load `path` as the new active model or candidate in the background; False if one is already loading"""
+        with self._lock:
+            if role in self._loading:
+                return False
+            self._loading[role] = path
+        threading.Thread(target=self._reload, args=(path, role), name=f"model-reload-{role}", daemon=True).start()
+        return True
+
+    def _reload(self, path, role):
+        log.info("📦 Loading %s model from %s", role, path)
+        result = {"path": path, "started": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        try:
+            version = self.load_version(path, role)
+            self.install(version, role)
+            result.update(status="ok", model_id=version.model_id,
+                          load_seconds=version.load_seconds, warmup_seconds=version.warmup_seconds)
+        except Exception as e:
+            log.error("❌ Loading %s model from %s failed: %s", role, path, e)
+            result.update(status="failed", error=str(e))
+        with self._lock:
+            self._loading.pop(role, None)
+            self._last_reload[role] = result
+
+    def promote(self):
+        """Make the candidate the active model without reloading it; returns the new active version"""
+        with self._lock:
+            candidate = self._versions[CANDIDATE]
+            if candidate is None:
+                return None
+            self._versions[CANDIDATE] = None
+        self.install(candidate, ACTIVE)
+        return candidate
+
+    def drop_candidate(self):
+        return self.install(None, CANDIDATE) is not None
+
+    # ------------------------------------------------
+    # FILE WATCH
+    # ------------------------------------------------
+    def watch(self, path, interval):
+        """Reload `path` as the active model whenever its identity changes and then holds for one interval"""
+        if self._watch_thread is not None or interval <= 0:
+            return
+
+        def loop():
+            seen = self.identity_fn(path)
+            while True:
+                time.sleep(interval)
+                current = self.identity_fn(path)
+                active = self.active
+                if current != seen:
+                    seen = current  # still being written; reload once it stops changing
+                    continue
+                if active is not None and active.path == path and current != active.model_id \
+                        and not current.endswith(":missing"):
+                    log.info("👀 %s changed on disk, reloading", path)
+                    self.reload(path, ACTIVE)
+
+        self._watch_thread = threading.Thread(target=loop, name="model-watch", daemon=True)
+        self._watch_thread.start()
+
+    # ------------------------------------------------
+    # SHADOW INFERENCE
+    # ------------------------------------------------
+    def _reset_shadow_stats(self):
+        self._shadow = {"batches": 0, "images": 0, "agree": 0, "skipped_busy": 0, "errors": 0,
+                        "active_seconds": 0.0, "candidate_seconds": 0.0, "disagreements": Counter()}
+
+    def shadow(self, batch, preds, active_seconds):
+        """Maybe re-score a copy of this batch on the candidate, off the caller's thread"""
+        if self.shadow_rate <= 0 or self._versions[CANDIDATE] is None or random.random() >= self.shadow_rate:
+            return
+        with self._lock:
+            if self._shadow_pending >= self.shadow_queue:
+                self._shadow["skipped_busy"] += 1
+                return
+            self._shadow_pending += 1
+        # The batch buffer is reused for the next batch, so the candidate gets its own copy
+        self._shadow_executor.submit(self._run_shadow, np.array(batch), np.array(preds), active_seconds)
+
+    def _run_shadow(self, batch, preds, active_seconds):
+        try:
+            with self.use(CANDIDATE) as version:
+                start = time.perf_counter()
+                candidate_preds = np.asarray(version.model.predict(batch, verbose=0))
+                seconds = time.perf_counter() - start
+            active_top = preds.argmax(axis=1)
+            candidate_top = candidate_preds.argmax(axis=1)
+            with self._lock:
+                stats = self._shadow
+                stats["batches"] += 1
+                stats["images"] += len(batch)
+                stats["agree"] += int((active_top == candidate_top).sum())
+                stats["active_seconds"] += active_seconds
+                stats["candidate_seconds"] += seconds
+                for a, c in zip(active_top, candidate_top):
+                    if a != c:
+                        stats["disagreements"][(self._label(a), self._label(c))] += 1
+        except Exception as e:
+            with self._lock:
+                self._shadow["errors"] += 1
+            log.error("❌ Shadow inference failed: %s", e)
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    def _label(self, index):
+        return self.labels[index] if index < len(self.labels) else str(index)
+
+    def shadow_stats(self):
+        with self._lock:
+            stats = dict(self._shadow)
+            disagreements = stats.pop("disagreements")
+        batches, images = stats["batches"], stats["images"]
+        return {
+            "sample_rate": self.shadow_rate,
+            "batches": batches,
+            "images": images,
+            "agreement": round(stats["agree"] / images, 4) if images else None,
+            "active_avg_batch_ms": round(stats["active_seconds"] / batches * 1000.0, 2) if batches else None,
+            "candidate_avg_batch_ms": round(stats["candidate_seconds"] / batches * 1000.0, 2) if batches else None,
+            "skipped_busy": stats["skipped_busy"],
+            "errors": stats["errors"],
+            "disagreements": [{"active": a, "candidate": c, "count": n} for (a, c), n in disagreements.most_common()],
+        }
+
+    # ------------------------------------------------
+    # REPORTING
+    # ------------------------------------------------
+    def info(self):
+        with self._lock:
+            active, candidate = self._versions[ACTIVE], self._versions[CANDIDATE]
+            loading = dict(self._loading)
+            last_reload = dict(self._last_reload)
+        return {
+            ACTIVE: active.info() if active else None,
+            CANDIDATE: candidate.info() if candidate else None,
+            "loading": loading,
+            "last_reload": last_reload,
+            "shadow": self.shadow_stats() if candidate else None,
+        }
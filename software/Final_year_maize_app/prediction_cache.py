@@ -0,0 +1,154 @@
+"""Content-addressed cache of model predictions.
+
+Entries are keyed by the SHA-256 of the raw image bytes plus the identity of
+the model that produced them (path + mtime + size), so re-uploads and ESP32
+retries skip the forward pass while a model swap never serves stale labels.
+An optional SQLite file keeps entries across restarts.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def model_identity(model_path):
+    """Stable identifier for the model file currently on disk"""
+    try:
+        st = os.stat(model_path)
+        return f"{os.path.abspath(model_path)}:{st.st_mtime_ns}:{st.st_size}"
+    except OSError:
+        return f"{os.path.abspath(model_path)}:missing"
+
+
+def content_hash(img_bytes):
+    return hashlib.sha256(img_bytes).hexdigest()
+
+
+class PredictionCache:
+    """Thread-safe LRU of (label, confidence) with optional SQLite persistence"""
+
+    def __init__(self, model_id, max_entries=1024, persist_path=None):
+        self.model_id = model_id
+        self.max_entries = max(0, int(max_entries))
+        self.persist_path = persist_path or None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.persist_path:
+            self._open_db()
+
+    # ------------------------------------------------
+    # PERSISTENCE
+    # ------------------------------------------------
+    def _open_db(self):
+        directory = os.path.dirname(self.persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.persist_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " digest TEXT NOT NULL,"
+            " model_id TEXT NOT NULL,"
+            " label TEXT NOT NULL,"
+            " confidence REAL NOT NULL,"
+            " PRIMARY KEY (digest, model_id))"
+        )
+        self._db.commit()
+        self._purge_other_models()
+
+    def _purge_other_models(self):
+        if self._db is None:
+            return
+        self._db.execute("DELETE FROM predictions WHERE model_id != ?", (self.model_id,))
+        self._db.commit()
+
+    # ------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------
+    def set_model(self, model_id):
+        """Drop every entry produced by a different model"""
+        with self._lock:
+            if model_id == self.model_id:
+                return
+            self.model_id = model_id
+            self._entries.clear()
+            self._purge_other_models()
+
+    def get(self, digest):
+        if self.max_entries == 0:
+            return None
+        with self._lock:
+            key = (digest, self.model_id)
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT label, confidence FROM predictions WHERE digest = ? AND model_id = ?",
+                    key,
+                ).fetchone()
+                if row is not None:
+                    value = (row[0], float(row[1]))
+                    self._store(key, value)
+                    self.hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, digest, label, confidence, model_id=None):
+        """Cache a prediction; ignored if it came from a model that has since been replaced"""
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            if model_id is not None and model_id != self.model_id:
+                return
+            key = (digest, self.model_id)
+            value = (label, float(confidence))
+            self._store(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (digest, model_id, label, confidence) VALUES (?, ?, ?, ?)",
+                    key + value,
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "persistent": self._db is not None,
+                "model_id": self.model_id,
+            }
+
+    # ------------------------------------------------
+    # INTERNALS
+    # ------------------------------------------------
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
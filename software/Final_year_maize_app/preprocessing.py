@@ -0,0 +1,162 @@
+"""Shared decode + preprocessing stage for the ESP32 and web upload paths.
+
+JPEGs are decoded with PIL's draft mode, which lets libjpeg do a reduced-scale
+(1/2, 1/4, 1/8) IDCT so a 1600x1200 UXGA frame comes out at 400x300 instead
+of being fully decoded and then shrunk. Per-image work stays in uint8; the
+float32 conversion happens once per batch, straight into a preallocated
+BatchBuffer that the inference worker reuses for every forward pass.
+
+tile_views() is the high-resolution path: instead of shrinking the whole frame
+to 224x224 it cuts one decoded array into overlapping model-sized tiles.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+TARGET_SIZE = (224, 224)  # (width, height) expected by EfficientNetB0
+RESAMPLE = Image.BILINEAR
+
+
+def open_image(source):
+    """Open raw bytes, a path or a file object without decoding the pixels yet"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+
+def decode(source, target_size=TARGET_SIZE):
+    """Decode to an RGB PIL image, at reduced scale for JPEGs"""
+    img = open_image(source)
+    if img.format == "JPEG":
+        # Reduced-scale decode to the smallest size still >= target_size
+        img.draft("RGB", target_size)
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    img.load()
+    return img
+
+
+def to_jpeg(data, quality=90):
+    """data unchanged if it is already a JPEG, else re-encoded as one (what an ESP32 camera would send)"""
+    if data[:2] == b"\xff\xd8":
+        return data
+    out = io.BytesIO()
+    open_image(data).convert("RGB").save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def resize_rgb(img, target_size=TARGET_SIZE):
+    """Resize a decoded RGB image to a uint8 HxWx3 array at target_size"""
+    if img.size != tuple(target_size):
+        img = img.resize(target_size, RESAMPLE)
+    return np.asarray(img, dtype=np.uint8)
+
+
+def decode_rgb(source, target_size=TARGET_SIZE):
+    """Decode an image to a uint8 HxWx3 array at target_size"""
+    return resize_rgb(decode(source, target_size), target_size)
+
+
+def tta_views(source, target_size=TARGET_SIZE, crop_fraction=0.8, include_full=False):
+    """Test-time augmentation views as an N x H x W x 3 uint8 array.
+
+    The image is decoded at twice target_size so the crops keep more detail than
+    a crop of the already-shrunk view would. Views: horizontal and vertical flips,
+    a center crop and the four corner crops (each crop_fraction of each side),
+    plus the plain resize first when include_full is set.
+    """
+    img = decode(source, (target_size[0] * 2, target_size[1] * 2))
+    width, height = img.size
+    cw, ch = width * crop_fraction, height * crop_fraction
+    full = img.resize(target_size, RESAMPLE)
+
+    views = [full] if include_full else []
+    views.append(full.transpose(Image.FLIP_LEFT_RIGHT))
+    views.append(full.transpose(Image.FLIP_TOP_BOTTOM))
+    boxes = [
+        ((width - cw) / 2, (height - ch) / 2),  # center
+        (0, 0), (width - cw, 0), (0, height - ch), (width - cw, height - ch),  # corners
+    ]
+    # resize(box=...) crops and scales in a single resampling pass
+    views.extend(img.resize(target_size, RESAMPLE, box=(x, y, x + cw, y + ch)) for x, y in boxes)
+    return np.stack([np.asarray(v, dtype=np.uint8) for v in views])
+
+
+def tile_offsets(length, tile, overlap):
+    """Start offsets of tiles covering [0, length) with at least `overlap` (fraction) between neighbours"""
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1.0 - overlap)))
+    count = -(-(length - tile) // stride) + 1  # ceil, plus the first tile
+    # Spread the tiles evenly so the last one ends exactly on the edge
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def tile_grid(size, tile_size=TARGET_SIZE, overlap=0.25):
+    """(x offsets, y offsets) of the tile grid for an image of size (width, height)"""
+    return tile_offsets(size[0], tile_size[0], overlap), tile_offsets(size[1], tile_size[1], overlap)
+
+
+def tile_views(source, tile_size=TARGET_SIZE, overlap=0.25, max_tiles=64):
+    """Cut an image into overlapping tile_size tiles, at the finest scale that yields <= max_tiles.
+
+    The scale halves from 1/1 until the grid fits max_tiles (at worst one tile).
+    JPEGs are draft-decoded at 1/2, 1/4 or 1/8 scale and resized from there when
+    a coarser scale is needed. Every tile is a strided view into the one decoded
+    array, so nothing is copied until the tiles are filled into the batch buffer. Returns
+    a dict with "tiles" (list of HxWx3 uint8 views), "boxes" ((x, y, w, h) of each
+    tile in original-image pixels, row-major), "rows", "cols" and "scale".
+    """
+    img = open_image(source)
+    width, height = img.size
+    tw, th = tile_size
+    max_tiles = max(1, int(max_tiles))
+    scale = 1.0
+    while True:  # ends by the time the image fits one tile
+        xs, ys = tile_grid((int(width * scale), int(height * scale)), tile_size, overlap)
+        if len(xs) * len(ys) <= max_tiles:
+            break
+        scale /= 2
+
+    wanted = (max(tw, int(width * scale)), max(th, int(height * scale)))
+    if img.format == "JPEG":
+        img.draft("RGB", wanted)
+    img = img.convert("RGB") if img.mode != "RGB" else img
+    if img.size != wanted:
+        img = img.resize(wanted, RESAMPLE)
+    pixels = np.asarray(img, dtype=np.uint8)
+
+    xs, ys = tile_grid(wanted, tile_size, overlap)
+    fx, fy = width / wanted[0], height / wanted[1]
+    tiles, boxes = [], []
+    for y in ys:
+        for x in xs:
+            tiles.append(pixels[y:y + th, x:x + tw])
+            boxes.append((round(x * fx), round(y * fy), round(tw * fx), round(th * fy)))
+    return {"tiles": tiles, "boxes": boxes, "rows": len(ys), "cols": len(xs), "scale": wanted[0] / width}
+
+
+class BatchBuffer:
+    """Reusable float32 NxHxWx3 input tensor filled in place for each batch"""
+
+    def __init__(self, capacity, target_size=TARGET_SIZE, preprocess_fn=None):
+        width, height = target_size
+        self.capacity = int(capacity)
+        self.preprocess_fn = preprocess_fn
+        self._data = np.empty((self.capacity, height, width, 3), dtype=np.float32)
+
+    def fill(self, images):
+        """Copy up to `capacity` uint8/float images in and return the preprocessed view"""
+        n = len(images)
+        if n > self.capacity:
+            raise ValueError(f"Batch of {n} exceeds buffer capacity {self.capacity}")
+        batch = self._data[:n]
+        for i, img in enumerate(images):
+            np.copyto(batch[i], img, casting="unsafe")
+        if self.preprocess_fn is not None:
+            result = self.preprocess_fn(batch)
+            # Keras preprocess functions may return a new array instead of working in place
+            if result is not None and result is not batch:
+                batch = result
+        return batch
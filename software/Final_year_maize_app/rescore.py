@@ -0,0 +1,260 @@
+"""Re-score the upload archive with the current model and diff it against history.
+
+Usage:
+    python rescore.py [--folder static/uploads] [--model models/best_model.keras] [--backend keras]
+                      [--history data/history.sqlite3] [--out rescore/results.csv]
+                      [--workers 4] [--batch-size 32] [--prefetch 4] [--restart]
+
+Every image under --folder (recursively, thumbnails excluded) is decoded on a
+process pool with the server's draft-mode preprocessing stage, prefetched up
+to --prefetch batches ahead of the model, and scored in --batch-size batches
+through the same model loader and batch buffer app.py uses. One row per image
+goes to --out (CSV; a .parquet --out also writes a Parquet copy at the end if
+pyarrow is installed), with the per-class probabilities, the label stored in
+history for that filename and whether it changed.
+
+Rows are flushed after every batch, so an interrupted run picks up where it
+stopped: images already in --out for the same model are skipped. --restart
+discards the previous results instead. Rows from a different model file are
+never mixed in; re-scoring with a new model needs --restart or a new --out.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model_loader import get_preprocess_fn, load_inference_model
+from prediction_cache import model_identity
+from preprocessing import BatchBuffer, decode_rgb
+
+try:
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pa_parquet
+except ImportError:
+    pa_csv = None
+    pa_parquet = None
+
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+CLASS_LABELS = ["Blight", "Common Rust", "Gray Leaf Spot", "Healthy"]
+THUMBNAIL_FOLDER = "thumbs"
+FIELDS = (["filename", "label", "confidence"] + [f"p_{label}" for label in CLASS_LABELS]
+          + ["history_label", "history_confidence", "changed", "model_id", "error"])
+
+
+# ------------------------------------------------
+# INPUTS
+# ------------------------------------------------
+def iter_images(folder):
+    """Shard-relative paths ("2024/05/01/x.jpg") of every image under folder, in a stable order"""
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d != THUMBNAIL_FOLDER)
+        for name in sorted(files):
+            if "." in name and name.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS:
+                yield os.path.relpath(os.path.join(root, name), folder).replace(os.sep, "/")
+
+
+def load_history(path):
+    """{filename: (label, confidence)} of the latest history record per file"""
+    if not path or not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT filename, label, confidence FROM history"
+            " WHERE id IN (SELECT MAX(id) FROM history GROUP BY filename)"
+        ).fetchall()
+    finally:
+        conn.close()
+    return {filename: (label, confidence) for filename, label, confidence in rows}
+
+
+def load_done(path, model_id):
+    """Filenames already scored by this model in a previous (interrupted) run"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    other = {r["model_id"] for r in rows} - {model_id}
+    if other:
+        sys.exit(f"❌ {path} holds results from another model ({other.pop()}); "
+                 f"use --restart or a different --out")
+    return {r["filename"] for r in rows}
+
+
+def ignore_interrupts():
+    # Ctrl-C is handled by the parent, which stops submitting and shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def decode_file(folder, rel_path):
+    """Runs in a pool process: (rel_path, uint8 224x224x3 array or None, error)"""
+    try:
+        return rel_path, decode_rgb(os.path.join(folder, *rel_path.split("/"))), None
+    except Exception as e:
+        return rel_path, None, str(e)
+
+
+def prefetch(executor, folder, paths, depth):
+    """Decoded images in input order, keeping up to `depth` decodes in flight"""
+    pending = deque()
+    for rel_path in paths:
+        if executor is None:
+            yield decode_file(folder, rel_path)
+            continue
+        pending.append(executor.submit(decode_file, folder, rel_path))
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ------------------------------------------------
+# SCORING
+# ------------------------------------------------
+def score_batch(model, buffer, batch, history, model_id):
+    decoded = [item for item in batch if item[1] is not None]
+    preds = model.predict(buffer.fill([img for _, img, _ in decoded]), verbose=0) if decoded else []
+    scores = {rel_path: p for (rel_path, _, _), p in zip(decoded, preds)}
+
+    rows = []
+    for rel_path, _, error in batch:
+        old_label, old_confidence = history.get(rel_path, (None, None))
+        row = {"filename": rel_path, "history_label": old_label or "", "history_confidence": old_confidence or "",
+               "model_id": model_id, "error": error or ""}
+        p = scores.get(rel_path)
+        if p is not None:
+            label = CLASS_LABELS[int(np.argmax(p))]
+            row.update({"label": label, "confidence": round(float(p.max()), 6),
+                        "changed": int(old_label is not None and old_label != label)})
+            row.update({f"p_{name}": round(float(v), 6) for name, v in zip(CLASS_LABELS, p)})
+        rows.append(row)
+    return rows
+
+
+def write_parquet(csv_path, parquet_path):
+    if pa_parquet is None:
+        print("⚠️ pyarrow is not installed; results are in the CSV only")
+        return
+    pa_parquet.write_table(pa_csv.read_csv(csv_path), parquet_path)
+    print(f"🗂️ Parquet copy written to {parquet_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", default="static/uploads")
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", "models/best_model.keras"))
+    parser.add_argument("--backend", default=os.environ.get("INFERENCE_BACKEND", "keras"),
+                        choices=["keras", "tflite", "stub"])
+    parser.add_argument("--history", default=os.environ.get("HISTORY_DB_PATH", "data/history.sqlite3"),
+                        help="history database to diff against")
+    parser.add_argument("--out", default="rescore/results.csv", help=".csv, or .parquet for a Parquet copy too")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="decode processes (0 decodes in the main process)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--prefetch", type=int, default=4, help="batches decoded ahead of the model")
+    parser.add_argument("--threads", type=int, default=None, help="model threads (TFLite / TensorFlow intra-op)")
+    parser.add_argument("--restart", action="store_true", help="discard results from a previous run")
+    parser.add_argument("--verbose", action="store_true", help="list every changed label")
+    args = parser.parse_args()
+
+    parquet_path = args.out if args.out.endswith(".parquet") else None
+    csv_path = args.out[:-len(".parquet")] + ".csv" if parquet_path else args.out
+    if os.path.dirname(csv_path):
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    if args.restart and os.path.exists(csv_path):
+        os.remove(csv_path)
+
+    model_id = model_identity(args.model)
+    done = load_done(csv_path, model_id)
+    history = load_history(args.history)
+    todo = [p for p in iter_images(args.folder) if p not in done]
+    print(f"🔁 {len(todo)} images to score in {args.folder} ({len(done)} already done, "
+          f"{len(history)} files in history)")
+    if not todo:
+        if parquet_path:
+            write_parquet(csv_path, parquet_path)
+        return
+
+    start = time.perf_counter()
+    model = load_inference_model(args.model, args.backend, num_threads=args.threads)
+    buffer = BatchBuffer(args.batch_size, preprocess_fn=get_preprocess_fn(args.backend))
+    print(f"✅ Model loaded in {time.perf_counter() - start:.1f}s")
+
+    changes = Counter()
+    scored = failed = compared = 0
+    model_seconds = 0.0
+    new_file = not os.path.exists(csv_path)
+    # Spawned, not forked: the parent has TensorFlow loaded by now
+    executor = (ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                    initializer=ignore_interrupts)
+                if args.workers > 0 else None)
+    start = last_report = time.perf_counter()
+    try:
+        with open(csv_path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            if new_file:
+                writer.writeheader()
+            decoded = prefetch(executor, args.folder, todo, args.prefetch * args.batch_size)
+            for batch in batches(decoded, args.batch_size):
+                batch_start = time.perf_counter()
+                rows = score_batch(model, buffer, batch, history, model_id)
+                model_seconds += time.perf_counter() - batch_start
+                writer.writerows(rows)
+                f.flush()  # a resumed run starts after the last complete batch
+
+                for row in rows:
+                    if row["error"]:
+                        failed += 1
+                        continue
+                    scored += 1
+                    compared += bool(row["history_label"])
+                    if row["changed"]:
+                        changes[(row["history_label"], row["label"])] += 1
+                        if args.verbose:
+                            print(f"   ≠ {row['filename']}: {row['history_label']} -> {row['label']}")
+
+                now = time.perf_counter()
+                if now - last_report >= 5:
+                    done_now = scored + failed
+                    print(f"   {done_now}/{len(todo)} images, {done_now / (now - start):.1f} img/s, "
+                          f"{sum(changes.values())} changed")
+                    last_report = now
+    except KeyboardInterrupt:
+        print(f"\n⏸️ Interrupted after {scored + failed} images; run again to resume")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"📊 Scored {scored} images ({failed} unreadable) in {elapsed:.1f}s: "
+          f"{(scored + failed) / elapsed:.1f} img/s overall, "
+          f"{scored / model_seconds if model_seconds else 0:.1f} img/s through the model")
+    print(f"🔍 {sum(changes.values())} of {compared} images in history changed label")
+    for (old, new), count in changes.most_common():
+        print(f"   {old} -> {new}: {count}")
+    print(f"📝 Results in {csv_path}")
+    if parquet_path and scored + failed == len(todo):
+        write_parquet(csv_path, parquet_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Weather-driven disease risk scores from the nodes' temperature/humidity history.
+
+Every disease in disease_info that has "risk_conditions" contributes one row
+of thresholds: a temperature band (°C), a minimum relative humidity and the
+number of consecutive favourable hours after which infection is likely. The
+whole fleet is scored in one NumPy pass over a diseases x devices x time
+boolean tensor:
+
+    favourable = in temperature band & humidity >= threshold
+    score      = min(1, longest favourable run / min_hours)
+
+The longest run is used, not the total, because these fungi need an unbroken
+leaf-wetness period to infect. Short sensor gaps are forward-filled so a
+dropped reading does not reset a run.
+"""
+import numpy as np
+
+LEVELS = ((0.67, "high"), (0.34, "moderate"), (0.0, "low"))
+
+
+def build_thresholds(disease_info):
+    """Stack the structured risk_conditions into arrays, one entry per scored disease"""
+    names, t_lo, t_hi, h_min, hours = [], [], [], [], []
+    for name, info in disease_info.items():
+        conditions = info.get("risk_conditions")
+        if not conditions:
+            continue
+        names.append(name)
+        t_lo.append(conditions["temperature_c"][0])
+        t_hi.append(conditions["temperature_c"][1])
+        h_min.append(conditions["min_humidity"])
+        hours.append(conditions["min_hours"])
+    return {
+        "diseases": names,
+        "t_lo": np.array(t_lo, dtype=np.float64),
+        "t_hi": np.array(t_hi, dtype=np.float64),
+        "h_min": np.array(h_min, dtype=np.float64),
+        "min_hours": np.array(hours, dtype=np.float64),
+    }
+
+
+def forward_fill(values, max_gap):
+    """Carry the last valid value forward along the last axis for at most max_gap steps"""
+    valid = ~np.isnan(values)
+    idx = np.arange(values.shape[-1])
+    last = np.maximum.accumulate(np.where(valid, idx, -1), axis=-1)
+    filled = np.take_along_axis(values, np.maximum(last, 0), axis=-1)
+    stale = (last < 0) | (idx - last > max_gap)
+    return np.where(stale, np.nan, filled)
+
+
+def longest_run(mask):
+    """Length of the longest run of True along the last axis"""
+    idx = np.arange(mask.shape[-1])
+    last_false = np.maximum.accumulate(np.where(mask, -1, idx), axis=-1)
+    return (idx - last_false).max(axis=-1, initial=0)
+
+
+def level_for(score):
+    for bound, name in LEVELS:
+        if score >= bound:
+            return name
+    return "low"
+
+
+def score(thresholds, temperature, humidity, step_seconds, max_gap_steps=5):
+    """Score every device for every disease.
+
+    temperature / humidity are devices x time arrays (NaN = no data). Returns a
+    dict of diseases x devices arrays: score, longest_run_hours and
+    favourable_hours, plus the per-device coverage_hours.
+    """
+    temperature = forward_fill(np.asarray(temperature, dtype=np.float64), max_gap_steps)
+    humidity = forward_fill(np.asarray(humidity, dtype=np.float64), max_gap_steps)
+    hours_per_step = step_seconds / 3600.0
+
+    # (diseases, 1, 1) against (devices, time) -> (diseases, devices, time); NaN compares False
+    t_lo = thresholds["t_lo"][:, None, None]
+    t_hi = thresholds["t_hi"][:, None, None]
+    h_min = thresholds["h_min"][:, None, None]
+    favourable = (temperature >= t_lo) & (temperature <= t_hi) & (humidity >= h_min)
+
+    run_hours = longest_run(favourable) * hours_per_step
+    return {
+        "score": np.clip(run_hours / thresholds["min_hours"][:, None], 0.0, 1.0),
+        "longest_run_hours": run_hours,
+        "favourable_hours": favourable.sum(axis=-1) * hours_per_step,
+        "coverage_hours": (~np.isnan(temperature) & ~np.isnan(humidity)).sum(axis=-1) * hours_per_step,
+    }
@@ -0,0 +1,342 @@
+"""Append-only time series for the nodes' DHT temperature / humidity readings.
+
+Raw readings go into a WITHOUT ROWID table clustered on (device, ts), so they
+are stored in time order per device with no separate index. As each batch is
+written, per-minute and per-hour rollups (count, sum, min, max) are updated
+incrementally with upserts. Range queries such as "last 24h for this device"
+read the precomputed rollups and never scan the raw readings. Ingestion is
+queued and committed in batches by a background thread, like HistoryStore.
+The latest reading per device is also kept in memory so an upload can be
+tagged with the current conditions without touching the database.
+"""
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+RESOLUTIONS = {"minute": 60, "hour": 3600}
+
+# DHT11/DHT22 operating range; anything outside is a failed read (the library reports NaN)
+TEMPERATURE_RANGE = (-40.0, 85.0)
+HUMIDITY_RANGE = (0.0, 100.0)
+
+
+def _valid(value, bounds):
+    return value is not None and math.isfinite(value) and bounds[0] <= value <= bounds[1]
+
+
+class TelemetryStore:
+    """SQLite time-series store with incrementally maintained minute/hour rollups"""
+
+    def __init__(self, path, raw_retention_days=7, minute_retention_days=30, flush_interval=0.5,
+                 flush_batch_size=1024, compact_interval=3600):
+        self.path = path
+        self.raw_retention_days = int(raw_retention_days)
+        self.minute_retention_days = int(minute_retention_days)
+        self.flush_interval = float(flush_interval)
+        self.flush_batch_size = int(flush_batch_size)
+        self.compact_interval = float(compact_interval)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._latest = {}               # device -> newest reading seen
+        self._latest_lock = threading.Lock()
+        self._flushed = threading.Condition()
+        self._written = 0
+        self._duplicates = 0
+        self._rejected = 0
+        self._last_compact = 0.0
+
+        self._init_schema()
+        self._running = True
+        self._thread = threading.Thread(target=self._writer, name="telemetry-writer", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------
+    # CONNECTIONS
+    # ------------------------------------------------
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        rollup = """
+            CREATE TABLE IF NOT EXISTS rollup_{name} (
+                device TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                n INTEGER NOT NULL,
+                t_sum REAL NOT NULL, t_min REAL NOT NULL, t_max REAL NOT NULL,
+                h_sum REAL NOT NULL, h_min REAL NOT NULL, h_max REAL NOT NULL,
+                PRIMARY KEY (device, bucket)
+            ) WITHOUT ROWID;
+        """
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS readings (
+                device TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                temperature REAL NOT NULL,
+                humidity REAL NOT NULL,
+                PRIMARY KEY (device, ts)
+            ) WITHOUT ROWID;
+            """
+            + "".join(rollup.format(name=name) for name in RESOLUTIONS)
+        )
+        conn.commit()
+
+        # Seed the in-memory latest readings
+        for row in conn.execute(
+            "SELECT r.device, r.ts, r.temperature, r.humidity FROM readings r"
+            " JOIN (SELECT device, MAX(ts) AS ts FROM readings GROUP BY device) m"
+            " ON r.device = m.device AND r.ts = m.ts"
+        ):
+            self._latest[row["device"]] = dict(row)
+
+    # ------------------------------------------------
+    # WRITES
+    # ------------------------------------------------
+    def add(self, device, readings, now=None):
+        """Queue readings for one device; returns (accepted, rejected).
+
+        Each reading is a dict with temperature/humidity and either an absolute
+        epoch "ts" or "age_s" (seconds before now, for nodes without a clock),
+        or a compact [ts, temperature, humidity] list.
+        """
+        now = time.time() if now is None else now
+        accepted, rejected = [], 0
+        for reading in readings:
+            try:
+                if isinstance(reading, (list, tuple)):
+                    ts, temperature, humidity = reading
+                else:
+                    temperature, humidity = reading.get("temperature"), reading.get("humidity")
+                    ts = reading.get("ts")
+                    if ts is None:
+                        ts = now - float(reading.get("age_s", 0))
+                ts, temperature, humidity = int(float(ts)), float(temperature), float(humidity)
+            except (TypeError, ValueError):
+                rejected += 1
+                continue
+            if not (_valid(temperature, TEMPERATURE_RANGE) and _valid(humidity, HUMIDITY_RANGE)) or ts > now + 300:
+                rejected += 1
+                continue
+            accepted.append((device, ts, temperature, humidity))
+
+        if accepted:
+            newest = max(accepted, key=lambda r: r[1])
+            with self._latest_lock:
+                current = self._latest.get(device)
+                if current is None or newest[1] >= current["ts"]:
+                    self._latest[device] = dict(zip(("device", "ts", "temperature", "humidity"), newest))
+            for row in accepted:
+                self._queue.put(row)
+        self._rejected += rejected
+        return len(accepted), rejected
+
+    def flush(self, timeout=5):
+        """Block until everything queued so far has been written"""
+        deadline = time.monotonic() + timeout
+        with self._flushed:
+            while self._queue.unfinished_tasks and time.monotonic() < deadline:
+                self._flushed.wait(0.05)
+
+    def close(self):
+        self.flush()
+        self._running = False
+        self._thread.join(timeout=5)
+
+    def _writer(self):
+        while self._running:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.flush_batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if batch:
+                self._write_batch(batch)
+            if self.compact_interval and time.monotonic() - self._last_compact >= self.compact_interval:
+                try:
+                    self.compact()
+                except sqlite3.Error as e:
+                    log.error("❌ Telemetry compaction failed: %s", e)
+
+    def _write_batch(self, batch):
+        try:
+            conn = self._connect()
+            # Append raw rows; a re-sent reading (same device + second) is ignored so it isn't counted twice
+            fresh = [row for row in batch if conn.execute(
+                "INSERT OR IGNORE INTO readings (device, ts, temperature, humidity) VALUES (?, ?, ?, ?)", row
+            ).rowcount]
+
+            for name, seconds in RESOLUTIONS.items():
+                buckets = {}
+                for device, ts, t, h in fresh:
+                    key = (device, ts - ts % seconds)
+                    agg = buckets.get(key)
+                    if agg is None:
+                        buckets[key] = [1, t, t, t, h, h, h]
+                    else:
+                        agg[0] += 1
+                        agg[1] += t
+                        agg[2] = min(agg[2], t)
+                        agg[3] = max(agg[3], t)
+                        agg[4] += h
+                        agg[5] = min(agg[5], h)
+                        agg[6] = max(agg[6], h)
+                conn.executemany(
+                    f"INSERT INTO rollup_{name} (device, bucket, n, t_sum, t_min, t_max, h_sum, h_min, h_max)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (device, bucket) DO UPDATE SET"
+                    " n = n + excluded.n,"
+                    " t_sum = t_sum + excluded.t_sum, t_min = MIN(t_min, excluded.t_min), t_max = MAX(t_max, excluded.t_max),"
+                    " h_sum = h_sum + excluded.h_sum, h_min = MIN(h_min, excluded.h_min), h_max = MAX(h_max, excluded.h_max)",
+                    [key + tuple(agg) for key, agg in buckets.items()],
+                )
+            conn.commit()
+            self._written += len(fresh)
+            self._duplicates += len(batch) - len(fresh)
+        except sqlite3.Error as e:
+            log.error("❌ Failed to persist %d telemetry readings: %s", len(batch), e)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+            with self._flushed:
+                self._flushed.notify_all()
+
+    # ------------------------------------------------
+    # RETENTION
+    # ------------------------------------------------
+    def compact(self):
+        """Drop raw readings and minute rollups past their retention; hour rollups are kept"""
+        self._last_compact = time.monotonic()
+        conn = self._connect()
+        removed = 0
+        now = int(time.time())
+        if self.raw_retention_days > 0:
+            removed += conn.execute("DELETE FROM readings WHERE ts < ?",
+                                    (now - self.raw_retention_days * 86400,)).rowcount
+        if self.minute_retention_days > 0:
+            removed += conn.execute("DELETE FROM rollup_minute WHERE bucket < ?",
+                                    (now - self.minute_retention_days * 86400,)).rowcount
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if removed:
+            log.info("🧹 Telemetry compaction removed %d rows", removed)
+        return removed
+
+    # ------------------------------------------------
+    # READS
+    # ------------------------------------------------
+    def latest(self, device=None):
+        with self._latest_lock:
+            if device is not None:
+                reading = self._latest.get(device)
+                return dict(reading) if reading else None
+            return {d: dict(r) for d, r in self._latest.items()}
+
+    def nearest(self, device, ts=None, max_age_s=600):
+        """Reading closest in time to ts (default now), or None if none is within max_age_s"""
+        if device is None:
+            return None
+        ts = time.time() if ts is None else ts
+        reading = self.latest(device)
+        # Fresh uploads are matched against the in-memory latest reading
+        if reading is not None and reading["ts"] <= ts and ts - reading["ts"] <= max_age_s:
+            return reading
+
+        self.flush(timeout=1)
+        conn = self._connect()
+        candidates = [
+            conn.execute("SELECT device, ts, temperature, humidity FROM readings"
+                         " WHERE device = ? AND ts <= ? ORDER BY ts DESC LIMIT 1", (device, int(ts))).fetchone(),
+            conn.execute("SELECT device, ts, temperature, humidity FROM readings"
+                         " WHERE device = ? AND ts > ? ORDER BY ts ASC LIMIT 1", (device, int(ts))).fetchone(),
+        ]
+        candidates = [dict(row) for row in candidates if row is not None and abs(row["ts"] - ts) <= max_age_s]
+        return min(candidates, key=lambda r: abs(r["ts"] - ts)) if candidates else None
+
+    def series(self, device, since, until=None, resolution="minute"):
+        """Rollup buckets for a device between two epoch times, oldest first"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {sorted(RESOLUTIONS)}")
+        self.flush(timeout=1)
+        until = time.time() if until is None else until
+        step = RESOLUTIONS[resolution]
+        rows = self._connect().execute(
+            f"SELECT bucket, n, t_sum, t_min, t_max, h_sum, h_min, h_max FROM rollup_{resolution}"
+            " WHERE device = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+            (device, int(since) - int(since) % step, int(until)),
+        ).fetchall()
+        return [
+            {
+                "bucket": row["bucket"],
+                "n": row["n"],
+                "temperature": {"avg": round(row["t_sum"] / row["n"], 2), "min": row["t_min"], "max": row["t_max"]},
+                "humidity": {"avg": round(row["h_sum"] / row["n"], 2), "min": row["h_min"], "max": row["h_max"]},
+            }
+            for row in rows
+        ]
+
+    def window(self, since, until=None, resolution="minute"):
+        """All devices' rollups as aligned matrices for vectorized analysis.
+
+        Returns (devices, bucket_starts, temperature, humidity) where the last two
+        are len(devices) x len(bucket_starts) float arrays of bucket averages,
+        NaN where a device sent nothing.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {sorted(RESOLUTIONS)}")
+        self.flush(timeout=1)
+        until = time.time() if until is None else until
+        step = RESOLUTIONS[resolution]
+        start = int(since) - int(since) % step
+        buckets = np.arange(start, int(until) + 1, step, dtype=np.int64)
+        rows = self._connect().execute(
+            f"SELECT device, bucket, t_sum / n, h_sum / n FROM rollup_{resolution}"
+            " WHERE bucket >= ? AND bucket <= ?",
+            (start, int(until)),
+        ).fetchall()
+
+        devices = sorted({row[0] for row in rows})
+        temperature = np.full((len(devices), len(buckets)), np.nan)
+        humidity = np.full((len(devices), len(buckets)), np.nan)
+        if rows:
+            index = {d: i for i, d in enumerate(devices)}
+            data = np.array([(index[r[0]], (r[1] - start) // step, r[2], r[3]) for r in rows])
+            d, b = data[:, 0].astype(np.intp), data[:, 1].astype(np.intp)
+            temperature[d, b] = data[:, 2]
+            humidity[d, b] = data[:, 3]
+        return devices, buckets, temperature, humidity
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "devices": len(self._latest),
+            "written": self._written,
+            "duplicates": self._duplicates,
+            "rejected": self._rejected,
+            "pending_writes": self._queue.qsize(),
+            "raw_retention_days": self.raw_retention_days,
+            "minute_retention_days": self.minute_retention_days,
+        }
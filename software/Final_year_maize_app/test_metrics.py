@@ -0,0 +1,47 @@
+"""Render checks for the /metrics text format: run with `python -m pytest test_metrics.py`"""
+from metrics import MetricsRegistry
+
+
+def family_lines(text, family):
+    return [line for line in text.splitlines() if line.startswith(("# HELP " + family + " ", "# TYPE " + family + " "))]
+
+
+def test_counter_metadata_uses_total_name():
+    registry = MetricsRegistry(prefix="maize_")
+    requests = registry.counter("requests", "Requests served", ["source"])
+    requests.labels("web").inc(3)
+    text = registry.render()
+
+    assert family_lines(text, "maize_requests_total") == [
+        "# HELP maize_requests_total Requests served",
+        "# TYPE maize_requests_total counter",
+    ]
+    assert 'maize_requests_total{source="web"} 3' in text.splitlines()
+    assert "# TYPE maize_requests counter" not in text
+
+
+def test_counter_fn_metadata_uses_total_name():
+    registry = MetricsRegistry(prefix="maize_")
+    registry.counter_fn("rejected", "Rejected uploads", lambda: {("too_large",): 2, ("busy",): None}, ["reason"])
+    text = registry.render()
+
+    assert family_lines(text, "maize_rejected_total") == [
+        "# HELP maize_rejected_total Rejected uploads",
+        "# TYPE maize_rejected_total counter",
+    ]
+    assert 'maize_rejected_total{reason="too_large"} 2' in text.splitlines()
+    assert "busy" not in text
+
+
+def test_gauge_and_histogram_keep_bare_name():
+    registry = MetricsRegistry()
+    registry.gauge("queue_depth", "Queued images", lambda: 4)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.5)
+    lines = registry.render().splitlines()
+
+    assert "# TYPE queue_depth gauge" in lines
+    assert "queue_depth 4" in lines
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{le="1"} 1' in lines
+    assert "latency_seconds_count 1" in lines
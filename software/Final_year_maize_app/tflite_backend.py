@@ -0,0 +1,99 @@
+"""TensorFlow Lite inference backend exposing the slice of the Keras Model API
+that app.py uses (predict, input_shape, output_shape).
+
+Uses the standalone tflite_runtime package when installed (much smaller than
+TensorFlow), otherwise falls back to tf.lite.Interpreter.
+"""
+import threading
+
+import numpy as np
+
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """Batch-of-N predict() on top of TFLite interpreters resized to each batch size seen"""
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self._interpreter = self._new_interpreter()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        # One interpreter per batch size: resizing reallocates every tensor, so a micro-batcher
+        # alternating between sizes would otherwise pay for it on most batches. The model file
+        # is memory-mapped, so each extra interpreter only costs its activation arena.
+        self._by_size = {1: (self._interpreter, threading.Lock())}
+        self._sizes_lock = threading.Lock()
+        self._batching = True  # cleared if the model has a fixed batch dimension
+
+    def _new_interpreter(self, batch_size=None):
+        interpreter = Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+        if batch_size is not None:
+            index = interpreter.get_input_details()[0]["index"]
+            shape = [batch_size] + [int(d) for d in interpreter.get_input_details()[0]["shape"][1:]]
+            interpreter.resize_tensor_input(index, shape, strict=False)
+        interpreter.allocate_tensors()
+        return interpreter
+
+    def _for_size(self, n):
+        """(interpreter, lock) allocated for a batch of n, created on first use"""
+        entry = self._by_size.get(n)
+        if entry is None:
+            with self._sizes_lock:
+                entry = self._by_size.get(n)
+                if entry is None:
+                    entry = (self._new_interpreter(n), threading.Lock())
+                    self._by_size[n] = entry
+        return entry
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(d) for d in self._input["shape"][1:])
+
+    @property
+    def output_shape(self):
+        return (None,) + tuple(int(d) for d in self._output["shape"][1:])
+
+    def _quantize(self, x):
+        scale, zero_point = self._input["quantization"]
+        if self._input["dtype"] == np.float32 or not scale:
+            return x.astype(self._input["dtype"], copy=False)
+        return np.round(x / scale + zero_point).astype(self._input["dtype"])
+
+    def _dequantize(self, y):
+        scale, zero_point = self._output["quantization"]
+        if self._output["dtype"] == np.float32 or not scale:
+            return y.astype(np.float32, copy=False)
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch, verbose=0, batch_size=None):
+        """Run the whole batch through one invoke of an interpreter sized for it"""
+        batch = np.asarray(batch)
+        n = len(batch)
+        out = np.empty((n,) + self.output_shape[1:], dtype=np.float32)
+        if n == 0:
+            return out
+        if self._batching and n > 1:
+            try:
+                interpreter, lock = self._for_size(n)
+            except (ValueError, RuntimeError):
+                self._batching = False  # batch dimension baked into the model: fall back to one image at a time
+            else:
+                with lock:
+                    interpreter.set_tensor(self._input["index"], self._quantize(batch))
+                    interpreter.invoke()
+                    out[:] = self._dequantize(interpreter.get_tensor(self._output["index"]))
+                return out
+
+        interpreter, lock = self._by_size[1]
+        with lock:
+            for i in range(n):
+                interpreter.set_tensor(self._input["index"], self._quantize(batch[i:i + 1]))
+                interpreter.invoke()
+                out[i] = self._dequantize(interpreter.get_tensor(self._output["index"]))[0]
+        return out
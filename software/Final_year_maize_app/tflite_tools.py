@@ -0,0 +1,172 @@
+"""Convert the Keras model to TFLite and check the result against Keras.
+
+Usage:
+    python tflite_tools.py convert [--model models/best_model.keras] [--out-dir models]
+    python tflite_tools.py compare [--model models/best_model.keras] [--tflite models/best_model_float16.tflite ...]
+
+convert writes three variants next to the Keras model:
+    *_float16.tflite  - float16 weights, float compute
+    *_dynamic.tflite  - int8 dynamic-range weights (no calibration needed)
+    *_int8.tflite     - int8 weights and activations, calibrated on the
+                        static/demo + static/uploads images (float32 I/O)
+
+compare reports top-1 agreement with the Keras model on the sample images and
+single-image latency / batched throughput for every backend.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from preprocessing import decode_rgb
+from tflite_backend import TFLiteModel
+
+SAMPLE_FOLDERS = ["static/demo", "static/uploads"]
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+CLASS_LABELS = ["Blight", "Common Rust", "Gray Leaf Spot", "Healthy"]
+
+
+def load_samples(folders):
+    """Decode every sample image with the same preprocessing stage the server uses"""
+    arrays, names = [], []
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if "." not in name or name.rsplit(".", 1)[1].lower() not in ALLOWED_EXTENSIONS:
+                continue
+            arrays.append(decode_rgb(os.path.join(folder, name)).astype(np.float32))
+            names.append(os.path.join(folder, name))
+    return names, np.stack(arrays) if arrays else np.empty((0, 224, 224, 3), np.float32)
+
+
+def load_keras(model_path):
+    from tensorflow.keras.models import load_model
+    return load_model(model_path, compile=False)
+
+
+# ------------------------------------------------
+# CONVERT
+# ------------------------------------------------
+def convert(args):
+    import tensorflow as tf
+
+    keras_model = load_keras(args.model)
+    _, samples = load_samples(SAMPLE_FOLDERS)
+    stem = os.path.splitext(os.path.basename(args.model))[0]
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    def representative_dataset():
+        for i in range(len(samples)):
+            yield [samples[i:i + 1]]
+
+    variants = {}
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    variants["float16"] = converter.convert()
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    variants["dynamic"] = converter.convert()
+
+    if len(samples):
+        converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        variants["int8"] = converter.convert()
+    else:
+        print("⚠️  No calibration images found, skipping the int8 variant")
+
+    for name, flatbuffer in variants.items():
+        path = os.path.join(args.out_dir, f"{stem}_{name}.tflite")
+        with open(path, "wb") as f:
+            f.write(flatbuffer)
+        print(f"✅ {name:8s} -> {path} ({len(flatbuffer) / 1e6:.1f} MB)")
+
+
+# ------------------------------------------------
+# COMPARE
+# ------------------------------------------------
+def time_backend(predict, samples, batch_size, rounds):
+    predict(samples[:1])  # warm-up / graph tracing
+
+    single = []
+    for i in range(len(samples)):
+        start = time.perf_counter()
+        predict(samples[i:i + 1])
+        single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    seen = 0
+    for _ in range(rounds):
+        for i in range(0, len(samples), batch_size):
+            predict(samples[i:i + batch_size])
+            seen += len(samples[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+    return float(np.median(single)) * 1000.0, seen / elapsed
+
+
+def compare(args):
+    names, samples = load_samples(SAMPLE_FOLDERS)
+    if not len(samples):
+        print("No sample images found")
+        return
+
+    keras_model = load_keras(args.model)
+    reference = keras_model.predict(samples, verbose=0)
+    reference_top1 = reference.argmax(axis=1)
+
+    backends = [("keras", lambda x: keras_model.predict(x, verbose=0))]
+    for path in args.tflite:
+        if os.path.exists(path):
+            tflite_model = TFLiteModel(path, num_threads=args.threads)
+            backends.append((os.path.basename(path), tflite_model.predict))
+        else:
+            print(f"⚠️  {path} not found, skipping")
+
+    print(f"{len(samples)} sample images, batch size {args.batch_size}, {args.threads} TFLite threads")
+    print(f"{'backend':34s} {'top-1 agree':>12s} {'max |dp|':>9s} {'p50 ms/img':>11s} {'img/s':>8s}")
+    for name, predict in backends:
+        preds = predict(samples)
+        agreement = float((preds.argmax(axis=1) == reference_top1).mean())
+        max_delta = float(np.abs(preds - reference).max())
+        latency_ms, throughput = time_backend(predict, samples, args.batch_size, args.rounds)
+        print(f"{name:34s} {agreement:12.1%} {max_delta:9.4f} {latency_ms:11.2f} {throughput:8.1f}")
+
+        if args.verbose and name != "keras":
+            for i in np.flatnonzero(preds.argmax(axis=1) != reference_top1):
+                print(f"   ≠ {names[i]}: keras={CLASS_LABELS[reference_top1[i]]} "
+                      f"{name}={CLASS_LABELS[preds[i].argmax()]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="write float16 / dynamic / int8 TFLite models")
+    p.add_argument("--model", default="models/best_model.keras")
+    p.add_argument("--out-dir", default="models")
+    p.set_defaults(func=convert)
+
+    p = sub.add_parser("compare", help="top-1 parity and latency vs the Keras model")
+    p.add_argument("--model", default="models/best_model.keras")
+    p.add_argument("--tflite", nargs="*", default=[
+        "models/best_model_float16.tflite",
+        "models/best_model_dynamic.tflite",
+        "models/best_model_int8.tflite",
+    ])
+    p.add_argument("--threads", type=int, default=os.cpu_count())
+    p.add_argument("--batch-size", type=int, default=8)
+    p.add_argument("--rounds", type=int, default=3)
+    p.add_argument("--verbose", action="store_true", help="list images where the top-1 label differs")
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
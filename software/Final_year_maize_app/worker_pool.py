@@ -0,0 +1,339 @@
+"""Multi-process inference workers fed through shared memory.
+
+Each worker is a separate Python process (`python worker_pool.py`, so app.py is
+never re-imported in the child) that loads its own copy of the model, is
+optionally pinned to one CPU core, and owns a pair of shared-memory blocks: a uint8 input block holding
+up to max_batch_size decoded 224x224x3 images and a float32 output block for
+the probabilities. The front end copies a batch into the input block and sends
+only the batch size over an authenticated local connection, so image tensors
+are never pickled.
+
+InferenceWorkerPool.predict() has the same shape as Keras' Model.predict, so it
+drops in behind BatchingPredictor; run that with one dispatcher thread per
+worker to keep every process busy. Workers that die are restarted, and the
+batch they were holding is retried once on a fresh process.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+IMAGE_SHAPE = (224, 224, 3)
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------------------------------
+# WORKER PROCESS
+# ------------------------------------------------
+def _worker_main(conn, in_name, out_name, max_batch_size, num_classes, model_path, backend,
+                 num_threads, core, warmup_sizes):
+    """Load the model, report ready, then serve batch sizes from the connection until None"""
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {core})
+        except OSError:
+            pass
+
+    from model_loader import get_preprocess_fn, load_inference_model
+
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    # The front end owns these blocks; stop this process' resource tracker unlinking them on exit
+    for shm in (in_shm, out_shm):
+        resource_tracker.unregister(shm._name, "shared_memory")
+    try:
+        inputs = np.ndarray((max_batch_size,) + IMAGE_SHAPE, dtype=np.uint8, buffer=in_shm.buf)
+        outputs = np.ndarray((max_batch_size, num_classes), dtype=np.float32, buffer=out_shm.buf)
+        batch = np.empty((max_batch_size,) + IMAGE_SHAPE, dtype=np.float32)
+
+        model = load_inference_model(model_path, backend, num_threads=num_threads)
+        preprocess_fn = get_preprocess_fn(backend)
+
+        def run(n):
+            x = batch[:n]
+            np.copyto(x, inputs[:n], casting="unsafe")
+            if preprocess_fn is not None:
+                x = preprocess_fn(x)
+            outputs[:n] = model.predict(x, verbose=0)
+
+        for n in warmup_sizes:
+            inputs[:n] = 0
+            run(min(n, max_batch_size))
+        conn.send(("ready", os.getpid()))
+
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            try:
+                run(message)
+                conn.send(("ok", message))
+            except Exception as e:
+                conn.send(("error", str(e)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception as e:
+        try:
+            conn.send(("error", f"worker failed to start: {e}"))
+        except Exception:
+            pass
+    finally:
+        in_shm.close()
+        out_shm.close()
+
+
+class WorkerCrashed(Exception):
+    """Raised when a worker process died while holding a batch."""
+
+
+class _Worker:
+    """Front-end handle: shared-memory blocks, connection and the process behind them"""
+
+    def __init__(self, index, pool):
+        self.index = index
+        self.pool = pool
+        self.in_shm = shared_memory.SharedMemory(
+            create=True, size=pool.max_batch_size * int(np.prod(IMAGE_SHAPE)))
+        self.out_shm = shared_memory.SharedMemory(
+            create=True, size=pool.max_batch_size * pool.num_classes * 4)
+        self.inputs = np.ndarray((pool.max_batch_size,) + IMAGE_SHAPE, dtype=np.uint8, buffer=self.in_shm.buf)
+        self.outputs = np.ndarray((pool.max_batch_size, pool.num_classes), dtype=np.float32,
+                                  buffer=self.out_shm.buf)
+        self.process = None
+        self.listener = None
+        self.conn = None
+        self.pid = None
+        self.restarts = -1
+        self.batches = 0
+
+    def start(self):
+        self.pid = None
+        core = None
+        if self.pool.pin_cores and self.pool.cores:
+            core = self.pool.cores[self.index % len(self.pool.cores)]
+        authkey = os.urandom(16)
+        self.listener = Listener(authkey=authkey)
+        config = {
+            "address": self.listener.address,
+            "in_name": self.in_shm.name,
+            "out_name": self.out_shm.name,
+            "max_batch_size": self.pool.max_batch_size,
+            "num_classes": self.pool.num_classes,
+            "model_path": os.path.abspath(self.pool.model_path),
+            "backend": self.pool.backend,
+            "num_threads": self.pool.threads_per_worker,
+            "core": core,
+            "warmup_sizes": list(self.pool.warmup_sizes),
+        }
+        env = dict(os.environ, INFERENCE_WORKER_AUTHKEY=authkey.hex())
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), json.dumps(config)],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+        )
+        self.restarts += 1
+        threading.Thread(
+            target=self._watch_startup, args=(self.process, self.listener.address, authkey), daemon=True
+        ).start()
+        self.conn = self.listener.accept()
+
+        status, detail = self.conn.recv()
+        if status != "ready":
+            raise RuntimeError(f"Inference worker {self.index} failed: {detail}")
+        self.pid = detail
+
+    def _watch_startup(self, process, address, authkey):
+        """If the child exits before connecting, unblock accept() with an error message"""
+        process.wait()
+        if self.process is process and self.pid is None:
+            try:
+                with Client(address, authkey=authkey) as conn:
+                    conn.send(("error", f"exited with code {process.returncode} during startup"))
+            except Exception:
+                pass
+
+    def run(self, batch):
+        n = len(batch)
+        self.inputs[:n] = batch
+        try:
+            self.conn.send(n)
+            status, detail = self.conn.recv()
+        except (EOFError, OSError, BrokenPipeError) as e:
+            raise WorkerCrashed(f"Inference worker {self.index} died: {e}")
+        if status != "ok":
+            raise RuntimeError(detail)
+        self.batches += 1
+        return self.outputs[:n].copy()
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def kill(self):
+        """Reap a process whose connection broke; it may still be running, e.g. stuck or exiting"""
+        if self.alive():
+            self.process.kill()
+        if self.process is not None:
+            self.process.wait()
+
+    def stop(self):
+        if self.alive():
+            try:
+                self.conn.send(None)
+                self.process.wait(timeout=5)
+            except Exception:
+                self.process.kill()
+                self.process.wait()
+        for closable in (self.conn, self.listener):
+            if closable is not None:
+                closable.close()
+        self.conn = self.listener = None
+
+    def release(self):
+        for shm in (self.in_shm, self.out_shm):
+            shm.close()
+            shm.unlink()
+
+
+class InferenceWorkerPool:
+    """N model-holding processes behind a Keras-like predict()"""
+
+    def __init__(self, model_path, num_workers=2, backend="keras", max_batch_size=8, num_classes=4,
+                 threads_per_worker=1, pin_cores=True, warmup_sizes=(1,), monitor_interval=2.0):
+        self.model_path = model_path
+        self.num_workers = max(1, int(num_workers))
+        self.backend = backend
+        self.max_batch_size = int(max_batch_size)
+        self.num_classes = int(num_classes)
+        self.threads_per_worker = threads_per_worker
+        self.pin_cores = pin_cores
+        self.warmup_sizes = tuple(warmup_sizes)
+        self.monitor_interval = monitor_interval
+
+        self.cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        self._workers = [_Worker(i, self) for i in range(self.num_workers)]
+        self._idle = queue.Queue()
+        self._restart_lock = threading.Lock()
+        self._running = False
+
+    @property
+    def input_shape(self):
+        return (None,) + IMAGE_SHAPE
+
+    @property
+    def output_shape(self):
+        return (None, self.num_classes)
+
+    # ------------------------------------------------
+    # LIFECYCLE
+    # ------------------------------------------------
+    def start(self):
+        """Start every worker and block until each has loaded and warmed its model"""
+        starters = [threading.Thread(target=w.start) for w in self._workers]
+        for t in starters:
+            t.start()
+        for t in starters:
+            t.join()
+        for w in self._workers:
+            if w.pid is None:
+                raise RuntimeError(f"Inference worker {w.index} failed to start")
+            self._idle.put(w)
+
+        self._running = True
+        threading.Thread(target=self._monitor, name="worker-monitor", daemon=True).start()
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        with self._restart_lock:
+            if not self._running:
+                return
+            self._running = False
+        atexit.unregister(self.close)  # the registry would otherwise keep a closed pool alive
+        for w in self._workers:
+            w.stop()
+            w.release()
+
+    def _restart(self, worker, crashed=False):
+        with self._restart_lock:
+            if crashed:
+                worker.kill()  # its pipe is gone, so a process that has not exited yet is of no use
+            if worker.alive() or not self._running:
+                return
+            log.warning("♻️  Restarting inference worker %d (pid %s)", worker.index, worker.pid)
+            worker.stop()
+            worker.start()
+
+    def _monitor(self):
+        """Restart idle workers that died between batches"""
+        while self._running:
+            time.sleep(self.monitor_interval)
+            for _ in range(self._idle.qsize()):
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    if not worker.alive():
+                        self._restart(worker)
+                except Exception as e:
+                    log.error("❌ Could not restart inference worker %d: %s", worker.index, e)
+                finally:
+                    self._idle.put(worker)
+
+    # ------------------------------------------------
+    # PREDICT
+    # ------------------------------------------------
+    def predict(self, batch, verbose=0, batch_size=None):
+        """Run an NxHxWx3 uint8 batch on the next idle worker; larger batches are split"""
+        batch = np.asarray(batch)
+        if len(batch) > self.max_batch_size:
+            return np.concatenate([
+                self.predict(batch[i:i + self.max_batch_size])
+                for i in range(0, len(batch), self.max_batch_size)
+            ])
+
+        worker = self._idle.get()
+        try:
+            try:
+                return worker.run(batch)
+            except WorkerCrashed:
+                self._restart(worker, crashed=True)
+                return worker.run(batch)
+        finally:
+            self._idle.put(worker)
+
+    def stats(self):
+        return {
+            "workers": [
+                {
+                    "index": w.index,
+                    "pid": w.pid,
+                    "alive": w.alive(),
+                    "restarts": w.restarts,
+                    "batches": w.batches,
+                }
+                for w in self._workers
+            ],
+            "idle": self._idle.qsize(),
+            "backend": self.backend,
+            "pinned": self.pin_cores and bool(self.cores),
+        }
+
+
+if __name__ == "__main__":
+    # Worker process entry point, launched by _Worker.start()
+    cfg = json.loads(sys.argv[1])
+    address = cfg.pop("address")
+    address = tuple(address) if isinstance(address, list) else address
+    connection = Client(address, authkey=bytes.fromhex(os.environ.pop("INFERENCE_WORKER_AUTHKEY")))
+    _worker_main(connection, **cfg)